@@ -1,70 +1,590 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-import shutil
+from fastapi import APIRouter, UploadFile, File, HTTPException, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import asyncio
+import hashlib
+import hmac
+import json
 import os
+import re
+import threading
 import time
+import uuid
 from pathlib import Path
-from app.core.detector import DeepfakeDetector
-from app.api.schemas import AnalysisResponse, ErrorResponse
+from typing import Any, Dict, Optional, Set, Tuple
+from app.core import telemetry
+from app.core.admission import PRIORITY, AdmissionController, AdmissionRejectedError, estimate_cost
+from app.core.config import settings
+from app.core.jobs import Job, JobManager, QueueFullError
+from app.core.metrics import registry
+from app.core.runtime import runtime
+from app.core.segments import SEGMENT_TOKEN_HEADER, SOURCE_NOT_FOUND
+from app.services.chunked_uploads import (
+    ChecksumMismatchError, OffsetMismatchError, QuotaExceededError, UploadIncompleteError, UploadManager,
+    UploadNotFoundError, UploadTooLargeError,
+)
+from app.services.result_cache import ResultCache
+from app.api.schemas import (
+    AnalysisResponse, ErrorResponse, JobResponse, SegmentRequest, UploadCreateRequest, UploadResponse,
+)
 
 router = APIRouter()
 
-# Initialize detector once (singleton pattern effectively)
-# In production, we might use dependency injection or lifespan events
-detector = DeepfakeDetector()
+# Results keyed by upload content hash, model version and the settings that shape results
+result_cache = ResultCache(
+    cache_dir=settings.result_cache_dir,
+    model_version=settings.model_version,
+    fingerprint=settings.result_fingerprint(),
+    memory_entries=settings.result_cache_memory_entries,
+    max_disk_bytes=settings.result_cache_max_disk_mb * 1024 * 1024,
+)
+
+# Keeps the estimated cost of concurrent analyses within budget
+admission = AdmissionController(
+    budget=settings.admission_budget,
+    priority_reserve=settings.admission_priority_reserve,
+    priority_max_cost=settings.admission_priority_max_cost,
+)
+
+# Bounded pool of inference workers for the asynchronous job API; job records
+# are kept on disk so any pre-forked worker can answer a poll
+jobs = JobManager(
+    lambda job: _analyze_admitted(job.file_path, job.content_hash, job.cost, wait=None),
+    workers=settings.job_workers,
+    max_queue=settings.job_queue_size,
+    ttl_seconds=settings.job_ttl_seconds,
+    state_dir="data/jobs",
+)
+
+registry.gauge("sherlock_job_queue_depth", "Jobs waiting for an inference worker.", callback=jobs.queue_depth)
+registry.gauge("sherlock_admission_inflight_cost", "Estimated cost of the analyses running now.",
+               callback=admission.inflight_cost)
+CACHE_LOOKUPS = registry.counter("sherlock_result_cache_lookups_total", "Result cache lookups by outcome.")
+
+# Running analyses of streamed requests, referenced until they finish
+_stream_tasks: Set["asyncio.Task[None]"] = set()
 
 UPLOAD_DIR = Path("data/uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-@router.post("/analyze", response_model=AnalysisResponse)
-async def analyze_video(file: UploadFile = File(...)):
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_BYTES = settings.upload_max_mb * 1024 * 1024
+SHA256_RE = re.compile(r"^[0-9a-fA-F]{64}$")
+
+# Resumable chunked uploads, staged next to the finished ones
+uploads = UploadManager(
+    staging_dir=str(UPLOAD_DIR / "partial"),
+    max_file_bytes=UPLOAD_MAX_BYTES,
+    max_client_bytes=settings.upload_client_max_mb * 1024 * 1024,
+    ttl_seconds=settings.upload_ttl_seconds,
+)
+
+def _save_upload(file: UploadFile) -> Tuple[Path, str]:
+    """
+    Streams the upload to disk while hashing it, then stores it under its
+    SHA-256 so identical uploads share one file regardless of client name.
+    """
+    suffix = Path(file.filename or "").suffix.lower()
+    tmp_path = UPLOAD_DIR / f".{uuid.uuid4().hex}.part"
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with tmp_path.open("wb") as buffer:
+            while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise UploadTooLargeError(f"Upload exceeds the {UPLOAD_MAX_BYTES} byte limit")
+                sha256.update(chunk)
+                buffer.write(chunk)
+        content_hash = sha256.hexdigest()
+        file_path = UPLOAD_DIR / f"{content_hash}{suffix}"
+        os.replace(tmp_path, file_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return file_path, content_hash
+
+def _analyze(file_path: str, content_hash: Optional[str] = None, profile: bool = False,
+             cancel_event: Optional[threading.Event] = None, on_event=None, model: Optional[str] = None) -> Dict[str, Any]:
+    result = runtime.detector.analyze_video(file_path, profile=profile, cancel_event=cancel_event, on_event=on_event,
+                                            model=model)
+    if content_hash and "error" not in result:
+        # Timings describe this run, not the media
+        result_cache.put(content_hash, {k: v for k, v in result.items() if k != "timings"})
+    return result
+
+def _estimate_cost(file_path: Path) -> float:
+    with telemetry.span("admission"):
+        metadata = runtime.detector.video_processor.get_video_metadata(str(file_path), probe_audio=True)
+        return estimate_cost(metadata)
+
+def _acquire(cost: float, wait: Optional[float]):
+    try:
+        return admission.acquire(cost, wait=wait)
+    except AdmissionRejectedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def _analyze_admitted(file_path: str, content_hash: Optional[str], cost: float, profile: bool = False,
+                      wait: Optional[float] = 0.0, model: Optional[str] = None) -> Dict[str, Any]:
+    ticket = _acquire(cost, wait)
+    try:
+        return _analyze(file_path, content_hash, profile, model=model)
+    finally:
+        admission.release(ticket)
+
+def _require_ready():
+    if not runtime.ready:
+        raise HTTPException(status_code=503, detail=f"Models are {runtime.state.value}, retry later",
+                            headers={"Retry-After": "5"})
+
+def _cache_key(content_hash: str, model: Optional[str]) -> str:
+    # Results from an explicitly chosen model are cached apart from the default pipeline's
+    return content_hash if model is None else f"{content_hash}@{model}"
+
+def _cache_get(content_hash: str) -> Optional[Dict[str, Any]]:
+    with telemetry.span("cache_lookup"):
+        cached = result_cache.get(content_hash)
+    CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+    return cached
+
+def _build_response(result: Dict[str, Any], processing_time: float, filename: Optional[str] = None,
+                    timings: Optional[Dict[str, float]] = None) -> AnalysisResponse:
+    return AnalysisResponse(
+        filename=filename or result["file"],
+        is_fake=result["is_fake"],
+        confidence=result["confidence"],
+        fake_probability=result["fake_probability"],
+        details={
+            "visual_prob": result["details"].get("visual_prob"),
+            "audio_prob": result["details"].get("audio_prob"),
+            "frames_analyzed": float(result["details"].get("frames_analyzed", 0))
+        },
+        processing_time=round(processing_time, 2),
+        timings=timings,
+    )
+
+def _job_response(job: Job) -> JobResponse:
+    result = None
+    if job.result is not None:
+        result = _build_response(job.result, job.finished_at - job.created_at, filename=job.filename)
+    return JobResponse(
+        job_id=job.id,
+        status=job.status.value,
+        filename=job.filename,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+        result=result,
+        error=job.error,
+    )
+
+@router.post("/analyze", response_model=AnalysisResponse, response_model_exclude_none=True)
+async def analyze_video(response: Response, file: UploadFile = File(...), timings: bool = False,
+                        model: Optional[str] = None, x_sherlock_profile: Optional[str] = Header(default=None)):
     """
     Upload a video file and analyze it for deepfake artifacts.
+
+    Per-stage timings are always sent in the Server-Timing header; pass
+    `?timings=true` to also get them in the body. `?model=name[@version]`
+    scores with a specific visual model (e.g. a customer fine-tune) instead
+    of the configured pipeline.
     """
     start_time = time.time()
     
-    # 1. Save uploaded file
-    try:
-        file_path = UPLOAD_DIR / file.filename
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
+    filename = Path(file.filename).name
+    if model is not None:
+        _require_ready()
+        if not runtime.detector.models.available(model):
+            raise HTTPException(status_code=400, detail=f"Unknown model {model!r}")
+
+    with telemetry.trace() as trace:
+        # 1. Save uploaded file
+        try:
+            with telemetry.span("upload"):
+                file_path, content_hash = await run_in_threadpool(_save_upload, file)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
+
+        # Repeat submissions of the same media are answered from the cache
+        cache_key = _cache_key(content_hash, model)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            response.headers["Server-Timing"] = trace.server_timing()
+            return _build_response(cached, time.time() - start_time, filename=filename,
+                                   timings=trace.timings_ms() if timings else None)
     
-    # 2. Run Analysis
-    try:
-        # The detector is synchronous, so this might block the event loop.
-        # For high-concurrency, this should run in a threadpool (FastAPI does this for def functions)
-        # or use run_in_executor.
-        result = detector.analyze_video(str(file_path))
+        # 2. Run Analysis
+        _require_ready()
+        try:
+            # The detector is synchronous; run it off the event loop so other
+            # requests (and health checks) keep being served. The worker
+            # thread inherits this context, so its spans join the trace.
+            profile = x_sherlock_profile not in (None, "", "0")
+            cost = await run_in_threadpool(_estimate_cost, file_path)
+            result = await run_in_threadpool(_analyze_admitted, str(file_path), cache_key, cost, profile,
+                                             settings.admission_wait_seconds, model)
         
-        if "error" in result:
-            raise HTTPException(status_code=400, detail=result["error"])
+            if "error" in result:
+                raise HTTPException(status_code=400, detail=result["error"])
             
-        processing_time = time.time() - start_time
+            processing_time = time.time() - start_time
+            response.headers["Server-Timing"] = trace.server_timing()
         
-        return AnalysisResponse(
-            filename=result["file"],
-            is_fake=result["is_fake"],
-            confidence=result["confidence"],
-            fake_probability=result["fake_probability"],
-            details={
-                "visual_prob": result["details"].get("visual_prob"),
-                "audio_prob": result["details"].get("audio_prob"),
-                "frames_analyzed": float(result["details"].get("frames_analyzed", 0))
-            },
-            processing_time=round(processing_time, 2)
-        )
+            return _build_response(result, processing_time, filename=filename,
+                                   timings=trace.timings_ms() if timings else None)
         
-    except HTTPException:
-        raise
+        except HTTPException:
+            raise
+        except Exception as e:
+            # Clean up file in case of crash? Maybe keep for debugging.
+            raise HTTPException(status_code=500, detail=f"Analysis failed: {e}")
+        finally:
+            # Optional: Cleanup uploaded file to save space
+            # if file_path.exists():
+            #     os.remove(file_path)
+            pass
+
+def _format_event(event: str, payload: Dict[str, Any], fmt: str) -> str:
+    if fmt == "ndjson":
+        return json.dumps({"event": event, **payload}) + "\n"
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@router.post("/analyze/stream")
+async def analyze_video_stream(file: UploadFile = File(...), format: str = Query("sse", pattern="^(sse|ndjson)$")):
+    """
+    Upload a video and stream progress as Server-Sent Events (default) or
+    newline-delimited JSON (`?format=ndjson`): "accepted", "metadata",
+    "frames" per scored batch and "audio", each with a provisional verdict,
+    then "result" (or "error"). Disconnecting cancels the analysis.
+    """
+    start_time = time.time()
+    filename = Path(file.filename).name
+    try:
+        file_path, content_hash = await run_in_threadpool(_save_upload, file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
+    cached = _cache_get(content_hash)
+    ticket = None
+    if cached is None:
+        _require_ready()
+        cost = await run_in_threadpool(_estimate_cost, file_path)
+        ticket = await run_in_threadpool(_acquire, cost, settings.admission_wait_seconds)
+
+    loop = asyncio.get_running_loop()
+    events: "asyncio.Queue[Tuple[str, Dict[str, Any]]]" = asyncio.Queue()
+    cancel = threading.Event()
+
+    def on_event(event: str, payload: Dict[str, Any]):
+        # Called from the detector's branch threads
+        loop.call_soon_threadsafe(events.put_nowait, (event, payload))
+
+    async def run():
+        try:
+            result = await run_in_threadpool(_analyze, str(file_path), content_hash, False, cancel, on_event)
+            if "error" in result:
+                events.put_nowait(("error", {"detail": result["error"]}))
+            else:
+                response = _build_response(result, time.time() - start_time, filename=filename)
+                events.put_nowait(("result", response.model_dump()))
+        except Exception as e:
+            events.put_nowait(("error", {"detail": f"Analysis failed: {e}"}))
+        finally:
+            admission.release(ticket)
+
+    # Start right away rather than on first read, so the admission ticket is
+    # released even if the client never reads the body
+    if cached is None:
+        task = asyncio.ensure_future(run())
+        # The loop only holds a weak reference; keep the task alive until it finishes
+        _stream_tasks.add(task)
+        task.add_done_callback(_stream_tasks.discard)
+
+    async def stream():
+        yield _format_event("accepted", {"filename": filename, "content_hash": content_hash,
+                                         "cached": cached is not None}, format)
+        if cached is not None:
+            response = _build_response(cached, time.time() - start_time, filename=filename)
+            yield _format_event("result", response.model_dump(), format)
+            return
+
+        try:
+            while True:
+                event, payload = await events.get()
+                yield _format_event(event, payload, format)
+                if event in ("result", "error"):
+                    break
+        finally:
+            # Client went away (or we are done): stop the branches and free the worker
+            cancel.set()
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(stream(), media_type=media_type,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/analyze/by-hash/{sha256}", response_model=AnalysisResponse)
+async def analyze_by_hash(sha256: str):
+    """
+    Looks up a previous result by the SHA-256 of the media file, so clients
+    can skip uploading media that has already been scored.
+    """
+    start_time = time.time()
+    if not SHA256_RE.match(sha256):
+        raise HTTPException(status_code=400, detail="Expected a hex-encoded SHA-256 digest")
+
+    cached = _cache_get(sha256)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="No result for this content hash")
+    return _build_response(cached, time.time() - start_time)
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(file: UploadFile = File(...)):
+    """
+    Upload a video and queue it for analysis. Returns a job id immediately;
+    poll GET /jobs/{job_id} for the result.
+    """
+    filename = Path(file.filename).name
+    try:
+        file_path, content_hash = await run_in_threadpool(_save_upload, file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
-        # Clean up file in case of crash? Maybe keep for debugging.
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
+
+    return await _enqueue(file_path, filename, content_hash)
+
+async def _enqueue(file_path: Path, filename: str, content_hash: str) -> JobResponse:
+    cached = _cache_get(content_hash)
+    if cached is not None:
+        return _job_response(jobs.add_completed(str(file_path), filename, cached, content_hash=content_hash))
+
+    _require_ready()
+    # Cheap analyses jump the queue; the worker waits for admission before running
+    cost = await run_in_threadpool(_estimate_cost, file_path)
+    priority = 0 if admission.lane_for(cost) == PRIORITY else 1
+    try:
+        job = jobs.submit(str(file_path), filename, content_hash=content_hash, cost=cost, priority=priority)
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Analysis queue is full, retry later",
+                            headers={"Retry-After": "5"})
+
+    return _job_response(job)
+
+def _upload_response(upload) -> UploadResponse:
+    return UploadResponse(
+        upload_id=upload.id,
+        filename=upload.filename,
+        size=upload.size,
+        offset=upload.offset,
+        chunk_size=settings.upload_chunk_mb * 1024 * 1024,
+        expires_at=upload.updated_at + settings.upload_ttl_seconds,
+    )
+
+def _get_upload(upload_id: str):
+    try:
+        return uploads.get(upload_id)
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/uploads", response_model=UploadResponse, status_code=201)
+async def create_upload(body: UploadCreateRequest, request: Request):
+    """
+    Starts a resumable upload. Send the bytes with PATCH /uploads/{upload_id}
+    in any number of chunks, then POST /uploads/{upload_id}/finalize.
+    """
+    if body.sha256 is not None and not SHA256_RE.match(body.sha256):
+        raise HTTPException(status_code=400, detail="Expected a hex-encoded SHA-256 digest")
+    client = request.client.host if request.client else "unknown"
+    try:
+        upload = await run_in_threadpool(uploads.create, Path(body.filename).name, body.size, client, body.sha256)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except QuotaExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return _upload_response(upload)
+
+@router.get("/uploads/{upload_id}", response_model=UploadResponse)
+async def get_upload(upload_id: str, response: Response):
+    """
+    Reports how many bytes the server holds, i.e. where to resume.
+    """
+    upload = await run_in_threadpool(_get_upload, upload_id)
+    response.headers["Upload-Offset"] = str(upload.offset)
+    return _upload_response(upload)
+
+@router.patch("/uploads/{upload_id}", response_model=UploadResponse)
+async def append_upload(upload_id: str, request: Request, response: Response,
+                        upload_offset: int = Header(..., alias="Upload-Offset")):
+    """
+    Appends the raw request body at `Upload-Offset`, which must equal the
+    number of bytes already stored (409 with the current offset otherwise).
+    Bytes are persisted as they arrive, so an interrupted chunk can be
+    resumed from GET /uploads/{upload_id}.
+    """
+    offset = upload_offset
+    buffer = bytearray()
+    try:
+        async for piece in request.stream():
+            buffer.extend(piece)
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                offset = await run_in_threadpool(uploads.append, upload_id, offset, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            offset = await run_in_threadpool(uploads.append, upload_id, offset, bytes(buffer))
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except OffsetMismatchError as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.offset)})
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    upload = await run_in_threadpool(_get_upload, upload_id)
+    response.headers["Upload-Offset"] = str(upload.offset)
+    return _upload_response(upload)
+
+@router.post("/uploads/{upload_id}/finalize", response_model=JobResponse, status_code=202)
+async def finalize_upload(upload_id: str):
+    """
+    Verifies the upload is complete (and matches its declared SHA-256), then
+    queues it for analysis like POST /jobs.
+    """
+    upload = await run_in_threadpool(_get_upload, upload_id)
+    try:
+        file_path, content_hash = await run_in_threadpool(uploads.finalize, upload_id, str(UPLOAD_DIR))
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadIncompleteError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ChecksumMismatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return await _enqueue(file_path, upload.filename, content_hash)
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def abort_upload(upload_id: str):
+    try:
+        await run_in_threadpool(uploads.abort, upload_id)
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(status_code=204)
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Returns the status of a queued analysis, and its result once completed.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return _job_response(job)
+
+def _require_segment_token(token: Optional[str]):
+    # Segment endpoints read and write the uploads, so only coordinators holding the shared token may call them
+    if not settings.segment_token:
+        raise HTTPException(status_code=404, detail="Segment endpoints are disabled on this node")
+    if token is None or not hmac.compare_digest(token.encode(), settings.segment_token.encode()):
+        raise HTTPException(status_code=403, detail=f"Missing or invalid {SEGMENT_TOKEN_HEADER} header")
+
+def _find_source(sha256: str) -> Optional[Path]:
+    return next((p for p in UPLOAD_DIR.glob(f"{sha256.lower()}*") if p.is_file()), None)
+
+def _analyze_segment_admitted(file_path: Path, segment: Dict[str, Any], model: Optional[str]) -> Dict[str, Any]:
+    # A segment costs its share of the whole video's estimate
+    with telemetry.span("admission"):
+        metadata = runtime.detector.video_processor.get_video_metadata(str(file_path), probe_audio=True)
+    duration = metadata.get("duration") or 0.0
+    share = min(1.0, (segment["end"] - segment["start"]) / duration) if duration > 0 else 1.0
+    ticket = _acquire(estimate_cost(metadata) * share, settings.admission_wait_seconds)
+    try:
+        return runtime.detector.analyze_segment(str(file_path), segment, model=model)
     finally:
-        # Optional: Cleanup uploaded file to save space
-        # if file_path.exists():
-        #     os.remove(file_path)
-        pass
+        admission.release(ticket)
 
+@router.post("/segments")
+async def analyze_segment(body: SegmentRequest,
+                          token: Optional[str] = Header(default=None, alias=SEGMENT_TOKEN_HEADER)):
+    """
+    Scores one time segment of a video for a coordinating node
+    (SHERLOCK_SEGMENT_NODES) and returns the raw frame and audio scores.
+    404 means this node does not hold the video: send it with
+    PUT /segments/sources/{sha256}. Requires SHERLOCK_SEGMENT_TOKEN.
+    """
+    _require_segment_token(token)
+    _require_ready()
+    if not SHA256_RE.match(body.sha256):
+        raise HTTPException(status_code=400, detail="Expected a hex-encoded SHA-256 digest")
+    if body.model is not None and not runtime.detector.models.available(body.model):
+        raise HTTPException(status_code=400, detail=f"Unknown model {body.model!r}")
+    source = await run_in_threadpool(_find_source, body.sha256)
+    if source is None:
+        raise HTTPException(status_code=404, detail=SOURCE_NOT_FOUND)
+    return await run_in_threadpool(_analyze_segment_admitted, source, body.segment.model_dump(), body.model)
+
+@router.put("/segments/sources/{sha256}", status_code=204)
+async def put_segment_source(sha256: str, request: Request,
+                             suffix: str = Query(".mp4", pattern=r"^\.[A-Za-z0-9]{1,8}$"),
+                             token: Optional[str] = Header(default=None, alias=SEGMENT_TOKEN_HEADER)):
+    """
+    Stores a video sent by a coordinating node with the uploads, under its
+    SHA-256, which must match the body (422 otherwise). Requires
+    SHERLOCK_SEGMENT_TOKEN.
+    """
+    _require_segment_token(token)
+    if not SHA256_RE.match(sha256):
+        raise HTTPException(status_code=400, detail="Expected a hex-encoded SHA-256 digest")
+    if await run_in_threadpool(_find_source, sha256) is not None:
+        return Response(status_code=204)
+
+    tmp_path = UPLOAD_DIR / f".{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+    try:
+        with tmp_path.open("wb") as f:
+            async for piece in request.stream():
+                size += len(piece)
+                if size > UPLOAD_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds the {UPLOAD_MAX_BYTES} byte limit")
+                digest.update(piece)
+                buffer.extend(piece)
+                if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                    await run_in_threadpool(f.write, bytes(buffer))
+                    buffer.clear()
+            await run_in_threadpool(f.write, bytes(buffer))
+        if digest.hexdigest() != sha256.lower():
+            raise HTTPException(status_code=422, detail=f"Body has SHA-256 {digest.hexdigest()}")
+        os.replace(tmp_path, UPLOAD_DIR / f"{sha256.lower()}{suffix.lower()}")
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return Response(status_code=204)
 
+@router.get("/models")
+async def models_stats():
+    """
+    Visual models currently loaded, their memory and use, and the budget
+    (SHERLOCK_MODEL_MEMORY_BUDGET_MB) they are evicted against.
+    """
+    _require_ready()
+    return {
+        "visual_model": runtime.detector.visual_spec,
+        "cascade_model": runtime.detector.cascade_spec,
+        **runtime.detector.models.stats(),
+    }
 
+@router.get("/batching/stats")
+async def batching_stats():
+    """
+    Batch-fill metrics of the cross-request batching schedulers, for tuning
+    SHERLOCK_BATCH_MAX_SIZE and SHERLOCK_BATCH_MAX_WAIT_MS.
+    """
+    visual_batcher = audio_batcher = None
+    if runtime.ready:
+        visual_batcher = runtime.detector.visual_model.batcher
+        audio_batcher = runtime.detector.audio_model.batcher
+    return {
+        "enabled": settings.batching_enabled,
+        "visual": visual_batcher.stats() if visual_batcher else None,
+        "audio": audio_batcher.stats() if audio_batcher else None,
+    }
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 class AnalysisResponse(BaseModel):
     filename: str
@@ -8,9 +8,46 @@ class AnalysisResponse(BaseModel):
     fake_probability: float
     details: Dict[str, Optional[float]]
     processing_time: float
+    # Per-stage milliseconds, only when requested with ?timings=true
+    timings: Optional[Dict[str, float]] = None
 
-class ErrorResponse(BaseModel):
-    error: str
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    filename: str
+    created_at: float
+    finished_at: Optional[float] = None
+    result: Optional[AnalysisResponse] = None
+    error: Optional[str] = None
 
+class UploadCreateRequest(BaseModel):
+    filename: str
+    size: int
+    # Optional expected digest, checked on finalize
+    sha256: Optional[str] = None
 
+class UploadResponse(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    offset: int
+    chunk_size: int
+    expires_at: float
 
+class SegmentSpec(BaseModel):
+    index: int
+    start: float
+    end: float
+    # Sample positions as fractions of the whole video
+    positions: List[float] = []
+    # "none", "clip" or "windowed"
+    audio: str = "none"
+
+class SegmentRequest(BaseModel):
+    # Upload the segment belongs to, by content hash
+    sha256: str
+    segment: SegmentSpec
+    model: Optional[str] = None
+
+class ErrorResponse(BaseModel):
+    error: str
@@ -0,0 +1,78 @@
+import math
+from typing import List, Sequence
+
+
+def coarse_to_fine_stages(min_frames: int, max_frames: int) -> List[List[float]]:
+    """
+    Splits up to `max_frames` sample positions (fractions of the video length,
+    0.0 to 1.0) into stages. The first stage spreads `min_frames` samples
+    evenly; every later stage adds the midpoints of the widest remaining gaps,
+    roughly doubling the sampling density, until `max_frames` is reached.
+    """
+    if max_frames <= 1:
+        return [[0.5]]
+    min_frames = max(2, min(min_frames, max_frames))
+    first = [i / (min_frames - 1) for i in range(min_frames)]
+
+    stages = [first]
+    chosen = sorted(first)
+    while len(chosen) < max_frames:
+        gaps = [(chosen[i + 1] - chosen[i], chosen[i]) for i in range(len(chosen) - 1)]
+        if not gaps:
+            break
+        budget = min(len(gaps), max_frames - len(chosen))
+        # Widest gaps first; among equally wide gaps, spread the picks evenly
+        widest = max(width for width, _ in gaps)
+        candidates = sorted(gap for gap in gaps if math.isclose(gap[0], widest))
+        if len(candidates) > budget:
+            step = len(candidates) / budget
+            candidates = [candidates[int(i * step + step / 2)] for i in range(budget)]
+        stage = sorted(start + width / 2 for width, start in candidates[:budget])
+        stages.append(stage)
+        chosen = sorted(chosen + stage)
+    return stages
+
+
+def distinct_frame_stages(stages: List[List[float]], total_frames: int) -> List[List[float]]:
+    """
+    Snaps stage positions to the frames of a `total_frames` long video and
+    drops frames an earlier stage (or the same one) already sampled, so on
+    short videos no frame is scored twice. Stages left empty are dropped.
+    """
+    if total_frames <= 1:
+        return stages[:1]
+    last = total_frames - 1
+    seen = set()
+    distinct = []
+    for stage in stages:
+        indices = sorted({int(round(p * last)) for p in stage} - seen)
+        seen.update(indices)
+        if indices:
+            distinct.append([i / last for i in indices])
+    return distinct
+
+
+def confidence_bound(probs: Sequence[float], z: float, min_std: float) -> float:
+    """
+    Half-width of the confidence interval on the mean frame probability.
+    The sample standard deviation is floored at `min_std` so a handful of
+    identical scores cannot claim certainty on their own.
+    """
+    n = len(probs)
+    if n == 0:
+        return math.inf
+    mean = sum(probs) / n
+    std = math.sqrt(sum((p - mean) ** 2 for p in probs) / (n - 1)) if n > 1 else 0.0
+    return z * max(std, min_std) / math.sqrt(n)
+
+
+def is_decided(probs: Sequence[float], threshold: float, z: float, min_std: float) -> bool:
+    """
+    True once the confidence interval on the mean lies entirely on one side
+    of the decision threshold.
+    """
+    if not probs:
+        return False
+    mean = sum(probs) / len(probs)
+    bound = confidence_bound(probs, z, min_std)
+    return mean - bound > threshold or mean + bound < threshold
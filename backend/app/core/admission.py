@@ -0,0 +1,157 @@
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+# Cost model in "reference analyses": scoring max_frames=20 frames of a 720p
+# clip with a 5 s audio clip costs about 1.0 (roughly a second of CPU here).
+# Sampled frames pay a fixed forward pass plus decoding that grows with the
+# frame size; the container length only adds seeking and demuxing, unless
+# the windowed audio mode scores the whole track.
+FRAME_COST = 0.025
+MEGAPIXEL_FRAME_COST = 0.03
+SECOND_COST = 0.0015
+AUDIO_CLIP_COST = 0.025
+AUDIO_WINDOW_COST = 0.01
+# Used when the header cannot be read; such files usually fail fast anyway
+UNKNOWN_COST = 1.0
+
+PRIORITY = "priority"
+STANDARD = "standard"
+
+ADMISSIONS = registry.counter("sherlock_admission_total", "Admission decisions by lane and outcome.")
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when an analysis does not fit in the budget within the allowed wait."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_cost(metadata: Dict[str, Any]) -> float:
+    """
+    Estimates what analysing a video costs from its header metadata
+    (see VideoProcessor.get_video_metadata with probe_audio=True).
+    """
+    if not metadata or not metadata.get("width") or not metadata.get("height"):
+        return UNKNOWN_COST
+
+    frames = settings.max_frames
+    if metadata.get("frame_count", 0) > 0:
+        frames = min(frames, metadata["frame_count"])
+    megapixels = metadata["width"] * metadata["height"] / 1e6
+    duration = max(float(metadata.get("duration") or 0.0), 0.0)
+
+    cost = frames * (FRAME_COST + MEGAPIXEL_FRAME_COST * megapixels) + duration * SECOND_COST
+    if metadata.get("has_audio", True):
+        if settings.audio_mode == "windowed":
+            hop = max(settings.audio_hop_seconds, 1e-3)
+            cost += AUDIO_WINDOW_COST * max(1, math.ceil(duration / hop))
+        else:
+            cost += AUDIO_CLIP_COST
+    return round(cost, 4)
+
+
+@dataclass
+class Ticket:
+    cost: float
+    lane: str
+    expected_seconds: float
+    started_at: float = field(default_factory=time.monotonic)
+
+
+class AdmissionController:
+    """
+    Keeps the summed estimated cost of running analyses under `budget`.
+
+    Cheap requests (cost <= `priority_max_cost`) use the priority lane: they
+    may also use the last `priority_reserve` of the budget, and standard
+    requests never overtake a waiting priority request, so short clips are
+    not stuck behind large files. A request larger than the whole budget is
+    admitted only when nothing else is running.
+    """
+
+    def __init__(self, budget: float, priority_reserve: float = 0.25, priority_max_cost: float = 1.5):
+        self.budget = budget
+        self.priority_reserve = priority_reserve
+        self.priority_max_cost = priority_max_cost
+        self._inflight: List[Ticket] = []
+        self._priority_waiting = 0
+        # Observed seconds per unit of cost, for Retry-After estimates
+        self._seconds_per_cost = 1.0
+        self._cond = threading.Condition()
+
+    def lane_for(self, cost: float) -> str:
+        return PRIORITY if cost <= self.priority_max_cost else STANDARD
+
+    def inflight_cost(self) -> float:
+        with self._cond:
+            return sum(t.cost for t in self._inflight)
+
+    def acquire(self, cost: float, wait: Optional[float] = 0.0) -> Ticket:
+        """
+        Admits a request of the given cost, waiting up to `wait` seconds for
+        room (None waits indefinitely). Raises AdmissionRejectedError with a
+        Retry-After estimate when it does not fit in time.
+        """
+        lane = self.lane_for(cost)
+        deadline = None if wait is None else time.monotonic() + wait
+        with self._cond:
+            if lane == PRIORITY:
+                self._priority_waiting += 1
+            try:
+                while not self._fits(cost, lane):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        ADMISSIONS.inc(lane=lane, outcome="rejected")
+                        raise AdmissionRejectedError(
+                            f"Server is at capacity ({self._used():.1f} of {self.budget:.1f} cost units in use)",
+                            retry_after=self._retry_after(cost, lane),
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                if lane == PRIORITY:
+                    self._priority_waiting -= 1
+
+            ticket = Ticket(cost=cost, lane=lane, expected_seconds=cost * self._seconds_per_cost)
+            self._inflight.append(ticket)
+            ADMISSIONS.inc(lane=lane, outcome="admitted")
+            return ticket
+
+    def release(self, ticket: Ticket):
+        elapsed = time.monotonic() - ticket.started_at
+        with self._cond:
+            self._inflight.remove(ticket)
+            if ticket.cost > 0:
+                self._seconds_per_cost = 0.8 * self._seconds_per_cost + 0.2 * elapsed / ticket.cost
+            self._cond.notify_all()
+
+    def _used(self) -> float:
+        return sum(t.cost for t in self._inflight)
+
+    def _limit(self, lane: str) -> float:
+        return self.budget if lane == PRIORITY else self.budget * (1.0 - self.priority_reserve)
+
+    def _fits(self, cost: float, lane: str) -> bool:
+        if self.budget <= 0 or not self._inflight:
+            return True
+        if lane == STANDARD and self._priority_waiting:
+            return False
+        return self._used() + cost <= self._limit(lane)
+
+    def _retry_after(self, cost: float, lane: str) -> int:
+        # Expected finish times of running analyses, soonest first, until enough cost is freed
+        now = time.monotonic()
+        shortfall = self._used() + cost - self._limit(lane)
+        for ticket in sorted(self._inflight, key=lambda t: t.started_at + t.expected_seconds):
+            shortfall -= ticket.cost
+            if shortfall <= 0:
+                seconds = ticket.started_at + ticket.expected_seconds - now
+                return int(min(max(math.ceil(seconds), 1), 60))
+        return 60
@@ -0,0 +1,217 @@
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Set
+
+from app.core.config import settings
+from app.core.prefork import threads_per_worker
+from app.core.runtime import runtime
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v")
+
+
+def _read_manifest(path: str) -> Iterator[str]:
+    """
+    Paths listed in a manifest: JSONL objects with a "path" key, a CSV whose
+    header row has a "path" column, or plain text with one path per line.
+    Relative paths are resolved against the manifest's directory. Raises
+    ValueError for a CSV without a "path" column.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="") as f:
+        if path.endswith(".jsonl"):
+            entries = (json.loads(line)["path"] for line in f if line.strip())
+        elif path.endswith(".csv"):
+            reader = csv.DictReader(f)
+            if "path" not in (reader.fieldnames or []):
+                raise ValueError(f"{path}: CSV manifests need a header row with a 'path' column "
+                                 f"(found {reader.fieldnames or 'no header'}); list bare paths in a .txt manifest")
+            entries = (row["path"] for row in reader if row["path"])
+        else:
+            entries = (line.strip() for line in f if line.strip() and not line.startswith("#"))
+        for entry in entries:
+            yield entry if os.path.isabs(entry) else os.path.join(base, entry)
+
+
+def collect_inputs(sources: Iterable[str], extensions: Iterable[str] = VIDEO_EXTENSIONS) -> List[str]:
+    """
+    Expands directories (recursively), glob patterns and manifest files into
+    a de-duplicated, sorted list of absolute video paths.
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    paths: Set[str] = set()
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, files in os.walk(source):
+                paths.update(os.path.join(root, name) for name in files if name.lower().endswith(extensions))
+        elif any(ch in source for ch in "*?["):
+            paths.update(p for p in glob.glob(source, recursive=True) if os.path.isfile(p))
+        elif source.lower().endswith(extensions):
+            paths.add(source)
+        elif os.path.isfile(source):
+            paths.update(_read_manifest(source))
+        else:
+            print(f"Skipping {source}: not a directory, glob, video or manifest", file=sys.stderr)
+    return sorted({os.path.abspath(p) for p in paths})
+
+
+def completed_paths(output_path: str, include_errors: bool = True) -> Set[str]:
+    """
+    Paths already recorded in a JSONL results file, for resuming a run.
+    A truncated last line (from an interrupted run) is ignored.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if include_errors or record.get("error") is None:
+                done.add(record["path"])
+    return done
+
+
+def compact_results(output_path: str) -> int:
+    """
+    Rewrites a JSONL results file without the error records of paths that
+    also have a successful record, e.g. after a run with retry_errors.
+    Returns the number of records dropped.
+    """
+    with open(output_path) as f:
+        lines = f.readlines()
+    records = []
+    succeeded: Set[str] = set()
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = None
+        records.append(record)
+        if record is not None and record.get("error") is None:
+            succeeded.add(record["path"])
+
+    kept = [line for line, record in zip(lines, records)
+            if record is None or record.get("error") is None or record["path"] not in succeeded]
+    if len(kept) == len(lines):
+        return 0
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.writelines(kept)
+    os.replace(tmp_path, output_path)
+    return len(lines) - len(kept)
+
+
+def _analyze_one(path: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    record: Dict[str, Any] = {"path": path, "result": None, "error": None}
+    try:
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        result = runtime.detector.analyze_video(path)
+        if "error" in result:
+            record["error"] = result["error"]
+        else:
+            record["result"] = result
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def _init_worker(threads: int):
+    runtime.after_fork(threads, warmup_iterations=1)
+
+
+def _format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}"
+
+
+class BatchRunner:
+    """
+    Scores many videos and appends one JSON line per video to `output_path`
+    as results arrive (in completion order).
+
+    Models are loaded once and shared with `workers` forked processes, each
+    running whole analyses on its share of the CPU threads. While one worker
+    runs a forward pass, others are decoding (OpenCV or ffmpeg subprocesses),
+    so decode and inference overlap across the pool.
+    """
+
+    def __init__(self, output_path: str, workers: int = 1, threads: int = 0, resume: bool = True,
+                 retry_errors: bool = False):
+        self.output_path = output_path
+        self.workers = max(1, workers)
+        self.threads = threads_per_worker(self.workers, threads)
+        self.resume = resume
+        self.retry_errors = retry_errors
+
+    def run(self, paths: List[str]) -> Dict[str, int]:
+        if self.resume:
+            done = completed_paths(self.output_path, include_errors=not self.retry_errors)
+            pending = [p for p in paths if p not in done]
+            if len(pending) < len(paths):
+                print(f"Resuming: {len(paths) - len(pending)} of {len(paths)} already in {self.output_path}")
+        else:
+            pending = paths
+            open(self.output_path, "w").close()
+
+        counts = {"total": len(pending), "ok": 0, "errors": 0}
+        if not pending:
+            return counts
+
+        print(f"Loading models for {len(pending)} videos ({self.workers} workers x {self.threads} threads)")
+        # Forked workers warm themselves up; warming here would start thread pools before fork()
+        runtime.load(warmup_iterations=0 if self.workers > 1 else settings.warmup_iterations)
+        if not runtime.ready:
+            raise RuntimeError(f"Model loading failed: {runtime.error}")
+
+        output_dir = os.path.dirname(os.path.abspath(self.output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        with open(self.output_path, "a") as out:
+            start = time.monotonic()
+            for record in self._results(pending):
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                counts["errors" if record["error"] else "ok"] += 1
+                self._report(counts, start, record)
+        if self.resume and self.retry_errors:
+            dropped = compact_results(self.output_path)
+            if dropped:
+                print(f"Removed {dropped} error records superseded by successful retries")
+        return counts
+
+    def _results(self, paths: List[str]) -> Iterator[Dict[str, Any]]:
+        if self.workers == 1:
+            import torch
+
+            torch.set_num_threads(self.threads)
+            for path in paths:
+                yield _analyze_one(path)
+            return
+
+        runtime.share_memory()
+        context = multiprocessing.get_context("fork")
+        with context.Pool(self.workers, initializer=_init_worker, initargs=(self.threads,)) as pool:
+            yield from pool.imap_unordered(_analyze_one, paths, chunksize=1)
+
+    @staticmethod
+    def _report(counts: Dict[str, int], start: float, record: Dict[str, Any]):
+        finished = counts["ok"] + counts["errors"]
+        elapsed = time.monotonic() - start
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        eta = (counts["total"] - finished) / rate if rate > 0 else 0.0
+        status = "error" if record["error"] else "ok"
+        print(
+            f"[{finished}/{counts['total']}] {rate:.2f} videos/s, ETA {_format_eta(eta)}, "
+            f"{counts['errors']} errors | {status} {os.path.basename(record['path'])} ({record['seconds']:.1f}s)",
+            file=sys.stderr,
+        )
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+
+
+def _env_str(name: str, default: str) -> str:
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return value.strip().lower() in ("1", "true", "yes", "on") if value not in (None, "") else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+@dataclass
+class Settings:
+    """
+    Runtime configuration for the detection engine.
+    Every field can be overridden with a SHERLOCK_* environment variable.
+    """
+    # Number of frames stacked into a single EfficientNet forward pass
+    visual_batch_size: int = field(default_factory=lambda: _env_int("SHERLOCK_VISUAL_BATCH_SIZE", 8))
+    # Number of frames sampled per video by the visual branch
+    max_frames: int = field(default_factory=lambda: _env_int("SHERLOCK_MAX_FRAMES", 20))
+    # "uniform" always scores max_frames; "adaptive" stops early once confident
+    visual_sampling: str = field(default_factory=lambda: _env_str("SHERLOCK_VISUAL_SAMPLING", "uniform"))
+    # Frames scored in the first adaptive stage
+    adaptive_min_frames: int = field(default_factory=lambda: _env_int("SHERLOCK_ADAPTIVE_MIN_FRAMES", 5))
+    # Width of the confidence interval on the mean frame probability, in standard errors
+    adaptive_confidence_z: float = field(default_factory=lambda: _env_float("SHERLOCK_ADAPTIVE_CONFIDENCE_Z", 2.58))
+    # Floor on the frame-score standard deviation used by the interval
+    adaptive_min_std: float = field(default_factory=lambda: _env_float("SHERLOCK_ADAPTIVE_MIN_STD", 0.05))
+    # "memory" streams sampled frames straight into the model, "disk" writes JPEGs first
+    frame_extraction: str = field(default_factory=lambda: _env_str("SHERLOCK_FRAME_EXTRACTION", "memory"))
+    # Decoder used for in-memory extraction: "opencv" or "ffmpeg"
+    video_decoder: str = field(default_factory=lambda: _env_str("SHERLOCK_VIDEO_DECODER", "opencv"))
+    # Parallel ffmpeg processes per video (0 = one per CPU core)
+    decode_workers: int = field(default_factory=lambda: _env_int("SHERLOCK_DECODE_WORKERS", 0))
+    # Minimum length of a time segment handed to one ffmpeg process
+    decode_segment_seconds: float = field(default_factory=lambda: _env_float("SHERLOCK_DECODE_SEGMENT_SECONDS", 10.0))
+    # "memory" pipes PCM from ffmpeg into MFCC, "disk" writes and re-reads a WAV
+    audio_extraction: str = field(default_factory=lambda: _env_str("SHERLOCK_AUDIO_EXTRACTION", "memory"))
+    # "separate" opens the video per branch; "single_pass" demuxes it once and feeds both branches
+    media_ingest: str = field(default_factory=lambda: _env_str("SHERLOCK_MEDIA_INGEST", "separate"))
+    # MFCC implementation: "librosa" or "torchaudio"
+    mfcc_backend: str = field(default_factory=lambda: _env_str("SHERLOCK_MFCC_BACKEND", "librosa"))
+    # Seconds of audio scored by the audio model
+    audio_duration: int = field(default_factory=lambda: _env_int("SHERLOCK_AUDIO_DURATION", 5))
+    # Threads running the visual and audio branches of concurrent analyses
+    branch_workers: int = field(default_factory=lambda: _env_int("SHERLOCK_BRANCH_WORKERS", 8))
+    # Seconds before a branch is cancelled and treated as missing (0 = no limit)
+    visual_timeout_seconds: float = field(default_factory=lambda: _env_float("SHERLOCK_VISUAL_TIMEOUT_SECONDS", 300.0))
+    audio_timeout_seconds: float = field(default_factory=lambda: _env_float("SHERLOCK_AUDIO_TIMEOUT_SECONDS", 120.0))
+    # Inference backend per model: eager, torchscript, compile, onnx, int8_dynamic, int8_static
+    visual_backend: str = field(default_factory=lambda: _env_str("SHERLOCK_VISUAL_BACKEND", "eager"))
+    audio_backend: str = field(default_factory=lambda: _env_str("SHERLOCK_AUDIO_BACKEND", "eager"))
+    # Directory holding exported model artifacts (see export_models.py)
+    model_artifact_dir: str = field(default_factory=lambda: _env_str("SHERLOCK_MODEL_ARTIFACT_DIR", "data/models"))
+    # Visual model as name[@version] (e.g. a customer fine-tune); the screening model when cascading
+    visual_model: str = field(default_factory=lambda: _env_str("SHERLOCK_VISUAL_MODEL", "efficientnet_b0"))
+    # Heavier model that re-scores uncertain results (empty disables the cascade)
+    cascade_model: str = field(default_factory=lambda: _env_str("SHERLOCK_CASCADE_MODEL", ""))
+    # Results whose fake probability is within this distance of 0.5 are escalated
+    cascade_band: float = field(default_factory=lambda: _env_float("SHERLOCK_CASCADE_BAND", 0.15))
+    # RAM for loaded visual models, in MB; least recently used ones are evicted beyond it (0 = no limit)
+    model_memory_budget_mb: int = field(default_factory=lambda: _env_int("SHERLOCK_MODEL_MEMORY_BUDGET_MB", 2048))
+    # "tensor" (batched tensor ops on uint8 frames) or "pil" (per-frame torchvision transform)
+    preprocessing: str = field(default_factory=lambda: _env_str("SHERLOCK_PREPROCESSING", "tensor"))
+    # Run the visual model and its inputs in channels_last memory format
+    channels_last: bool = field(default_factory=lambda: _env_bool("SHERLOCK_CHANNELS_LAST", False))
+    # Local model weights with a checksum manifest (see fetch_weights.py)
+    weights_dir: str = field(default_factory=lambda: _env_str("SHERLOCK_WEIGHTS_DIR", "data/weights"))
+    # Verify weight files against their manifest checksum when loading
+    weights_verify: bool = field(default_factory=lambda: _env_bool("SHERLOCK_WEIGHTS_VERIFY", True))
+    # Fall back to downloading ImageNet weights when none are stored locally; disable on air-gapped nodes
+    weights_download: bool = field(default_factory=lambda: _env_bool("SHERLOCK_WEIGHTS_DOWNLOAD", True))
+    # Reuse the score of a sampled frame that is a near duplicate (perceptual hash) of one already scored;
+    # opt-in, since reused scores differ slightly from scoring every frame
+    frame_dedup: bool = field(default_factory=lambda: _env_bool("SHERLOCK_FRAME_DEDUP", False))
+    # Largest Hamming distance between 64-bit frame hashes treated as the same frame
+    frame_dedup_distance: int = field(default_factory=lambda: _env_int("SHERLOCK_FRAME_DEDUP_DISTANCE", 3))
+    # Persistent frame hash -> score cache shared across videos and workers (0 entries disables)
+    frame_cache_path: str = field(default_factory=lambda: _env_str("SHERLOCK_FRAME_CACHE_PATH", "data/cache/frames.sqlite"))
+    frame_cache_entries: int = field(default_factory=lambda: _env_int("SHERLOCK_FRAME_CACHE_ENTRIES", 200000))
+    # Merge forward passes from concurrent requests into shared batches
+    batching_enabled: bool = field(default_factory=lambda: _env_bool("SHERLOCK_BATCHING_ENABLED", False))
+    # Largest cross-request batch; a batch is flushed as soon as it is full
+    batch_max_size: int = field(default_factory=lambda: _env_int("SHERLOCK_BATCH_MAX_SIZE", 32))
+    # Longest a queued input waits for the batch to fill before it is flushed
+    batch_max_wait_ms: float = field(default_factory=lambda: _env_float("SHERLOCK_BATCH_MAX_WAIT_MS", 5.0))
+    # Identifies the deployed model weights; part of every result cache key
+    model_version: str = field(default_factory=lambda: _env_str("SHERLOCK_MODEL_VERSION", "1.0.0"))
+    # Directory of the persistent result cache tier
+    result_cache_dir: str = field(default_factory=lambda: _env_str("SHERLOCK_RESULT_CACHE_DIR", "data/cache/results"))
+    # Entries held in the in-memory LRU tier
+    result_cache_memory_entries: int = field(default_factory=lambda: _env_int("SHERLOCK_RESULT_CACHE_MEMORY_ENTRIES", 256))
+    # Size cap of the on-disk tier before least recently used entries are evicted
+    result_cache_max_disk_mb: int = field(default_factory=lambda: _env_int("SHERLOCK_RESULT_CACHE_MAX_DISK_MB", 512))
+    # "clip" scores the first audio_duration seconds; "windowed" scores the whole track
+    audio_mode: str = field(default_factory=lambda: _env_str("SHERLOCK_AUDIO_MODE", "clip"))
+    # Window length and hop of the windowed audio mode, in seconds
+    audio_window_seconds: float = field(default_factory=lambda: _env_float("SHERLOCK_AUDIO_WINDOW_SECONDS", 5.0))
+    audio_hop_seconds: float = field(default_factory=lambda: _env_float("SHERLOCK_AUDIO_HOP_SECONDS", 2.5))
+    # Energy gate: frame loudness (dBFS) and share of loud frames for a window to count as speech
+    audio_gate_threshold_db: float = field(default_factory=lambda: _env_float("SHERLOCK_AUDIO_GATE_THRESHOLD_DB", -45.0))
+    audio_gate_min_active_ratio: float = field(default_factory=lambda: _env_float("SHERLOCK_AUDIO_GATE_MIN_ACTIVE_RATIO", 0.2))
+    # Speech windows scored per forward pass (bounds memory on long tracks)
+    audio_window_batch_size: int = field(default_factory=lambda: _env_int("SHERLOCK_AUDIO_WINDOW_BATCH_SIZE", 64))
+    # Reduction of window scores: "mean", "max" or "topk"
+    audio_aggregate: str = field(default_factory=lambda: _env_str("SHERLOCK_AUDIO_AGGREGATE", "topk"))
+    audio_aggregate_top_k: int = field(default_factory=lambda: _env_int("SHERLOCK_AUDIO_AGGREGATE_TOP_K", 3))
+    # Inference worker threads draining the job queue
+    job_workers: int = field(default_factory=lambda: _env_int("SHERLOCK_JOB_WORKERS", 2))
+    # Jobs that may wait in the queue before submissions are rejected
+    job_queue_size: int = field(default_factory=lambda: _env_int("SHERLOCK_JOB_QUEUE_SIZE", 32))
+    # Seconds a finished job's result is kept for polling
+    job_ttl_seconds: float = field(default_factory=lambda: _env_float("SHERLOCK_JOB_TTL_SECONDS", 3600.0))
+
+    # Largest accepted upload, in MB (single-request and chunked uploads)
+    upload_max_mb: int = field(default_factory=lambda: _env_int("SHERLOCK_UPLOAD_MAX_MB", 4096))
+    # Bytes one client may have in unfinished chunked uploads, in MB
+    upload_client_max_mb: int = field(default_factory=lambda: _env_int("SHERLOCK_UPLOAD_CLIENT_MAX_MB", 8192))
+    # Seconds an idle chunked upload is kept for resuming
+    upload_ttl_seconds: float = field(default_factory=lambda: _env_float("SHERLOCK_UPLOAD_TTL_SECONDS", 86400.0))
+    # Chunk size suggested to clients, in MB
+    upload_chunk_mb: int = field(default_factory=lambda: _env_int("SHERLOCK_UPLOAD_CHUNK_MB", 8))
+
+    # Summed estimated cost of concurrent analyses per process; 1.0 is about one 720p clip (0 disables)
+    admission_budget: float = field(default_factory=lambda: _env_float("SHERLOCK_ADMISSION_BUDGET", 8.0))
+    # Share of the budget only priority-lane (cheap) analyses may use
+    admission_priority_reserve: float = field(default_factory=lambda: _env_float("SHERLOCK_ADMISSION_PRIORITY_RESERVE", 0.25))
+    # Largest estimated cost that still qualifies for the priority lane
+    admission_priority_max_cost: float = field(default_factory=lambda: _env_float("SHERLOCK_ADMISSION_PRIORITY_MAX_COST", 1.5))
+    # Seconds a synchronous request waits for room before it is answered with 503
+    admission_wait_seconds: float = field(default_factory=lambda: _env_float("SHERLOCK_ADMISSION_WAIT_SECONDS", 1.0))
+
+    # Fraction of analyses to profile (0 disables sampling; requests can still opt in)
+    profile_sample_rate: float = field(default_factory=lambda: _env_float("SHERLOCK_PROFILE_SAMPLE_RATE", 0.0))
+    # "cprofile" (.prof per thread) or "torch" (Chrome trace of torch ops)
+    profiler: str = field(default_factory=lambda: _env_str("SHERLOCK_PROFILER", "cprofile"))
+    # Where sampled profiles are written
+    profile_dir: str = field(default_factory=lambda: _env_str("SHERLOCK_PROFILE_DIR", "data/profiles"))
+    # Honour the X-Sherlock-Profile request header to profile a single request
+    profile_allow_header: bool = field(default_factory=lambda: _env_bool("SHERLOCK_PROFILE_ALLOW_HEADER", False))
+
+    # "background" serves liveness while models load; "blocking" loads before accepting requests
+    startup_mode: str = field(default_factory=lambda: _env_str("SHERLOCK_STARTUP_MODE", "background"))
+    # Warm-up passes on dummy inputs before the API reports ready (0 disables)
+    warmup_iterations: int = field(default_factory=lambda: _env_int("SHERLOCK_WARMUP_ITERATIONS", 2))
+
+    # API worker processes; above 1, models load once and are shared by forked workers
+    workers: int = field(default_factory=lambda: _env_int("SHERLOCK_WORKERS", 1))
+    # torch/OpenCV threads per worker (0 = available cores split evenly across workers)
+    threads_per_worker: int = field(default_factory=lambda: _env_int("SHERLOCK_THREADS_PER_WORKER", 0))
+
+    # Split long videos into time segments scored by this many local worker processes (0 disables)
+    segment_workers: int = field(default_factory=lambda: _env_int("SHERLOCK_SEGMENT_WORKERS", 0))
+    # Comma-separated base URLs of Sherlock nodes to send segments to instead, e.g. http://10.0.0.5:8000
+    segment_nodes: str = field(default_factory=lambda: _env_str("SHERLOCK_SEGMENT_NODES", ""))
+    # Shortest segment; videos under twice this length are analyzed in one piece
+    segment_min_seconds: float = field(default_factory=lambda: _env_float("SHERLOCK_SEGMENT_MIN_SECONDS", 30.0))
+    # Extra attempts for a failed segment on other workers, before the coordinator scores it itself
+    segment_retries: int = field(default_factory=lambda: _env_int("SHERLOCK_SEGMENT_RETRIES", 2))
+    # Seconds one segment attempt may take before it is retried
+    segment_timeout_seconds: float = field(default_factory=lambda: _env_float("SHERLOCK_SEGMENT_TIMEOUT_SECONDS", 300.0))
+    # Shared secret coordinators send to segment nodes; the segment endpoints are disabled without it
+    segment_token: str = field(default_factory=lambda: _env_str("SHERLOCK_SEGMENT_TOKEN", ""))
+
+    def result_fingerprint(self) -> str:
+        """
+        Short digest of the settings that change analysis results, so
+        cached results are only reused by a matching pipeline.
+        """
+        values = {name: getattr(self, name) for name in RESULT_SETTINGS}
+        return hashlib.sha1(json.dumps(values, sort_keys=True).encode()).hexdigest()[:12]
+
+
+# Fields that change what an analysis returns (models, sampling, decoding, audio scoring)
+RESULT_SETTINGS = (
+    "max_frames", "visual_sampling", "adaptive_min_frames", "adaptive_confidence_z", "adaptive_min_std",
+    "frame_extraction", "video_decoder", "audio_extraction", "media_ingest", "mfcc_backend", "audio_duration",
+    "visual_backend", "audio_backend", "visual_model", "cascade_model", "cascade_band", "preprocessing",
+    "frame_dedup", "frame_dedup_distance", "audio_mode", "audio_window_seconds", "audio_hop_seconds",
+    "audio_gate_threshold_db", "audio_gate_min_active_ratio", "audio_aggregate", "audio_aggregate_top_k",
+)
+
+settings = Settings()
@@ -1,83 +1,711 @@
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional
 import os
+import threading
+import cv2
+import numpy as np
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import asdict, replace
 from app.services.video_processor import VideoProcessor
-from app.services.audio_processor import AudioProcessor
+from app.services.ffmpeg_decoder import FrameGeometry
+from app.services.ffmpeg_utils import ffmpeg_version
+from app.services.media_ingest import MIN_FFMPEG_VERSION, MediaIngest, single_pass_supported
+from app.services.audio_processor import SAMPLE_RATE, AudioProcessor
+from app.services.model_registry import ModelRegistry
 from app.services.model_service import ModelService
 from app.services.audio_model_service import AudioModelService
+from app.core.config import settings
+from app.core.adaptive_sampling import coarse_to_fine_stages, distinct_frame_stages, is_decided
+from app.core import profiling, telemetry
+from app.core.metrics import ANALYSES, CASCADE_DECISIONS, FRAMES_ANALYZED, VISUAL_FPS
+from app.core.prefork import threads_per_worker
+from app.core.segments import (
+    AUDIO_CLIP, AUDIO_NONE, AUDIO_WINDOWED, SEGMENTS_PER_WORKER, HttpSegmentPool, LocalSegmentPool, Segment,
+    SegmentCoordinator, SegmentFailedError, plan_segments,
+)
+
+# How often a branch wait checks for cancellation by the caller
+CANCEL_POLL_SECONDS = 0.1
+
+# Receives (event_type, payload) progress events, from the branch threads
+EventCallback = Callable[[str, Dict[str, Any]], None]
+
+
+def fuse(visual_prob: float, audio_prob: float, has_audio: bool) -> Dict[str, Any]:
+    """
+    Weighted average: Visuals usually carry more weight unless audio is very confident.
+    If no audio, rely 100% on visual.
+    """
+    if has_audio:
+        # Simple fusion: 60% Visual, 40% Audio
+        combined_prob = (visual_prob * 0.6) + (audio_prob * 0.4)
+    else:
+        combined_prob = visual_prob
+
+    is_fake = combined_prob > 0.5
+    final_confidence = combined_prob if is_fake else (1 - combined_prob)
+    return {"is_fake": is_fake, "fake_probability": round(combined_prob, 4), "confidence": round(final_confidence, 4)}
+
+
+class _Progress:
+    """
+    Turns branch milestones into progress events, each carrying a
+    provisional verdict fused from whatever has been scored so far.
+    A no-op when nobody listens.
+    """
+
+    def __init__(self, on_event: Optional[EventCallback]):
+        self.on_event = on_event
+        self._lock = threading.Lock()
+        self._frame_probs: List[float] = []
+        self._audio: Optional[Dict[str, Any]] = None
+
+    def emit(self, event: str, payload: Dict[str, Any]):
+        if self.on_event is not None:
+            self.on_event(event, payload)
+
+    def frames(self, batch_probs: List[float]):
+        if self.on_event is None:
+            return
+        with self._lock:
+            self._frame_probs.extend(batch_probs)
+            visual_prob = sum(self._frame_probs) / len(self._frame_probs)
+            payload = {
+                "batch_probs": [round(p, 4) for p in batch_probs],
+                "frames_analyzed": len(self._frame_probs),
+                "visual_prob": round(visual_prob, 4),
+                "provisional": self._provisional(),
+            }
+        self.emit("frames", payload)
+
+    def audio(self, audio: Dict[str, Any]):
+        if self.on_event is None:
+            return
+        with self._lock:
+            self._audio = audio
+            payload = {
+                "audio_prob": round(audio["prob"], 4) if audio["has_audio"] else None,
+                "has_audio": audio["has_audio"],
+                "provisional": self._provisional(),
+            }
+        self.emit("audio", payload)
+
+    def _provisional(self) -> Optional[Dict[str, Any]]:
+        if not self._frame_probs:
+            return None
+        visual_prob = sum(self._frame_probs) / len(self._frame_probs)
+        has_audio = bool(self._audio and self._audio["has_audio"])
+        return fuse(visual_prob, self._audio["prob"] if has_audio else 0.0, has_audio)
+
 
 class DeepfakeDetector:
-    def __init__(self):
+    def __init__(self, visual_model: Optional[ModelService] = None, audio_model: Optional[AudioModelService] = None,
+                 models: Optional[ModelRegistry] = None):
         self.video_processor = VideoProcessor()
         self.audio_processor = AudioProcessor()
-        self.visual_model = ModelService()
-        self.audio_model = AudioModelService()
 
-    def analyze_video(self, video_path: str) -> Dict[str, Any]:
+        # Visual models are loaded by name on first use and evicted under memory pressure
+        self.models = models if models else ModelRegistry(budget_bytes=settings.model_memory_budget_mb * 1024 * 1024)
+        if visual_model is not None:
+            self.models.add(visual_model)
+        self.visual_spec = visual_model.key if visual_model is not None else settings.visual_model
+        self.cascade_spec = settings.cascade_model or None
+        # The configured models load now, so readiness and warm-up cover them
+        self.models.get(self.visual_spec)
+        if self.cascade_spec:
+            self._cascade_geometry = self.models.get(self.cascade_spec).frame_geometry
+        self.single_pass = settings.media_ingest == "single_pass"
+        if self.single_pass and not single_pass_supported():
+            version = ffmpeg_version()
+            found = ".".join(map(str, version)) if version else "an unrecognized version"
+            print(f"Single-pass ingest needs ffmpeg {'.'.join(map(str, MIN_FFMPEG_VERSION))} or newer, found {found}; "
+                  f"opening streams separately")
+            self.single_pass = False
+        if self.single_pass and settings.visual_sampling == "adaptive":
+            print("SHERLOCK_VISUAL_SAMPLING=adaptive is ignored with single-pass ingest; "
+                  "frames are sampled uniformly")
+        self.audio_model = audio_model if audio_model else AudioModelService()
+
+        # The visual and audio branches are independent until fusion, and
+        # ffmpeg, OpenCV and torch all release the GIL, so they run side by side
+        self._branch_pool = self._new_branch_pool()
+
+        # Segment-parallel analysis of long videos; the pool starts on first use
+        self._segments: Optional[SegmentCoordinator] = None
+        self._segments_pid: Optional[int] = None
+        self._segments_lock = threading.Lock()
+
+    @staticmethod
+    def _new_branch_pool() -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=settings.branch_workers, thread_name_prefix="sherlock-branch")
+
+    @property
+    def visual_model(self) -> ModelService:
+        """
+        The default (screening) visual model.
+        """
+        return self.models.get(self.visual_spec)
+
+    def warm_up(self, iterations: int = 1):
+        """
+        Runs every model and feature extractor on dummy inputs so lazy
+        allocations, kernel selection and librosa's JIT compilation happen
+        before the first real request.
+        """
+        pcm = np.zeros(SAMPLE_RATE * settings.audio_duration, dtype=np.float32)
+        window = np.zeros(int(SAMPLE_RATE * settings.audio_window_seconds), dtype=np.float32)
+        for _ in range(iterations):
+            for model in self.models.loaded():
+                size = model.input_size
+                model.predict_batch([np.zeros((size, size, 3), dtype=np.uint8)] * model.batch_size)
+            self.audio_model.predict_audio(self.audio_processor.mfcc_from_array(pcm, duration=settings.audio_duration))
+            if settings.audio_mode == "windowed":
+                self.audio_model.predict_windows(self.audio_processor.mfcc_batch(np.stack([window, window])))
+
+    def after_fork(self):
+        """
+        Runs in a freshly forked process: rebuilds the branch threads, which
+        only exist in the parent, and the models' fork-unsafe state.
+        """
+        self._branch_pool = self._new_branch_pool()
+        self.models.after_fork()
+        self.audio_model.after_fork()
+
+    def close(self):
+        self._branch_pool.shutdown(wait=False, cancel_futures=True)
+        if self._segments is not None and self._segments_pid == os.getpid():
+            self._segments.close()
+        self.models.close()
+
+    def analyze_video(self, video_path: str, profile: bool = False, cancel_event: Optional[threading.Event] = None,
+                      on_event: Optional[EventCallback] = None, model: Optional[str] = None) -> Dict[str, Any]:
         """
         Orchestrates the analysis process:
         1. Visual Analysis (Frames -> EfficientNet)
         2. Audio Analysis (Wav -> MFCC -> CNN)
         3. Fusion
+
+        The visual and audio branches run concurrently. A branch that exceeds
+        its timeout is cancelled (its ffmpeg processes are killed) and
+        treated as missing.
+
+        Per-stage timings (milliseconds) are returned under "timings". With
+        `profile=True` the analysis is profiled if SHERLOCK_PROFILE_ALLOW_HEADER
+        permits it; otherwise SHERLOCK_PROFILE_SAMPLE_RATE decides.
+
+        `on_event` receives progress as it happens ("metadata", "frames" per
+        scored batch, "audio"), each with a provisional verdict. Setting
+        `cancel_event` stops both branches and returns an error result.
+
+        With SHERLOCK_CASCADE_MODEL set, the visual model screens every video
+        and only results within SHERLOCK_CASCADE_BAND of the decision
+        threshold are re-scored by the cascade model, reusing the frames
+        already decoded. `model` ("name[@version]") picks the visual model
+        for this call instead, without a cascade.
+
+        With SHERLOCK_SEGMENT_WORKERS or SHERLOCK_SEGMENT_NODES set, videos
+        of at least twice SHERLOCK_SEGMENT_MIN_SECONDS are split into time
+        segments scored in parallel (see analyze_segment) and reduced here.
+
+        With SHERLOCK_MEDIA_INGEST=single_pass, one ffmpeg process demuxes
+        the file for both branches and its header provides the metadata
+        (see MediaIngest); frames are then sampled uniformly.
         """
+        with telemetry.trace() as trace:
+            with profiling.profile_request("analysis", requested=profile), telemetry.span("total"):
+                result = self._analyze(video_path, cancel_event, _Progress(on_event), model)
+            if cancel_event is not None and cancel_event.is_set():
+                outcome = "cancelled"
+            else:
+                outcome = "error" if "error" in result else "ok"
+            ANALYSES.inc(outcome=outcome)
+            result["timings"] = trace.timings_ms()
+        return result
+
+    def _analyze(self, video_path: str, cancel_event: Optional[threading.Event], progress: _Progress,
+                 model: Optional[str] = None) -> Dict[str, Any]:
         print(f"Starting multi-modal analysis for: {video_path}")
-        
+        start = time.monotonic()
+
+        coordinator = self._segment_coordinator()
+        if coordinator is not None:
+            metadata = self.video_processor.get_video_metadata(video_path)
+            count = min(coordinator.workers * SEGMENTS_PER_WORKER,
+                        int(metadata.get("duration", 0.0) // max(settings.segment_min_seconds, 1e-3)))
+            if count >= 2:
+                segments = plan_segments(metadata["duration"], count, settings.max_frames, settings.audio_mode,
+                                         settings.audio_hop_seconds)
+                return self._analyze_segmented(video_path, coordinator, segments, metadata, cancel_event, progress,
+                                               model)
+
+        visual_spec = model or self.visual_spec
+        cascade_spec = self.cascade_spec if model is None else None
+        # Frames kept from the screening pass in case the cascade model is needed
+        kept: Optional[List[Any]] = [] if cascade_spec else None
+
+        ingest = None
+        if self.single_pass:
+            geometry = self._frame_geometry(self.models.get(visual_spec), kept is not None)
+            try:
+                with telemetry.span("ingest.open"):
+                    ingest = MediaIngest(video_path, max_frames=settings.max_frames, geometry=geometry,
+                                         cancel_event=cancel_event)
+            except (OSError, ValueError, RuntimeError) as e:
+                print(f"Single-pass ingest failed, opening streams separately: {e}")
+
+        visual_cancel = threading.Event()
+        audio_cancel = threading.Event()
+        visual_future = self._submit_branch("visual", self._analyze_visual, video_path, visual_cancel, progress,
+                                            visual_spec, kept, ingest)
+        audio_future = self._submit_branch("audio", self._analyze_audio, video_path, audio_cancel, ingest,
+                                           on_done=progress.audio)
+        if progress.on_event is not None:
+            metadata = ingest.metadata if ingest is not None else self.video_processor.get_video_metadata(video_path)
+            progress.emit("metadata", metadata)
+
         # --- 1. Visual Analysis ---
-        visual_prob = 0.0
-        visual_confidence = 0.0
-        frames_extracted = 0
-        
-        try:
-            frames = self.video_processor.extract_frames(video_path, max_frames=20)
-            frames_extracted = len(frames)
-            if frames:
-                visual_prob = self.visual_model.predict_frames(frames)
-                visual_confidence = visual_prob if visual_prob > 0.5 else (1 - visual_prob)
-                print(f"Visual Probability: {visual_prob:.4f}")
-        except Exception as e:
-            print(f"Visual analysis error: {e}")
+        visual = self._wait_branch("Visual", visual_future, visual_cancel, start, settings.visual_timeout_seconds,
+                                   cancel_event)
+        if visual is None:
+            visual = {"prob": 0.0, "frames": 0}
+        visual_prob = visual["prob"]
+        frames_extracted = visual["frames"]
 
         # --- 2. Audio Analysis ---
-        audio_prob = 0.0
-        audio_confidence = 0.0
-        has_audio = False
-        
-        try:
-            audio_path = self.audio_processor.extract_audio(video_path)
-            if audio_path:
-                has_audio = True
-                mfcc = self.audio_processor.get_mfcc(audio_path)
-                if mfcc is not None:
-                    audio_prob = self.audio_model.predict_audio(mfcc)
-                    audio_confidence = audio_prob if audio_prob > 0.5 else (1 - audio_prob)
-                    print(f"Audio Probability: {audio_prob:.4f}")
-        except Exception as e:
-            print(f"Audio analysis error: {e}")
+        audio = self._wait_branch("Audio", audio_future, audio_cancel, start, settings.audio_timeout_seconds,
+                                  cancel_event)
+        if ingest is not None:
+            ingest.close()
+        if cancel_event is not None and cancel_event.is_set():
+            return {"file": os.path.basename(video_path), "error": "Analysis cancelled"}
+        if audio is None:
+            audio = {"prob": 0.0, "has_audio": False}
+        audio_prob = audio["prob"]
+        has_audio = audio["has_audio"]
 
         # --- 3. Fusion Logic ---
-        # Weighted average: Visuals usually carry more weight unless audio is very confident
-        # If no audio, rely 100% on visual
-        
-        if has_audio:
-            # Simple fusion: 60% Visual, 40% Audio
-            combined_prob = (visual_prob * 0.6) + (audio_prob * 0.4)
-        else:
-            combined_prob = visual_prob
+        with telemetry.span("fusion"):
+            verdict = fuse(visual_prob, audio_prob, has_audio)
+
+        # --- 4. Cascade: only uncertain verdicts pay for the heavier model ---
+        screen_prob = None
+        if cascade_spec and kept:
+            if abs(verdict["fake_probability"] - 0.5) < settings.cascade_band:
+                confirm_prob = self._escalate(cascade_spec, kept)
+                if confirm_prob is not None:
+                    screen_prob, visual_prob, visual_spec = visual_prob, confirm_prob, cascade_spec
+                    with telemetry.span("fusion"):
+                        verdict = fuse(visual_prob, audio_prob, has_audio)
+                    progress.emit("cascade", {"model": cascade_spec, "screen_visual_prob": round(screen_prob, 4),
+                                              "visual_prob": round(visual_prob, 4), "provisional": verdict})
+            CASCADE_DECISIONS.inc(outcome="escalated" if screen_prob is not None else "screened")
 
-        is_fake = combined_prob > 0.5
-        final_confidence = combined_prob if is_fake else (1 - combined_prob)
+        return self._build_result(video_path, verdict, visual_prob, frames_extracted, audio, visual_spec, screen_prob)
 
+    @staticmethod
+    def _build_result(video_path: str, verdict: Dict[str, Any], visual_prob: float, frames: int,
+                      audio: Dict[str, Any], visual_spec: str, screen_prob: Optional[float]) -> Dict[str, Any]:
+        has_audio = audio["has_audio"]
         result = {
             "file": os.path.basename(video_path),
-            "is_fake": is_fake,
-            "fake_probability": round(combined_prob, 4),
-            "confidence": round(final_confidence, 4),
+            **verdict,
             "details": {
                 "visual_prob": round(visual_prob, 4),
-                "audio_prob": round(audio_prob, 4) if has_audio else None,
-                "frames_analyzed": frames_extracted,
-                "has_audio": has_audio
+                "audio_prob": round(audio["prob"], 4) if has_audio else None,
+                "frames_analyzed": frames,
+                "has_audio": has_audio,
+                "visual_model": visual_spec,
             }
         }
-        
+        if screen_prob is not None:
+            result["details"]["screen_visual_prob"] = round(screen_prob, 4)
+        if audio.get("windows") is not None:
+            result["details"]["audio_windows"] = audio["windows"]
+            result["details"]["audio_windows_skipped"] = audio.get("windows_skipped", 0)
         return result
 
+    def _segment_coordinator(self) -> Optional[SegmentCoordinator]:
+        nodes = [node.strip() for node in settings.segment_nodes.split(",") if node.strip()]
+        if not nodes and settings.segment_workers <= 0:
+            return None
+        with self._segments_lock:
+            # A forked process (e.g. a pre-fork API worker) starts its own pool
+            if self._segments is None or self._segments_pid != os.getpid():
+                if nodes:
+                    pool = HttpSegmentPool(nodes, timeout=settings.segment_timeout_seconds,
+                                           token=settings.segment_token)
+                else:
+                    # Segment workers share this process's cores, not the whole machine's
+                    threads = threads_per_worker(settings.workers, settings.threads_per_worker)
+                    pool = LocalSegmentPool(settings.segment_workers, threads)
+                self._segments = SegmentCoordinator(pool, retries=settings.segment_retries,
+                                                    timeout=settings.segment_timeout_seconds)
+                self._segments_pid = os.getpid()
+            return self._segments
+
+    def _analyze_segmented(self, video_path: str, coordinator: SegmentCoordinator, segments: List[Segment],
+                           metadata: Dict[str, Any], cancel_event: Optional[threading.Event], progress: _Progress,
+                           model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Scores the segments on the coordinator's workers, then reduces them
+        as one pass would: frame scores are averaged over all segments,
+        speech windows are aggregated together and the audio clip comes from
+        the first segment. When the cascade is needed, only the frames are
+        re-scored, again segment by segment.
+        """
+        visual_spec = model or self.visual_spec
+        cascade_spec = self.cascade_spec if model is None else None
+        print(f"Scoring {len(segments)} segments on {coordinator.workers} workers")
+        progress.emit("metadata", {**metadata, "segments": len(segments)})
+
+        def on_result(segment: Segment, result: Dict[str, Any]):
+            if result["frame_probs"]:
+                progress.frames(result["frame_probs"])
+            if segment.audio == AUDIO_CLIP and result["audio"] is not None:
+                progress.audio(result["audio"])
+
+        def score(spec: str, todo: List[Segment]) -> Optional[List[Dict[str, Any]]]:
+            fallback = lambda segment: self.analyze_segment(video_path, asdict(segment), model=spec)
+            with telemetry.span("segments"):
+                return coordinator.run(video_path, todo, spec, fallback=fallback, cancel_event=cancel_event,
+                                       on_result=on_result)
+
+        try:
+            results = score(visual_spec, segments)
+            if results is None:
+                return {"file": os.path.basename(video_path), "error": "Analysis cancelled"}
+
+            frame_probs = [p for result in results for p in result["frame_probs"]]
+            visual_prob = sum(frame_probs) / len(frame_probs) if frame_probs else 0.0
+            FRAMES_ANALYZED.inc(len(frame_probs))
+            audio = self._reduce_segment_audio(segments, results)
+            with telemetry.span("fusion"):
+                verdict = fuse(visual_prob, audio["prob"], audio["has_audio"])
+
+            screen_prob = None
+            if cascade_spec:
+                if frame_probs and abs(verdict["fake_probability"] - 0.5) < settings.cascade_band:
+                    visual_only = [replace(segment, audio=AUDIO_NONE) for segment in segments if segment.positions]
+                    confirm = score(cascade_spec, visual_only)
+                    if confirm is None:
+                        return {"file": os.path.basename(video_path), "error": "Analysis cancelled"}
+                    confirm_probs = [p for result in confirm for p in result["frame_probs"]]
+                    if confirm_probs:
+                        screen_prob, visual_prob = visual_prob, sum(confirm_probs) / len(confirm_probs)
+                        visual_spec = cascade_spec
+                        with telemetry.span("fusion"):
+                            verdict = fuse(visual_prob, audio["prob"], audio["has_audio"])
+                        progress.emit("cascade", {"model": cascade_spec, "screen_visual_prob": round(screen_prob, 4),
+                                                  "visual_prob": round(visual_prob, 4), "provisional": verdict})
+                CASCADE_DECISIONS.inc(outcome="escalated" if screen_prob is not None else "screened")
+        except SegmentFailedError as e:
+            print(f"Segmented analysis failed: {e}")
+            return {"file": os.path.basename(video_path), "error": str(e)}
+
+        result = self._build_result(video_path, verdict, visual_prob, len(frame_probs), audio, visual_spec,
+                                    screen_prob)
+        result["details"]["segments"] = len(segments)
+        return result
+
+    def _reduce_segment_audio(self, segments: List[Segment], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if settings.audio_mode != "windowed":
+            for segment, result in zip(segments, results):
+                if segment.audio == AUDIO_CLIP and result["audio"] is not None:
+                    return result["audio"]
+            return {"prob": 0.0, "has_audio": False}
+
+        windows = [w for result in results if result["audio"] for w in result["audio"]["windows"]]
+        skipped = sum(result["audio"]["windows_skipped"] for result in results if result["audio"])
+        audio_prob = 0.0
+        if windows:
+            audio_prob = self.audio_model.aggregate([w["prob"] for w in windows], settings.audio_aggregate,
+                                                    settings.audio_aggregate_top_k)
+        return {"prob": audio_prob, "has_audio": bool(windows), "windows": windows, "windows_skipped": skipped}
+
+    def analyze_segment(self, video_path: str, segment: Dict[str, Any], model: Optional[str] = None,
+                        cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Scores one segment planned by plan_segments (as a dict, so it can
+        cross process and network boundaries): the frames at its sample
+        positions, and the audio clip or the speech windows starting inside
+        it, as segment["audio"] says. Returns the raw scores
+        ({"index", "frame_probs", "audio", "seconds"}) for the coordinator
+        to reduce.
+        """
+        cancel = cancel_event or threading.Event()
+        start = time.perf_counter()
+        audio_future = None
+        if segment["audio"] == AUDIO_CLIP:
+            audio_future = self._branch_pool.submit(self._analyze_audio_clip, video_path, cancel)
+        elif segment["audio"] == AUDIO_WINDOWED:
+            audio_future = self._branch_pool.submit(self._analyze_audio_windowed, video_path, cancel,
+                                                    segment["start"], segment["end"])
+        try:
+            frame_probs: List[float] = []
+            if segment["positions"]:
+                with self.models.use(model or self.visual_spec) as visual:
+                    frames = self.video_processor.iter_frames(video_path, cancel_event=cancel,
+                                                              positions=segment["positions"],
+                                                              geometry=visual.frame_geometry)
+                    frame_probs = visual.predict_batch(frames)["frame_probs"]
+            audio = audio_future.result() if audio_future is not None else None
+        except BaseException:
+            cancel.set()
+            raise
+        return {"index": segment["index"], "frame_probs": frame_probs, "audio": audio,
+                "seconds": round(time.perf_counter() - start, 3)}
+
+    def _submit_branch(self, name: str, fn, *args, on_done: Optional[Callable[[Any], None]] = None) -> Future:
+        """
+        Runs a branch on the pool inside a copy of the caller's context, so
+        its spans land in the request's trace, and under its own span.
+        `on_done` is called with the branch result on the branch thread.
+        """
+        def run():
+            with profiling.section(name), telemetry.span(name):
+                result = fn(*args)
+            if on_done is not None:
+                on_done(result)
+            return result
+
+        return self._branch_pool.submit(telemetry.bind_context(run))
+
+    def _wait_branch(self, name: str, future: Future, cancel: threading.Event,
+                     start: float, timeout: float,
+                     cancel_event: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+        """
+        Waits for a branch until `timeout` seconds after the analysis started,
+        or until the caller sets `cancel_event`. Either way the branch is
+        told to cancel and None is returned.
+        """
+        deadline = start + timeout if timeout > 0 else None
+        while True:
+            remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            if cancel_event is not None:
+                # Poll so a caller's cancellation is noticed promptly
+                remaining = CANCEL_POLL_SECONDS if remaining is None else min(remaining, CANCEL_POLL_SECONDS)
+            try:
+                return future.result(timeout=remaining)
+            except FutureTimeoutError:
+                if cancel_event is not None and cancel_event.is_set():
+                    print(f"{name} analysis cancelled by the caller")
+                elif deadline is not None and time.monotonic() >= deadline:
+                    print(f"{name} analysis timed out after {timeout:g}s; cancelled")
+                else:
+                    continue
+                cancel.set()
+                future.cancel()
+            except Exception as e:
+                print(f"{name} analysis error: {e}")
+            return None
+
+    def _escalate(self, spec: str, frames: List[Any]) -> Optional[float]:
+        """
+        Re-scores the frames kept from the screening pass with the cascade
+        model. Returns its visual probability, or None if it failed.
+        """
+        try:
+            with telemetry.span("visual.cascade"), self.models.use(spec) as model:
+                probs = model.predict_batch(frames)["frame_probs"]
+        except Exception as e:
+            print(f"Cascade model {spec} failed: {e}")
+            return None
+        if not probs:
+            return None
+        prob = sum(probs) / len(probs)
+        print(f"Cascade Visual Probability ({spec}): {prob:.4f}")
+        return prob
+
+    @staticmethod
+    def _keep_frames(frames: Iterable[Any], kept: List[Any], short_side: int) -> Iterator[Any]:
+        """
+        Passes frames through while keeping a copy for the cascade model,
+        downscaled so the short side is that model's resize size: the
+        cascade pass needs no second decode, and full-resolution frames are
+        not held for it.
+        """
+        for frame in frames:
+            if isinstance(frame, np.ndarray) and min(frame.shape[:2]) > short_side:
+                height, width = frame.shape[:2]
+                if height <= width:
+                    size = (int(short_side * width / height), short_side)
+                else:
+                    size = (short_side, int(short_side * height / width))
+                kept.append(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+            else:
+                kept.append(frame)
+            yield frame
+
+    def _frame_geometry(self, model: ModelService, for_cascade: bool) -> FrameGeometry:
+        """
+        Decode-time resize and crop for frames scored by `model` and, with
+        `for_cascade`, kept for the cascade model too.
+        """
+        if for_cascade:
+            return FrameGeometry.shared([model.frame_geometry, self._cascade_geometry])
+        return model.frame_geometry
+
+    def _analyze_visual(self, video_path: str, cancel: threading.Event, progress: _Progress,
+                        spec: Optional[str] = None, kept: Optional[List[Any]] = None,
+                        ingest: Optional[MediaIngest] = None) -> Dict[str, Any]:
+        visual_prob = 0.0
+        frames_extracted = 0
+        start = time.perf_counter()
+
+        def keep(frames):
+            return frames if kept is None else self._keep_frames(frames, kept, self._cascade_geometry.resize_size)
+
+        with self.models.use(spec or self.visual_spec) as model:
+            geometry = self._frame_geometry(model, kept is not None)
+            if settings.visual_sampling == "adaptive" and ingest is None:
+                frame_probs = self._score_frames_adaptive(video_path, cancel, progress, model, keep, geometry)
+            else:
+                if ingest is not None:
+                    # Adaptive stages would each open the file again; the single pass samples uniformly
+                    frames = ingest.frames(cancel)
+                elif settings.frame_extraction == "disk":
+                    with telemetry.span("visual.extract_frames"):
+                        frames = self.video_processor.extract_frames(video_path, max_frames=settings.max_frames)
+                else:
+                    frames = self.video_processor.iter_frames(video_path, max_frames=settings.max_frames,
+                                                              cancel_event=cancel, geometry=geometry)
+                frame_probs = model.predict_batch(keep(frames), on_batch=progress.frames)["frame_probs"]
+        frames_extracted = len(frame_probs)
+        if frames_extracted:
+            visual_prob = sum(frame_probs) / frames_extracted
+            print(f"Visual Probability: {visual_prob:.4f}")
+            FRAMES_ANALYZED.inc(frames_extracted)
+            VISUAL_FPS.set(frames_extracted / max(time.perf_counter() - start, 1e-9))
+
+        return {"prob": visual_prob, "frames": frames_extracted}
+
+    def _score_frames_adaptive(self, video_path: str, cancel: threading.Event, progress: _Progress,
+                               model: ModelService, keep: Callable[[Iterable[Any]], Iterable[Any]],
+                               geometry: Optional[FrameGeometry] = None) -> List[float]:
+        """
+        Scores frames coarse-to-fine and stops as soon as the confidence
+        interval on the mean frame probability clears the decision threshold,
+        or once max_frames frames have been scored.
+        """
+        frame_probs: List[float] = []
+        # Near duplicates of frames scored in an earlier stage are reused too
+        dedup = model.new_deduplicator()
+        stages = coarse_to_fine_stages(settings.adaptive_min_frames, settings.max_frames)
+        total_frames = self.video_processor.get_video_metadata(video_path).get("frame_count", 0)
+        if total_frames > 0:
+            stages = distinct_frame_stages(stages, total_frames)
+        for stage in stages:
+            if cancel.is_set():
+                break
+            frames = keep(self.video_processor.iter_frames(video_path, cancel_event=cancel, positions=stage,
+                                                           geometry=geometry))
+            frame_probs.extend(model.predict_batch(frames, on_batch=progress.frames, dedup=dedup)["frame_probs"])
+            if is_decided(frame_probs, 0.5, settings.adaptive_confidence_z, settings.adaptive_min_std):
+                break
+        return frame_probs
+
+    def _analyze_audio(self, video_path: str, cancel: threading.Event,
+                       ingest: Optional[MediaIngest] = None) -> Dict[str, Any]:
+        if settings.audio_mode == "windowed":
+            return self._analyze_audio_windowed(video_path, cancel, ingest=ingest)
+        return self._analyze_audio_clip(video_path, cancel, ingest)
+
+    def _analyze_audio_clip(self, video_path: str, cancel: threading.Event,
+                            ingest: Optional[MediaIngest] = None) -> Dict[str, Any]:
+        audio_prob = 0.0
+        has_audio = False
+
+        mfcc = None
+        if settings.audio_extraction == "disk" and ingest is None:
+            with telemetry.span("audio.ffmpeg"):
+                audio_path = self.audio_processor.extract_audio(video_path)
+            if audio_path:
+                has_audio = True
+                with telemetry.span("audio.mfcc"):
+                    mfcc = self.audio_processor.get_mfcc(audio_path, duration=settings.audio_duration)
+        else:
+            with telemetry.span("audio.ffmpeg"):
+                if ingest is not None:
+                    pcm = ingest.read_pcm(settings.audio_duration, cancel_event=cancel)
+                else:
+                    pcm = self.audio_processor.load_pcm(video_path, duration=settings.audio_duration,
+                                                        cancel_event=cancel)
+            if pcm is not None:
+                has_audio = True
+                with telemetry.span("audio.mfcc"):
+                    mfcc = self.audio_processor.mfcc_from_array(pcm, duration=settings.audio_duration)
+        if mfcc is not None:
+            with telemetry.span("audio.forward"):
+                audio_prob = self.audio_model.predict_audio(mfcc)
+            print(f"Audio Probability: {audio_prob:.4f}")
+
+        return {"prob": audio_prob, "has_audio": has_audio}
+
+    def _analyze_audio_windowed(self, video_path: str, cancel: threading.Event, start: float = 0.0,
+                                end: Optional[float] = None, ingest: Optional[MediaIngest] = None) -> Dict[str, Any]:
+        """
+        Scores the full track as overlapping windows, or with `end` only the
+        windows starting in [start, end); with `ingest`, the whole track as
+        it streams in. Windows failing the energy gate are
+        skipped; the rest are batched through the audio CNN.
+        """
+        windows: List[Dict[str, float]] = []
+        skipped = 0
+        seen = 0
+        pending_starts: List[float] = []
+        pending_samples: List[Any] = []
+
+        def flush():
+            with telemetry.span("audio.mfcc"):
+                mfcc = self.audio_processor.mfcc_batch(np.stack(pending_samples))
+            with telemetry.span("audio.forward"):
+                window_probs = self.audio_model.predict_windows(mfcc)
+            for start_s, prob in zip(pending_starts, window_probs):
+                windows.append({"start": round(start_s, 2), "end": round(start_s + settings.audio_window_seconds, 2),
+                                "prob": round(prob, 4)})
+            pending_starts.clear()
+            pending_samples.clear()
+
+        # Windows are read lazily from ffmpeg, so waiting on the iterator is the ffmpeg stage
+        # A range is decoded one window past its end, so its last windows are complete
+        duration = end - start + settings.audio_window_seconds if end is not None else None
+        if ingest is not None:
+            pcm_windows = self.audio_processor.windows_from_chunks(
+                ingest.pcm_chunks(cancel), settings.audio_window_seconds, settings.audio_hop_seconds,
+                cancel_event=cancel,
+            )
+        else:
+            pcm_windows = self.audio_processor.iter_pcm_windows(
+                video_path, settings.audio_window_seconds, settings.audio_hop_seconds, cancel_event=cancel,
+                start=start, duration=duration,
+            )
+        while True:
+            with telemetry.span("audio.ffmpeg"):
+                window = next(pcm_windows, None)
+            if window is None:
+                break
+            start_s, samples = window
+            if end is not None and start_s >= end - 1e-6:
+                break
+            seen += 1
+            with telemetry.span("audio.gate"):
+                speech = self.audio_processor.is_speech(samples, threshold_db=settings.audio_gate_threshold_db,
+                                                        min_active_ratio=settings.audio_gate_min_active_ratio)
+            if not speech:
+                skipped += 1
+                continue
+            pending_starts.append(start_s)
+            pending_samples.append(samples)
+            if len(pending_samples) >= settings.audio_window_batch_size:
+                flush()
+        if pending_samples:
+            flush()
+
+        audio_prob = 0.0
+        if windows:
+            audio_prob = self.audio_model.aggregate([w["prob"] for w in windows], settings.audio_aggregate,
+                                                    settings.audio_aggregate_top_k)
+            print(f"Audio Probability: {audio_prob:.4f} ({len(windows)} speech windows, {skipped} skipped)")
+
+        # A track with no speech carries no audio evidence for fusion
+        return {"prob": audio_prob, "has_audio": bool(windows), "windows": windows, "windows_skipped": skipped}
@@ -0,0 +1,218 @@
+import itertools
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# How often finished job records are swept from the state directory
+SWEEP_SECONDS = 60.0
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another submission."""
+
+
+@dataclass
+class Job:
+    id: str
+    filename: str
+    file_path: str
+    content_hash: Optional[str] = None
+    # Estimated cost, and queue priority (lower runs first)
+    cost: float = 0.0
+    priority: int = 0
+    status: JobStatus = JobStatus.QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    # Process that runs the job
+    pid: int = field(default_factory=os.getpid)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobManager:
+    """
+    Runs analyses on a bounded pool of worker threads fed by a bounded queue.
+    Queued jobs run in priority order, then in submission order. Finished
+    jobs are kept for `ttl_seconds` so clients can poll for results.
+
+    With `state_dir`, each job is also written there as JSON whenever its
+    status changes, so a pre-forked worker can answer polls for jobs another
+    worker accepted. Jobs still run in the process that accepted them; one
+    whose process has exited is reported as failed.
+    """
+
+    def __init__(self, handler: Callable[[Job], Dict[str, Any]], workers: int = 2,
+                 max_queue: int = 32, ttl_seconds: float = 3600.0, state_dir: Optional[str] = None):
+        self.handler = handler
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self.state_dir = Path(state_dir) if state_dir else None
+        if self.state_dir is not None:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+        self._next_sweep = 0.0
+        self._queue: "queue.PriorityQueue[tuple]" = queue.PriorityQueue(maxsize=max_queue)
+        self._sequence = itertools.count()
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"sherlock-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, file_path: str, filename: str, content_hash: Optional[str] = None,
+               cost: float = 0.0, priority: int = 0) -> Job:
+        self.start()
+        self._expire()
+
+        job = Job(id=uuid.uuid4().hex, filename=filename, file_path=file_path, content_hash=content_hash,
+                  cost=cost, priority=priority)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._save(job)
+        try:
+            self._queue.put_nowait((job.priority, next(self._sequence), job))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            self._discard(job.id)
+            raise QueueFullError("Job queue is full")
+        return job
+
+    def add_completed(self, file_path: str, filename: str, result: Dict[str, Any],
+                      content_hash: Optional[str] = None) -> Job:
+        """
+        Registers a job whose result is already known (e.g. a cache hit)
+        without going through the queue.
+        """
+        self._expire()
+        now = time.time()
+        job = Job(id=uuid.uuid4().hex, filename=filename, file_path=file_path, content_hash=content_hash,
+                  status=JobStatus.COMPLETED, created_at=now, started_at=now, finished_at=now, result=result)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.state_dir is not None:
+            job = self._load(job_id)
+        return job
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _worker(self):
+        while True:
+            _, _, job = self._queue.get()
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            self._save(job)
+            try:
+                result = self.handler(job)
+                if "error" in result:
+                    job.error = result["error"]
+                    job.status = JobStatus.FAILED
+                else:
+                    job.result = result
+                    job.status = JobStatus.COMPLETED
+            except Exception as e:
+                job.error = f"Analysis failed: {e}"
+                job.status = JobStatus.FAILED
+            finally:
+                job.finished_at = time.time()
+                self._save(job)
+                self._queue.task_done()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            sweep = self.state_dir is not None and time.monotonic() >= self._next_sweep
+            if sweep:
+                self._next_sweep = time.monotonic() + SWEEP_SECONDS
+        for job_id in expired:
+            self._discard(job_id)
+        if sweep:
+            # Records of every worker, including ones that have exited
+            for path in self.state_dir.glob("*.json"):
+                job = self._load(path.stem)
+                if job is not None and job.finished_at is not None and job.finished_at < cutoff:
+                    self._discard(job.id)
+
+    def _path(self, job_id: str) -> Path:
+        return self.state_dir / f"{job_id}.json"
+
+    def _save(self, job: Job):
+        if self.state_dir is None:
+            return
+        record = asdict(job)
+        record["status"] = job.status.value
+        tmp_path = self.state_dir / f".{job.id}.{uuid.uuid4().hex}.tmp"
+        try:
+            with tmp_path.open("w") as f:
+                json.dump(record, f)
+            os.replace(tmp_path, self._path(job.id))
+        except (OSError, TypeError, ValueError) as e:
+            tmp_path.unlink(missing_ok=True)
+            print(f"Could not save job {job.id}: {e}")
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        if not JOB_ID_RE.match(job_id):
+            return None
+        try:
+            with self._path(job_id).open() as f:
+                record = json.load(f)
+            job = Job(**{**record, "status": JobStatus(record["status"])})
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        if job.finished_at is None and not _process_alive(job.pid):
+            job.status = JobStatus.FAILED
+            job.error = "The worker running this job exited before it finished"
+            job.finished_at = time.time()
+            self._save(job)
+        return job
+
+    def _discard(self, job_id: str):
+        if self.state_dir is not None:
+            self._path(job_id).unlink(missing_ok=True)
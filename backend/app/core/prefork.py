@@ -0,0 +1,124 @@
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.runtime import runtime
+
+# A worker that dies sooner than this after starting is not restarted in a loop
+MIN_WORKER_UPTIME_SECONDS = 5.0
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def threads_per_worker(workers: int, requested: int = 0) -> int:
+    """
+    Splits the cores this process may run on evenly across workers, so N
+    workers together run about one thread per core instead of N per core.
+    """
+    if requested > 0:
+        return requested
+    return max(1, available_cores() // max(1, workers))
+
+
+class PreforkServer:
+    """
+    Loads the models once in the parent, then forks `workers` uvicorn
+    processes that accept on one shared listening socket. The weights live in
+    shared memory, so N workers cost roughly one model's worth of RSS, and
+    each worker gets an even share of the CPU threads.
+
+    The parent only supervises: it restarts workers that die and forwards
+    SIGINT/SIGTERM for a graceful shutdown.
+    """
+
+    def __init__(self, app: str, host: str = "0.0.0.0", port: int = 8000, workers: int = 2,
+                 threads: Optional[int] = None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads or threads_per_worker(workers, settings.threads_per_worker)
+        self._children: Dict[int, float] = {}
+        self._stopping = False
+        self._socket: Optional[socket.socket] = None
+
+    def run(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(2048)
+        self._socket.set_inheritable(True)
+
+        # No warm-up here: it would start torch's thread pools, which do not
+        # survive fork(). Each worker warms itself up instead.
+        runtime.load(warmup_iterations=0)
+        if not runtime.ready:
+            print(f"Model loading failed, not starting workers: {runtime.error}")
+            sys.exit(1)
+        runtime.share_memory()
+
+        print(f"Starting {self.workers} workers on {self.host}:{self.port}, {self.threads} thread(s) each")
+        for _ in range(self.workers):
+            self._spawn()
+
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        self._supervise()
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker()
+        self._children[pid] = time.monotonic()
+
+    def _run_worker(self):
+        import uvicorn
+
+        code = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            runtime.after_fork(self.threads)
+            config = uvicorn.Config(self.app, lifespan="on", log_level="info")
+            uvicorn.Server(config).run(sockets=[self._socket])
+        except BaseException as e:
+            print(f"Worker {os.getpid()} failed: {e}")
+            code = 1
+        finally:
+            # Never return into the parent's supervision loop
+            os._exit(code)
+
+    def _supervise(self):
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            started = self._children.pop(pid, None)
+            if started is None or self._stopping:
+                continue
+            uptime = time.monotonic() - started
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)} after {uptime:.0f}s")
+            if uptime < MIN_WORKER_UPTIME_SECONDS:
+                # Crashing at startup; back off instead of fork-bombing
+                time.sleep(MIN_WORKER_UPTIME_SECONDS)
+            self._spawn()
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
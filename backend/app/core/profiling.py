@@ -0,0 +1,91 @@
+import contextvars
+import cProfile
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.core.config import settings
+
+_current_session: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar(
+    "sherlock_profile_session", default=None
+)
+
+
+class ProfileSession:
+    """
+    Profile of one sampled analysis. cProfile only sees the thread it is
+    enabled in, so each branch thread gets its own `.prof` file via
+    `section()`; torch.profiler records ops from every thread in one trace.
+    """
+
+    def __init__(self, kind: str, output_dir: str, label: str):
+        self.kind = kind
+        self.output_dir = output_dir
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{uuid.uuid4().hex[:6]}"
+        os.makedirs(output_dir, exist_ok=True)
+
+    def path(self, name: str, extension: str) -> str:
+        return os.path.join(self.output_dir, f"{self.id}.{name}.{extension}")
+
+
+def should_profile(requested: bool = False) -> bool:
+    if requested and settings.profile_allow_header:
+        return True
+    return settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate
+
+
+@contextmanager
+def profile_request(label: str = "analysis", requested: bool = False) -> Iterator[Optional[ProfileSession]]:
+    """
+    Profiles the enclosed block if this request is sampled (or explicitly
+    requested and allowed). Yields the session, or None when not profiling.
+    Nested calls reuse the outer session.
+    """
+    if _current_session.get() is not None or not should_profile(requested):
+        yield _current_session.get()
+        return
+
+    session = ProfileSession(settings.profiler, settings.profile_dir, label)
+    token = _current_session.set(session)
+    try:
+        if session.kind == "torch":
+            import torch.profiler
+
+            with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU],
+                                        record_shapes=True) as prof:
+                yield session
+            prof.export_chrome_trace(session.path("torch", "json"))
+        else:
+            with section("main"):
+                yield session
+        print(f"Profile written: {os.path.join(session.output_dir, session.id)}.*")
+    finally:
+        _current_session.reset(token)
+
+
+@contextmanager
+def section(name: str) -> Iterator[None]:
+    """
+    cProfiles the enclosed block into its own file when the current request
+    is being profiled. Use around work that runs on another thread.
+    """
+    session = _current_session.get()
+    if session is None or session.kind != "cprofile":
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one active cProfile per process; the outer
+        # profile already covers this thread
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(session.path(name, "prof"))
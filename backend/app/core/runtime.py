@@ -0,0 +1,131 @@
+import threading
+import time
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+class ModelState(str, Enum):
+    COLD = "cold"
+    LOADING = "loading"
+    WARMING = "warming"
+    READY = "ready"
+    FAILED = "failed"
+
+
+class NotReadyError(RuntimeError):
+    pass
+
+
+class Runtime:
+    """
+    Owns the process-wide DeepfakeDetector. Models are built (and warmed up)
+    on demand, typically from the API lifespan, rather than at import time,
+    so importing the API, the CLI tools and job workers stays cheap.
+    """
+
+    def __init__(self):
+        self.state = ModelState.COLD
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._detector = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == ModelState.READY
+
+    @property
+    def detector(self):
+        """
+        The loaded detector. Raises NotReadyError while models are still
+        loading or warming up.
+        """
+        if self.state != ModelState.READY:
+            raise NotReadyError(f"Models are {self.state.value}")
+        return self._detector
+
+    def load(self, warmup_iterations: Optional[int] = None):
+        """
+        Builds the detector and runs the warm-up passes. Idempotent; a failed
+        load can be retried.
+        """
+        with self._lock:
+            if self.state in (ModelState.LOADING, ModelState.WARMING, ModelState.READY):
+                return
+            self.state = ModelState.LOADING
+            self.error = None
+
+        iterations = settings.warmup_iterations if warmup_iterations is None else warmup_iterations
+        try:
+            start = time.perf_counter()
+            # Deferred: pulls in torch, torchvision, OpenCV and the audio stack
+            from app.core.detector import DeepfakeDetector
+
+            detector = DeepfakeDetector()
+            self.load_seconds = time.perf_counter() - start
+
+            self._detector = detector
+            self._warm_up(iterations)
+            print(f"Models ready (load {self.load_seconds:.1f}s, warm-up {self.warmup_seconds:.1f}s)")
+        except Exception as e:
+            self.error = str(e)
+            self.state = ModelState.FAILED
+            print(f"Model loading failed: {e}")
+
+    def _warm_up(self, iterations: int):
+        self.state = ModelState.WARMING
+        start = time.perf_counter()
+        if iterations > 0:
+            self._detector.warm_up(iterations)
+        self.warmup_seconds = time.perf_counter() - start
+        self.state = ModelState.READY
+
+    def share_memory(self):
+        """
+        Prepares loaded models to be inherited by forked workers: weights
+        move to shared memory so every child maps the same pages. Models a
+        worker loads later on demand are its own.
+        """
+        self._detector.models.share_memory()
+        self._detector.audio_model.share_memory()
+
+    def after_fork(self, threads: int, warmup_iterations: Optional[int] = None):
+        """
+        Runs in a freshly forked worker: applies its share of the CPU threads,
+        rebuilds fork-unsafe runners and warms up its own allocator and kernels.
+        """
+        import cv2
+        import torch
+
+        torch.set_num_threads(threads)
+        cv2.setNumThreads(threads)
+        self._detector.after_fork()
+        self._warm_up(settings.warmup_iterations if warmup_iterations is None else warmup_iterations)
+
+    def start_background(self) -> threading.Thread:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.load, name="sherlock-model-loader", daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def shutdown(self):
+        if self._detector is not None:
+            self._detector.close()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state.value,
+            "error": self.error,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+        }
+
+
+runtime = Runtime()
+registry.gauge("sherlock_models_ready", "1 once models are loaded and warmed up.", callback=lambda: float(runtime.ready))
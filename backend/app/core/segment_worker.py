@@ -0,0 +1,8 @@
+"""
+Imported by the fork server of LocalSegmentPool before it forks any worker:
+loads the models once, without warm-up, so every segment worker inherits
+them instead of loading its own.
+"""
+from app.core.segments import preload_detector
+
+preload_detector()
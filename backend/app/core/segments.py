@@ -0,0 +1,372 @@
+import bisect
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import requests
+
+from app.core.metrics import registry
+
+SEGMENTS = registry.counter("sherlock_segments_total", "Video segments scored for segment-parallel analysis, by outcome.")
+
+# More segments than workers, so one slow or retried segment holds up less of the video
+SEGMENTS_PER_WORKER = 2
+# How often the coordinator checks for cancellation and timed-out attempts
+POLL_SECONDS = 0.1
+CONNECT_TIMEOUT_SECONDS = 5.0
+# Detail of the 404 a node answers when it needs the video sent first
+SOURCE_NOT_FOUND = "Source video not found on this node"
+# Carries SHERLOCK_SEGMENT_TOKEN on requests to segment nodes
+SEGMENT_TOKEN_HEADER = "X-Sherlock-Segment-Token"
+
+# Audio work assigned to a segment
+AUDIO_NONE = "none"
+AUDIO_CLIP = "clip"
+AUDIO_WINDOWED = "windowed"
+
+SHA256_NAME_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class SegmentFailedError(Exception):
+    """Raised when a segment could not be scored by any worker, nor by the coordinator."""
+
+
+@dataclass
+class Segment:
+    index: int
+    start: float
+    end: float
+    # Sample positions as fractions of the whole video, all inside [start, end)
+    positions: List[float] = field(default_factory=list)
+    audio: str = AUDIO_NONE
+
+
+def plan_segments(duration: float, count: int, max_frames: int, audio_mode: str = "clip",
+                  hop_seconds: float = 2.5) -> List[Segment]:
+    """
+    Splits [0, duration) into `count` segments of equal length and gives
+    each the frames of the usual max_frames equally spaced samples that fall
+    in it, so together they score what a single process would.
+
+    In the windowed audio mode every segment scores the windows starting in
+    it, and boundaries are moved onto the hop grid so the windows are those
+    of one pass over the track. Otherwise the first segment scores the
+    audio clip. Segments left with nothing to do are dropped.
+    """
+    count = max(1, count)
+    bounds = [duration * i / count for i in range(count)]
+    if audio_mode == "windowed" and hop_seconds > 0:
+        bounds = [round(b / hop_seconds) * hop_seconds for b in bounds]
+    bounds.append(duration)
+
+    positions: List[List[float]] = [[] for _ in range(count)]
+    for p in np.linspace(0.0, 1.0, max_frames).tolist() if max_frames > 0 else []:
+        positions[min(max(bisect.bisect_right(bounds, p * duration) - 1, 0), count - 1)].append(p)
+
+    segments = []
+    for i in range(count):
+        if audio_mode == "windowed":
+            audio = AUDIO_WINDOWED
+        else:
+            audio = AUDIO_CLIP if i == 0 else AUDIO_NONE
+        if bounds[i + 1] <= bounds[i] or (not positions[i] and audio == AUDIO_NONE):
+            continue
+        segments.append(Segment(index=len(segments), start=bounds[i], end=bounds[i + 1],
+                                positions=positions[i], audio=audio))
+    return segments
+
+
+# Module the local pool's fork server imports before forking any worker
+WORKER_PRELOAD_MODULE = "app.core.segment_worker"
+
+# Detector of a segment worker process: built once in the fork server and
+# inherited, or built by the worker itself if the fork server could not
+_detector = None
+
+
+def _load_detector():
+    global _detector
+    from app.core.config import settings
+    from app.core.detector import DeepfakeDetector
+
+    # A worker scores one segment; a batching thread would only be forked along
+    settings.batching_enabled = False
+    _detector = DeepfakeDetector()
+
+
+def preload_detector():
+    """
+    Loads the models in the fork server, which must not fail on import.
+    """
+    try:
+        _load_detector()
+    except Exception as e:
+        print(f"Segment fork server could not load the models; workers load their own: {e}")
+
+
+def _score_in_process(conn, threads: int, video_path: str, segment: Dict[str, Any],
+                      model: Optional[str]):
+    import cv2
+    import torch
+
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    try:
+        if _detector is None:
+            _load_detector()
+        else:
+            _detector.after_fork()
+        conn.send((True, _detector.analyze_segment(video_path, segment, model=model)))
+    except Exception as e:
+        conn.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+class LocalSegmentPool:
+    """
+    Scores segments in worker processes on this machine, one process per
+    attempt and at most `workers` at a time, splitting `threads` CPU
+    threads between them.
+
+    The processes are forked from a multiprocessing fork server that loaded
+    the models once (see app.core.segment_worker), so they share its weights
+    and the API process, with its running threads, is never forked. An
+    abandoned attempt's process is killed, which frees its slot for the retry.
+    """
+
+    def __init__(self, workers: int, threads: int):
+        self.size = max(1, min(workers, threads))
+        self.threads = max(1, threads // self.size)
+        self._context = multiprocessing.get_context("forkserver")
+        self._context.set_forkserver_preload([WORKER_PRELOAD_MODULE])
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="sherlock-segment-local")
+        self._processes: Dict[Future, Any] = {}
+        self._abandoned: Set[Future] = set()
+        self._lock = threading.Lock()
+
+    def submit(self, video_path: str, segment: Segment, model: Optional[str], attempt: int) -> Future:
+        future: Future = Future()
+        self._executor.submit(self._run, future, video_path, asdict(segment), model)
+        return future
+
+    def abandon(self, future: Future):
+        with self._lock:
+            process = self._processes.get(future)
+            if not future.cancel() and not future.done():
+                self._abandoned.add(future)
+        if process is not None:
+            process.kill()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            processes = list(self._processes.values())
+        for process in processes:
+            process.kill()
+
+    def _run(self, future: Future, video_path: str, segment: Dict[str, Any], model: Optional[str]):
+        if not future.set_running_or_notify_cancel():
+            return
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_score_in_process, name=f"sherlock-segment-{segment['index']}",
+                                        args=(sender, self.threads, video_path, segment, model), daemon=True)
+        try:
+            process.start()
+            sender.close()
+            with self._lock:
+                self._processes[future] = process
+                if future in self._abandoned:
+                    process.kill()
+            try:
+                ok, value = receiver.recv()
+            except EOFError:
+                ok, value = False, "segment worker exited without a result"
+        except Exception as e:
+            ok, value = False, f"could not start a segment worker: {e}"
+        finally:
+            sender.close()
+            receiver.close()
+            if process.pid is not None:
+                process.join()
+            with self._lock:
+                self._processes.pop(future, None)
+                self._abandoned.discard(future)
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(RuntimeError(value))
+
+
+class HttpSegmentPool:
+    """
+    Sends segments to other Sherlock nodes (POST /api/v1/segments), the
+    n-th attempt of a segment to the n-th node after its first one.
+
+    Nodes look the video up by SHA-256 among their uploads. One that does
+    not have it answers 404 and is sent the file once
+    (PUT /api/v1/segments/sources/{sha256}); nodes sharing the upload
+    directory never need the transfer. Every request carries `token`,
+    which the nodes must have configured as SHERLOCK_SEGMENT_TOKEN.
+    """
+
+    def __init__(self, nodes: List[str], timeout: float = 300.0, token: str = ""):
+        self.nodes = [node.rstrip("/") for node in nodes]
+        self.size = len(self.nodes)
+        self.timeout = timeout
+        self.headers = {SEGMENT_TOKEN_HEADER: token}
+        self._executor = ThreadPoolExecutor(max_workers=self.size * SEGMENTS_PER_WORKER,
+                                            thread_name_prefix="sherlock-segment")
+        self._hashes: Dict[Tuple[str, int, float], str] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, video_path: str, segment: Segment, model: Optional[str], attempt: int) -> Future:
+        return self._executor.submit(self._score, video_path, segment, model, attempt)
+
+    def abandon(self, future: Future):
+        # A request already sent runs to completion on its node
+        future.cancel()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _score(self, video_path: str, segment: Segment, model: Optional[str], attempt: int) -> Dict[str, Any]:
+        node = self.nodes[(segment.index + attempt) % self.size]
+        content_hash = self._content_hash(video_path)
+        body = {"sha256": content_hash, "segment": asdict(segment), "model": model}
+        timeout = (CONNECT_TIMEOUT_SECONDS, self.timeout)
+
+        response = requests.post(f"{node}/api/v1/segments", json=body, headers=self.headers, timeout=timeout)
+        # A node with the segment endpoints disabled answers 404 too, but is not sent the video
+        if response.status_code == 404 and SOURCE_NOT_FOUND in response.text:
+            with open(video_path, "rb") as f:
+                requests.put(f"{node}/api/v1/segments/sources/{content_hash}", data=f, headers=self.headers,
+                             params={"suffix": Path(video_path).suffix.lower() or ".mp4"},
+                             timeout=timeout).raise_for_status()
+            response = requests.post(f"{node}/api/v1/segments", json=body, headers=self.headers, timeout=timeout)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{node} answered {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    def _content_hash(self, video_path: str) -> str:
+        # Uploads are already stored under their SHA-256
+        stem = Path(video_path).stem
+        if SHA256_NAME_RE.match(stem):
+            return stem
+        stat = os.stat(video_path)
+        key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime)
+        with self._lock:
+            if key in self._hashes:
+                return self._hashes[key]
+        sha256 = hashlib.sha256()
+        with open(video_path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                sha256.update(chunk)
+        with self._lock:
+            self._hashes[key] = sha256.hexdigest()
+        return self._hashes[key]
+
+
+class SegmentCoordinator:
+    """
+    Runs the segments of a video on a worker pool and collects their
+    results, in segment order.
+
+    A segment whose attempt fails or takes longer than `timeout` seconds is
+    retried, on another worker where the pool has several, up to `retries`
+    times. After that the coordinator scores it itself with `fallback`;
+    only if that fails too is the analysis given up.
+    """
+
+    def __init__(self, pool, retries: int = 2, timeout: float = 300.0):
+        self.pool = pool
+        self.retries = max(0, retries)
+        self.timeout = timeout
+
+    @property
+    def workers(self) -> int:
+        return self.pool.size
+
+    def close(self):
+        self.pool.close()
+
+    def run(self, video_path: str, segments: List[Segment], model: Optional[str] = None,
+            fallback: Optional[Callable[[Segment], Dict[str, Any]]] = None,
+            cancel_event: Optional[threading.Event] = None,
+            on_result: Optional[Callable[[Segment, Dict[str, Any]], None]] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns one result per segment, or None if `cancel_event` was set.
+        Raises SegmentFailedError if a segment could not be scored at all.
+        `on_result` is called with each segment's result as it arrives.
+        """
+        results: Dict[int, Dict[str, Any]] = {}
+        attempts: Dict[int, int] = {}
+        running: Dict[Future, Tuple[Segment, float]] = {}
+        exhausted: List[Segment] = []
+
+        def launch(segment: Segment):
+            attempt = attempts.get(segment.index, 0)
+            attempts[segment.index] = attempt + 1
+            running[self.pool.submit(video_path, segment, model, attempt)] = (segment, time.monotonic())
+
+        def finish(segment: Segment, result: Dict[str, Any]):
+            results[segment.index] = result
+            if on_result is not None:
+                on_result(segment, result)
+
+        for segment in segments:
+            launch(segment)
+
+        while running:
+            if cancel_event is not None and cancel_event.is_set():
+                for future in running:
+                    self.pool.abandon(future)
+                return None
+            done, _ = wait(list(running), timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future, (segment, started) in list(running.items()):
+                if future in done:
+                    error = future.exception()
+                elif now - started > self.timeout:
+                    # The attempt is abandoned, so a retry does not wait behind it
+                    self.pool.abandon(future)
+                    error = TimeoutError(f"no result after {self.timeout:g}s")
+                else:
+                    continue
+                del running[future]
+
+                if error is None:
+                    SEGMENTS.inc(outcome="ok")
+                    finish(segment, future.result())
+                    continue
+                print(f"Segment {segment.index} ({segment.start:.1f}-{segment.end:.1f}s), "
+                      f"attempt {attempts[segment.index]} failed: {error}")
+                if attempts[segment.index] <= self.retries:
+                    SEGMENTS.inc(outcome="retried")
+                    launch(segment)
+                else:
+                    exhausted.append(segment)
+
+        for segment in exhausted:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            if fallback is None:
+                SEGMENTS.inc(outcome="failed")
+                raise SegmentFailedError(f"Segment {segment.index} failed after {attempts[segment.index]} attempts")
+            try:
+                result = fallback(segment)
+            except Exception as e:
+                SEGMENTS.inc(outcome="failed")
+                raise SegmentFailedError(f"Segment {segment.index} failed on every worker and locally: {e}") from e
+            SEGMENTS.inc(outcome="fallback")
+            finish(segment, result)
+
+        return [results[segment.index] for segment in segments]
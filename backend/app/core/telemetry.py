@@ -0,0 +1,93 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from app.core.metrics import STAGE_SECONDS
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("sherlock_trace", default=None)
+
+
+class Trace:
+    """
+    Per-request collection of stage timings. Spans with the same name (e.g.
+    the forward pass of every mini-batch) are summed. Safe to share between
+    the branch threads of one analysis.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self._totals[name] = self._totals.get(name, 0.0) + seconds
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._totals)
+
+    def timings_ms(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: round(seconds * 1000, 2) for name, seconds in self._totals.items()}
+
+    def server_timing(self) -> str:
+        """
+        Formats the timings as a Server-Timing header value.
+        """
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.timings_ms().items())
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    """
+    Starts a trace for the current context, or reuses the one already active
+    (e.g. the API request's trace when the detector runs inside it).
+    """
+    existing = _current_trace.get()
+    if existing is not None:
+        yield existing
+        return
+    new_trace = Trace()
+    token = _current_trace.set(new_trace)
+    try:
+        yield new_trace
+    finally:
+        _current_trace.reset(token)
+        # Histograms get one observation per stage per request, not per span
+        for name, seconds in new_trace.totals().items():
+            STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record(name: str, seconds: float):
+    """
+    Adds a measured duration to the current trace, if any.
+    """
+    active = _current_trace.get()
+    if active is not None:
+        active.add(name, seconds)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def bind_context(fn: Callable) -> Callable:
+    """
+    Wraps `fn` so it runs in a copy of the caller's context. Thread pools do
+    not propagate context variables, so branch work would lose the trace.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
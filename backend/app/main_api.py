@@ -5,15 +5,34 @@ import os
 # This resolves the "ModuleNotFoundError: No module named 'app'"
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import time
+from contextlib import asynccontextmanager
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.api.endpoints import router as api_router
+from app.core.config import settings
+from app.core.metrics import REQUEST_SECONDS, registry
+from app.core.runtime import runtime
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load here rather than at import time. In "background" mode the
+    # server answers liveness probes right away and reports ready once warm.
+    if settings.startup_mode == "blocking":
+        await run_in_threadpool(runtime.load)
+    else:
+        runtime.start_background()
+    yield
+    runtime.shutdown()
 
 app = FastAPI(
     title="Sherlock Deepfake Detection API",
     description="API for detecting visual and audio manipulations in media files.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS (Cross-Origin Resource Sharing)
@@ -28,12 +47,44 @@ app.add_middleware(
 
 app.include_router(api_router, prefix="/api/v1")
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, to keep job ids out of the series
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=path,
+                            status=str(response.status_code))
+    return response
+
+@app.get("/health/live")
+def liveness():
+    """The process is up and serving; says nothing about the models."""
+    return {"status": "alive", "models": runtime.state.value}
+
+@app.get("/health/ready")
+def readiness():
+    """200 once models are loaded and warmed up, 503 before (or if loading failed)."""
+    return JSONResponse(runtime.status(), status_code=200 if runtime.ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def root():
     return {"message": "Sherlock Deepfake Detection System is Online"}
 
 def start():
     """Launched with `poetry run start` or `python backend/main_api.py`"""
+    if settings.workers > 1:
+        # Pre-fork: one copy of the model weights shared by every worker
+        from app.core.prefork import PreforkServer
+
+        PreforkServer("app.main_api:app", host="0.0.0.0", port=8000, workers=settings.workers).run()
+        return
     uvicorn.run("app.main_api:app", host="0.0.0.0", port=8000, reload=True)
 
 if __name__ == "__main__":
@@ -1,17 +1,62 @@
 import torch
 import torch.nn as nn
 import numpy as np
+from typing import List, Sequence
+from app.core.config import settings
+from app.core.metrics import MODEL_CALLS, MODEL_ITEMS
+from app.services.batching import DynamicBatcher
+from app.services.inference_backends import load_backend
+from app.services.weights import load_local_weights
+
+N_MFCC = 40
+# MFCC frames for `audio_duration` seconds at 16 kHz with librosa's hop of 512
+MFCC_HOP_LENGTH = 512
 
 class AudioModelService:
-    def __init__(self, device: str = None):
+    def __init__(self, device: str = None, backend: str = None):
         self.device = device if device else ("cuda" if torch.cuda.is_available() else "cpu")
-        print(f"Initializing Audio Model on {self.device}...")
+        self.backend = backend if backend else settings.audio_backend
+        print(f"Initializing Audio Model on {self.device} ({self.backend} backend)...")
         
         # Simple CNN for Audio Classification (MFCC input)
         self.model = SimpleAudioCNN()
+        state_dict = load_local_weights(settings.weights_dir, "audio_cnn", verify=settings.weights_verify)
+        if state_dict is not None:
+            self.model.load_state_dict(state_dict)
         self.model.to(self.device)
         self.model.eval()
 
+        # Runner used for inference; the eager module stays available as self.model
+        self.runner = self._build_runner()
+
+        # Optional cross-request batching scheduler in front of the model
+        self.batcher = None
+        if settings.batching_enabled:
+            self.batcher = DynamicBatcher(
+                self._infer,
+                max_batch_size=settings.batch_max_size,
+                max_wait_ms=settings.batch_max_wait_ms,
+                name="audio-batcher",
+            )
+
+    def _build_runner(self):
+        return load_backend(
+            self.model, self.backend, self.example_input(),
+            artifact_dir=settings.model_artifact_dir, model_name="audio_cnn", device=self.device,
+        )
+
+    def share_memory(self):
+        self.model.share_memory()
+
+    def after_fork(self):
+        # ONNX Runtime sessions do not survive fork(); see ModelService.after_fork
+        if self.backend == "onnx":
+            self.runner = self._build_runner()
+
+    def example_input(self, batch_size: int = 1) -> torch.Tensor:
+        time_steps = settings.audio_duration * 16000 // MFCC_HOP_LENGTH + 1
+        return torch.zeros(batch_size, 1, N_MFCC, time_steps, device=self.device)
+
     def predict_audio(self, mfcc_features: np.ndarray) -> float:
         """
         Returns probability of audio being FAKE (0.0 to 1.0)
@@ -19,13 +64,53 @@ class AudioModelService:
         if mfcc_features is None:
             return 0.5 # Uncertain
 
+        # Prepare tensor: (Channel, Height, Width) -> (1, n_mfcc, time_steps)
+        data = torch.from_numpy(mfcc_features).float().unsqueeze(0)
+        if self.batcher is not None:
+            return self.batcher.submit(data).result().item()
+
+        with torch.no_grad():
+            # Add the batch dimension: (1, 1, n_mfcc, time_steps)
+            return self._infer(data.unsqueeze(0))[0].item()
+
+    def predict_windows(self, mfcc_windows: np.ndarray) -> List[float]:
+        """
+        Scores a (n_windows, n_mfcc, time_steps) stack of MFCC windows in a
+        single forward pass. Returns one FAKE probability per window.
+        """
+        if len(mfcc_windows) == 0:
+            return []
+
+        # (Batch, n_mfcc, time_steps) -> (Batch, 1, n_mfcc, time_steps)
+        data = torch.from_numpy(np.ascontiguousarray(mfcc_windows)).float().unsqueeze(1)
         with torch.no_grad():
-            # Prepare tensor: (Batch, Channel, Height, Width) -> (1, 1, n_mfcc, time_steps)
-            data = torch.from_numpy(mfcc_features).float().unsqueeze(0).unsqueeze(0).to(self.device)
-            
-            output = self.model(data)
-            prob = torch.sigmoid(output).item()
-            return prob
+            return self._infer(data).cpu().tolist()
+
+    @staticmethod
+    def aggregate(window_probs: Sequence[float], method: str = "mean", top_k: int = 3) -> float:
+        """
+        Reduces per-window probabilities to one score. "max" and "topk" (mean
+        of the k highest) surface a short spliced segment that a plain mean
+        over a long track would dilute.
+        """
+        if not window_probs:
+            return 0.5 # Uncertain
+        if method == "max":
+            return max(window_probs)
+        if method == "topk":
+            top = sorted(window_probs, reverse=True)[:max(1, top_k)]
+            return sum(top) / len(top)
+        return sum(window_probs) / len(window_probs)
+
+    def _infer(self, data: torch.Tensor) -> torch.Tensor:
+        """
+        Single forward pass over a (Batch, 1, n_mfcc, time_steps) tensor;
+        returns one probability per row.
+        """
+        MODEL_CALLS.inc(model="audio")
+        MODEL_ITEMS.inc(len(data), model="audio")
+        output = self.runner(data.to(self.device))
+        return torch.sigmoid(output).view(-1)
 
 class SimpleAudioCNN(nn.Module):
     """
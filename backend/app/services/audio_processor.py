@@ -1,14 +1,21 @@
-import librosa
 import numpy as np
 import os
+import hashlib
 import subprocess
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+from app.core.config import settings
+from app.services.ffmpeg_utils import FFMPEG_BIN, watch_process
+
+SAMPLE_RATE = 16000
 
 class AudioProcessor:
-    def __init__(self, output_dir: str = "data/processed_audio"):
+    def __init__(self, output_dir: str = "data/processed_audio", mfcc_backend: Optional[str] = None):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.mfcc_backend = mfcc_backend if mfcc_backend else settings.mfcc_backend
+        self._torch_mfcc = {}
 
     def extract_audio(self, video_path: str) -> Optional[str]:
         """
@@ -18,8 +25,13 @@ class AudioProcessor:
         if not os.path.exists(video_path):
             return None
 
+        # Key the cached WAV on the file's identity, not just its name, so a
+        # different upload under the same name never reuses stale audio
+        stat = os.stat(video_path)
+        fingerprint = f"{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        digest = hashlib.sha1(fingerprint.encode()).hexdigest()[:12]
         video_filename = os.path.basename(video_path)
-        audio_filename = f"{os.path.splitext(video_filename)[0]}.wav"
+        audio_filename = f"{os.path.splitext(video_filename)[0]}_{digest}.wav"
         save_path = self.output_dir / audio_filename
 
         # If audio already exists, return it
@@ -30,11 +42,11 @@ class AudioProcessor:
         # Note: Requires ffmpeg to be installed on the system
         try:
             command = [
-                "ffmpeg",
+                FFMPEG_BIN,
                 "-i", video_path,
                 "-ab", "160k",
                 "-ac", "1", # Mono
-                "-ar", "16000", # 16kHz
+                "-ar", str(SAMPLE_RATE), # 16kHz
                 "-vn", # No video
                 "-y", # Overwrite
                 str(save_path)
@@ -50,14 +62,169 @@ class AudioProcessor:
 
         return None
 
+    def load_pcm(self, video_path: str, duration: Optional[float] = None,
+                 cancel_event: Optional[threading.Event] = None) -> Optional[np.ndarray]:
+        """
+        Decodes the audio track straight from ffmpeg's stdout as mono 16 kHz
+        float32 PCM, without writing anything to disk.
+
+        Args:
+            video_path: Path to the input video.
+            duration: Only decode the first `duration` seconds if given.
+            cancel_event: Kills ffmpeg and returns None once set.
+
+        Returns:
+            1-D float32 array, or None if the file has no decodable audio.
+        """
+        if not os.path.exists(video_path):
+            return None
+
+        try:
+            process = self._open_pcm_stream(video_path, duration)
+        except OSError as e:
+            print(f"FFmpeg extraction failed: {e}")
+            return None
+
+        buffer = bytearray()
+        with process, watch_process(process, cancel_event):
+            while True:
+                chunk = process.stdout.read(1 << 16)
+                if not chunk:
+                    break
+                buffer += chunk
+
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+
+        # No audio stream or decode failure: ffmpeg exits non-zero with empty output
+        usable = len(buffer) - len(buffer) % 4
+        if usable == 0:
+            return None
+        return np.frombuffer(buffer, dtype=np.float32, count=usable // 4)
+
+    def iter_pcm_windows(self, video_path: str, window_seconds: float = 5.0, hop_seconds: float = 2.5,
+                         cancel_event: Optional[threading.Event] = None, start: float = 0.0,
+                         duration: Optional[float] = None) -> Iterator[Tuple[float, np.ndarray]]:
+        """
+        Streams the whole audio track (or `duration` seconds from `start`)
+        and yields overlapping fixed-length windows as (start_seconds,
+        samples), with start_seconds measured from the beginning of the
+        track. Only one window plus one read chunk is buffered, whatever the
+        track length. The last window ends at the end of the track (a track
+        shorter than one window is zero-padded); nothing is yielded if there
+        is no audio.
+        """
+        if not os.path.exists(video_path):
+            return
+
+        process = self._open_pcm_stream(video_path, duration, start)
+        with process, watch_process(process, cancel_event):
+            yield from self.windows_from_chunks(self.read_samples(process.stdout), window_seconds, hop_seconds,
+                                                cancel_event=cancel_event, start=start)
+
+    @staticmethod
+    def windows_from_chunks(chunks: Iterable[np.ndarray], window_seconds: float = 5.0, hop_seconds: float = 2.5,
+                            cancel_event: Optional[threading.Event] = None,
+                            start: float = 0.0) -> Iterator[Tuple[float, np.ndarray]]:
+        """
+        Cuts a stream of float32 sample chunks into the windows yielded by
+        iter_pcm_windows, with `start` the track time of the first sample.
+        """
+        window = int(window_seconds * SAMPLE_RATE)
+        hop = max(1, int(hop_seconds * SAMPLE_RATE))
+
+        buffer = np.zeros(0, dtype=np.float32)
+        offset = 0  # Index of buffer[0] in the whole track
+        yielded_until = 0  # End of the last yielded window
+        last_window = None
+        for chunk in chunks:
+            buffer = np.concatenate([buffer, chunk])
+            while len(buffer) >= window:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                last_window = buffer[:window]
+                yield start + offset / SAMPLE_RATE, last_window
+                yielded_until = offset + window
+                buffer = buffer[hop:]
+                offset += hop
+
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        uncovered = offset + len(buffer) - yielded_until
+        if last_window is None:
+            # Shorter than one window: the only window there is, zero-padded
+            if len(buffer) > 0:
+                yield start, np.pad(buffer, (0, window - len(buffer)))
+        elif uncovered >= hop // 2:
+            # A last full-length window ending at the end of the track; fewer
+            # uncovered samples than half a hop are left to the previous one
+            tail = np.concatenate([last_window, buffer[len(buffer) - uncovered:]])[-window:]
+            yield start + (offset + len(buffer) - window) / SAMPLE_RATE, tail
+
+    @staticmethod
+    def read_samples(stream: BinaryIO) -> Iterator[np.ndarray]:
+        """
+        Reads raw float32 PCM from `stream` until EOF, as sample chunks.
+        """
+        pending = b""
+        while True:
+            chunk = stream.read(1 << 16)
+            if not chunk:
+                return
+            chunk = pending + chunk
+            usable = len(chunk) - len(chunk) % 4
+            pending = chunk[usable:]
+            yield np.frombuffer(chunk[:usable], dtype=np.float32)
+
+    @staticmethod
+    def is_speech(y: np.ndarray, sr: int = SAMPLE_RATE, threshold_db: float = -45.0,
+                  min_active_ratio: float = 0.2, frame_seconds: float = 0.03) -> bool:
+        """
+        Cheap energy gate: a window counts as speech when at least
+        `min_active_ratio` of its short frames are louder than `threshold_db`
+        (dBFS). Silence, room tone and near-silent music beds are dropped.
+        """
+        frame = max(1, int(frame_seconds * sr))
+        n_frames = len(y) // frame
+        if n_frames == 0:
+            return False
+        frames = y[:n_frames * frame].reshape(n_frames, frame)
+        rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+        frame_db = 20 * np.log10(np.maximum(rms, 1e-10))
+        return float(np.mean(frame_db > threshold_db)) >= min_active_ratio
+
+    def mfcc_batch(self, windows: np.ndarray, sr: int = SAMPLE_RATE, n_mfcc: int = 40) -> np.ndarray:
+        """
+        Computes MFCCs for a (n_windows, samples) stack in one vectorized call.
+        Returns an array of shape (n_windows, n_mfcc, time_steps).
+        """
+        if self.mfcc_backend == "torchaudio":
+            return self._torchaudio_mfcc(windows, sr, n_mfcc)
+        import librosa
+
+        return librosa.feature.mfcc(y=windows, sr=sr, n_mfcc=n_mfcc)
+
     def get_mfcc(self, audio_path: str, n_mfcc: int = 40, duration: int = 5):
         """
         Loads audio and computes MFCC features.
         """
+        # librosa is slow to import; only pay for it when it is used
+        import librosa
+
         try:
             # Load up to 'duration' seconds
-            y, sr = librosa.load(audio_path, duration=duration, sr=16000)
-            
+            y, sr = librosa.load(audio_path, duration=duration, sr=SAMPLE_RATE)
+        except Exception as e:
+            print(f"Error computing MFCC: {e}")
+            return None
+        return self.mfcc_from_array(y, sr=sr, n_mfcc=n_mfcc, duration=duration)
+
+    def mfcc_from_array(self, y: np.ndarray, sr: int = SAMPLE_RATE, n_mfcc: int = 40, duration: int = 5):
+        """
+        Computes MFCC features from an in-memory waveform, padded or trimmed to
+        `duration` seconds.
+        """
+        try:
             # If audio is too short, pad it
             target_len = duration * sr
             if len(y) < target_len:
@@ -66,11 +233,57 @@ class AudioProcessor:
                 y = y[:target_len]
 
             # Compute MFCC
+            if self.mfcc_backend == "torchaudio":
+                return self._torchaudio_mfcc(y, sr, n_mfcc)
+            import librosa
+
             mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=n_mfcc)
             return mfcc
         except Exception as e:
             print(f"Error computing MFCC: {e}")
             return None
 
+    def _open_pcm_stream(self, video_path: str, duration: Optional[float] = None,
+                         start: float = 0.0) -> subprocess.Popen:
+        command = [FFMPEG_BIN, "-v", "error", "-nostdin"]
+        if start > 0:
+            # Input seeking: decoding starts at the nearest keyframe and is trimmed to `start`
+            command += ["-ss", f"{start:.3f}"]
+        command += ["-i", video_path]
+        if duration is not None:
+            command += ["-t", str(duration)]
+        command += [
+            "-vn",
+            "-ac", "1",
+            "-ar", str(SAMPLE_RATE),
+            "-f", "f32le",
+            "pipe:1",
+        ]
+        return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
 
+    def _torchaudio_mfcc(self, y: np.ndarray, sr: int, n_mfcc: int) -> np.ndarray:
+        """
+        Vectorized MFCC configured to match librosa.feature.mfcc defaults.
+        Accepts a single waveform or a (batch, samples) stack.
+        """
+        import torch
+        import torchaudio
 
+        key = (sr, n_mfcc)
+        if key not in self._torch_mfcc:
+            self._torch_mfcc[key] = torchaudio.transforms.MFCC(
+                sample_rate=sr,
+                n_mfcc=n_mfcc,
+                melkwargs={
+                    "n_fft": 2048,
+                    "hop_length": 512,
+                    "n_mels": 128,
+                    "mel_scale": "slaney",
+                    "norm": "slaney",
+                    "pad_mode": "constant",
+                    "center": True,
+                },
+            )
+        with torch.no_grad():
+            mfcc = self._torch_mfcc[key](torch.from_numpy(np.ascontiguousarray(y, dtype=np.float32)))
+        return mfcc.numpy()
@@ -0,0 +1,171 @@
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+import torch
+
+# Open batchers; a weak set, so the hook below keeps no model alive
+_batchers: "weakref.WeakSet[DynamicBatcher]" = weakref.WeakSet()
+
+
+def _restart_after_fork():
+    # Only the forking thread survives fork(); give each child its own schedulers
+    for batcher in list(_batchers):
+        batcher._start()
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+class DynamicBatcher:
+    """
+    Collects single inputs from concurrent callers into one batch.
+
+    A background thread waits for the first pending input, then keeps
+    collecting until either `max_batch_size` inputs are pending or
+    `max_wait_ms` has passed. Pending inputs are stacked, `fn` is run once,
+    and each output row is routed back to its caller's future. Inputs with
+    different shapes are run as separate batches.
+    """
+
+    def __init__(self, fn: Callable[[torch.Tensor], torch.Tensor], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, name: str = "batcher"):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._stats = {
+            "batches": 0,
+            "items": 0,
+            "flush_full": 0,
+            "flush_timeout": 0,
+            "queue_wait_seconds": 0.0,
+            "batch_sizes": {},
+        }
+        self._closed = False
+        self._start()
+        _batchers.add(self)
+
+    def _start(self):
+        if self._closed:
+            return
+        self._pending: "queue.Queue[Tuple[torch.Tensor, Future, float]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        # Orders submissions against close(), so nothing is queued behind the stop sentinel
+        self._submit_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name=f"sherlock-{self.name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: torch.Tensor) -> Future:
+        """
+        Queues one input (without a batch dimension). The future resolves to
+        the matching row of `fn`'s output.
+        """
+        future = Future()
+        with self._submit_lock:
+            if not self._closed:
+                self._pending.put((item, future, time.perf_counter()))
+                return future
+        # A caller still holding a closed batcher's model runs unbatched
+        with torch.no_grad():
+            future.set_result(self.fn(item.unsqueeze(0))[0])
+        return future
+
+    def run(self, items: List[torch.Tensor]) -> List[Any]:
+        """
+        Submits several inputs and blocks until all of their outputs are ready.
+        """
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """
+        Stops the scheduler thread once the inputs already queued have run.
+        """
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._pending.put(None)
+        _batchers.discard(self)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["batch_sizes"] = dict(self._stats["batch_sizes"])
+        batches = stats["batches"]
+        stats["avg_batch_size"] = stats["items"] / batches if batches else 0.0
+        stats["avg_fill_ratio"] = stats["avg_batch_size"] / self.max_batch_size
+        stats["avg_queue_wait_ms"] = 1000.0 * stats.pop("queue_wait_seconds") / stats["items"] if stats["items"] else 0.0
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000.0
+        return stats
+
+    def _loop(self):
+        try:
+            self._schedule()
+        finally:
+            self._drain()
+
+    def _drain(self):
+        # Anything still queued once the loop ends runs unbatched rather than leaving its caller waiting
+        while True:
+            try:
+                entry = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            if entry is not None:
+                self._run_group([entry])
+
+    def _schedule(self):
+        closing = False
+        while not closing:
+            entry = self._pending.get()
+            if entry is None:
+                return
+            batch = [entry]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    closing = True
+                    break
+                batch.append(entry)
+
+            self._record(batch, full=len(batch) >= self.max_batch_size)
+
+            groups: Dict[torch.Size, list] = {}
+            for entry in batch:
+                groups.setdefault(entry[0].shape, []).append(entry)
+            for entries in groups.values():
+                self._run_group(entries)
+
+    def _run_group(self, entries: list):
+        try:
+            with torch.no_grad():
+                outputs = self.fn(torch.stack([item for item, _, _ in entries]))
+            for (_, future, _), output in zip(entries, outputs):
+                future.set_result(output)
+        except Exception as e:
+            for _, future, _ in entries:
+                future.set_exception(e)
+
+    def _record(self, batch: list, full: bool):
+        now = time.perf_counter()
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+            self._stats["flush_full" if full else "flush_timeout"] += 1
+            self._stats["queue_wait_seconds"] += sum(now - enqueued for _, _, enqueued in batch)
+            sizes = self._stats["batch_sizes"]
+            sizes[len(batch)] = sizes.get(len(batch), 0) + 1
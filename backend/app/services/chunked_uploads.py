@@ -0,0 +1,243 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+HASH_READ_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Base class for chunked upload protocol errors."""
+
+
+class UploadNotFoundError(UploadError):
+    pass
+
+
+class OffsetMismatchError(UploadError):
+    """The chunk does not start where the stored data ends; `offset` is where it does."""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Expected offset {offset}")
+        self.offset = offset
+
+
+class UploadTooLargeError(UploadError):
+    pass
+
+
+class QuotaExceededError(UploadError):
+    pass
+
+
+class UploadIncompleteError(UploadError):
+    pass
+
+
+class ChecksumMismatchError(UploadError):
+    pass
+
+
+@dataclass
+class ChunkedUpload:
+    id: str
+    filename: str
+    size: int
+    client: str
+    sha256: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    # Bytes stored so far; derived from the data file, not persisted
+    offset: int = 0
+
+
+class UploadManager:
+    """
+    Resumable uploads: create with the total size, append chunks at explicit
+    offsets, then finalize into a content-addressed file.
+
+    All state lives in the staging directory (a JSON sidecar plus the
+    partial data file), so a client can resume after a dropped connection
+    and chunks may land on any pre-forked worker. Appends take an exclusive
+    flock on the data file. The SHA-256 is computed incrementally; each
+    process keeps its hasher and catches up on bytes appended by others.
+    """
+
+    def __init__(self, staging_dir: str, max_file_bytes: int, max_client_bytes: int, ttl_seconds: float):
+        self.staging_dir = Path(staging_dir)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self.max_file_bytes = max_file_bytes
+        self.max_client_bytes = max_client_bytes
+        self.ttl_seconds = ttl_seconds
+        self._hashers: Dict[str, Tuple["hashlib._Hash", int]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, filename: str, size: int, client: str, sha256: Optional[str] = None) -> ChunkedUpload:
+        self._expire()
+        if size <= 0:
+            raise UploadTooLargeError("Upload size must be positive")
+        if size > self.max_file_bytes:
+            raise UploadTooLargeError(f"Upload of {size} bytes exceeds the {self.max_file_bytes} byte limit")
+        pending = sum(u.size for u in self._iter_uploads() if u.client == client)
+        if pending + size > self.max_client_bytes:
+            raise QuotaExceededError(
+                f"Client has {pending} bytes in unfinished uploads; limit is {self.max_client_bytes}"
+            )
+
+        upload = ChunkedUpload(id=uuid.uuid4().hex, filename=filename, size=size, client=client,
+                               sha256=sha256.lower() if sha256 else None)
+        self._data_path(upload.id).touch()
+        self._write_meta(upload)
+        return upload
+
+    def get(self, upload_id: str) -> ChunkedUpload:
+        meta_path = self._meta_path(upload_id)
+        try:
+            with meta_path.open() as f:
+                upload = ChunkedUpload(**json.load(f))
+            upload.offset = self._data_path(upload_id).stat().st_size
+        except (FileNotFoundError, ValueError, TypeError):
+            raise UploadNotFoundError(f"Upload {upload_id} not found or expired")
+        return upload
+
+    def append(self, upload_id: str, offset: int, data: bytes) -> int:
+        """
+        Writes `data` at `offset`, which must be the current end of the
+        stored bytes. Returns the new offset.
+        """
+        upload = self.get(upload_id)
+        if offset + len(data) > upload.size:
+            raise UploadTooLargeError(f"Chunk ends at {offset + len(data)}, past the declared size {upload.size}")
+
+        with self._locked(upload_id) as f:
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise OffsetMismatchError(current)
+            f.write(data)
+            f.flush()
+            self._update_hash(upload_id, current, data)
+
+        upload.updated_at = time.time()
+        self._write_meta(upload)
+        return offset + len(data)
+
+    def finalize(self, upload_id: str, dest_dir: str) -> Tuple[Path, str]:
+        """
+        Checks the upload is complete (and matches its declared SHA-256) and
+        moves it to `dest_dir/<sha256><suffix>`. Returns (path, sha256).
+        """
+        upload = self.get(upload_id)
+        if upload.offset != upload.size:
+            raise UploadIncompleteError(f"Received {upload.offset} of {upload.size} bytes")
+
+        with self._locked(upload_id):
+            content_hash = self._catch_up_hash(upload_id, upload.size).hexdigest()
+            if upload.sha256 and upload.sha256 != content_hash:
+                raise ChecksumMismatchError(f"Expected SHA-256 {upload.sha256}, got {content_hash}")
+            suffix = Path(upload.filename).suffix.lower()
+            file_path = Path(dest_dir) / f"{content_hash}{suffix}"
+            os.replace(self._data_path(upload_id), file_path)
+        self._discard(upload_id)
+        return file_path, content_hash
+
+    def abort(self, upload_id: str):
+        self.get(upload_id)
+        self._data_path(upload_id).unlink(missing_ok=True)
+        self._discard(upload_id)
+
+    def _update_hash(self, upload_id: str, offset: int, data: bytes):
+        hasher = self._catch_up_hash(upload_id, offset)
+        hasher.update(data)
+        with self._lock:
+            self._hashers[upload_id] = (hasher, offset + len(data))
+
+    def _catch_up_hash(self, upload_id: str, offset: int) -> "hashlib._Hash":
+        """
+        Returns a hasher over the first `offset` bytes, reusing this
+        process's progress and reading only what it has not seen.
+        """
+        with self._lock:
+            hasher, hashed = self._hashers.get(upload_id, (None, 0))
+        if hasher is None or hashed > offset:
+            hasher, hashed = hashlib.sha256(), 0
+        if hashed < offset:
+            with self._data_path(upload_id).open("rb") as f:
+                f.seek(hashed)
+                remaining = offset - hashed
+                while remaining > 0:
+                    block = f.read(min(HASH_READ_SIZE, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+        with self._lock:
+            self._hashers[upload_id] = (hasher, offset)
+        return hasher
+
+    @contextmanager
+    def _locked(self, upload_id: str) -> Iterator:
+        data_path = self._data_path(upload_id)
+        try:
+            # Not "ab": that would recreate a file finalized in the meantime
+            f = data_path.open("r+b")
+        except FileNotFoundError:
+            raise UploadNotFoundError(f"Upload {upload_id} not found or expired")
+        with f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                # Finalized (moved away) while we waited for the lock
+                try:
+                    moved = os.stat(data_path).st_ino != os.fstat(f.fileno()).st_ino
+                except FileNotFoundError:
+                    moved = True
+                if moved:
+                    raise UploadNotFoundError(f"Upload {upload_id} not found or expired")
+                f.seek(0, os.SEEK_END)
+                yield f
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _iter_uploads(self) -> Iterator[ChunkedUpload]:
+        for meta_path in self.staging_dir.glob("*.json"):
+            try:
+                yield self.get(meta_path.stem)
+            except UploadNotFoundError:
+                continue
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        for upload in list(self._iter_uploads()):
+            if upload.updated_at < cutoff:
+                self._data_path(upload.id).unlink(missing_ok=True)
+                self._discard(upload.id)
+
+    def _discard(self, upload_id: str):
+        self._meta_path(upload_id).unlink(missing_ok=True)
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+
+    def _write_meta(self, upload: ChunkedUpload):
+        meta = asdict(upload)
+        meta.pop("offset")
+        tmp_path = self.staging_dir / f".{upload.id}.{uuid.uuid4().hex}.tmp"
+        with tmp_path.open("w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path(upload.id))
+
+    def _meta_path(self, upload_id: str) -> Path:
+        if not UPLOAD_ID_RE.match(upload_id):
+            raise UploadNotFoundError(f"Upload {upload_id} not found or expired")
+        return self.staging_dir / f"{upload_id}.json"
+
+    def _data_path(self, upload_id: str) -> Path:
+        self._meta_path(upload_id)
+        return self.staging_dir / f"{upload_id}.part"
@@ -0,0 +1,148 @@
+import math
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.ffmpeg_utils import FFMPEG_BIN, probe_media, watch_process
+
+
+@dataclass(frozen=True)
+class FrameGeometry:
+    """
+    Decode-time preprocessing for a visual model: the short side is resized
+    to resize_size, then the frame is center cropped to crop_size.
+    """
+    resize_size: int = 256
+    crop_size: int = 224
+
+    @classmethod
+    def shared(cls, geometries: Sequence["FrameGeometry"]) -> "FrameGeometry":
+        """
+        Geometry whose frames serve all of `geometries`: the central square
+        at the largest resize size. It contains every model's center crop,
+        which each preprocessor then takes after its own resize.
+        """
+        if len(set(geometries)) == 1:
+            return geometries[0]
+        size = max(g.resize_size for g in geometries)
+        return cls(resize_size=size, crop_size=size)
+
+    def scale_filter(self) -> str:
+        return (
+            f"scale={self.resize_size}:{self.resize_size}:force_original_aspect_ratio=increase:flags=bicubic,"
+            f"crop={self.crop_size}:{self.crop_size},setsar=1"
+        )
+
+
+class FFmpegFrameDecoder:
+    """
+    Decodes sampled frames with ffmpeg instead of cv2.VideoCapture.
+
+    ffmpeg seeks straight to each sample timestamp, so only the frames needed
+    to reconstruct a sample are decoded, and scales/crops it for the model
+    (see FrameGeometry) before piping raw pixels back. Long videos are split into time
+    segments that are decoded by parallel ffmpeg processes.
+    """
+
+    def __init__(self, size: int = 224, resize_size: int = 256, workers: Optional[int] = None,
+                 segment_seconds: float = 10.0, timeout: float = 120.0):
+        self.geometry = FrameGeometry(resize_size=resize_size, crop_size=size)
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        self.segment_seconds = segment_seconds
+        self.timeout = timeout
+
+    def iter_frames(self, video_path: str, max_frames: int = 10,
+                    cancel_event: Optional[threading.Event] = None,
+                    positions: Optional[Sequence[float]] = None,
+                    geometry: Optional[FrameGeometry] = None) -> Iterator[np.ndarray]:
+        """
+        Yields equally spaced frames as BGR uint8 arrays of shape (size, size, 3).
+        Frames are resized so the short side is resize_size and center cropped,
+        matching the model's ImageNet preprocessing; `geometry` overrides the
+        decoder's sizes for another model. Setting `cancel_event` kills the
+        running ffmpeg processes and ends the iteration. `positions`
+        (fractions of the video length) replaces the equally spaced samples.
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+
+        info = probe_media(video_path)
+        duration = info["duration"]
+        if duration <= 0:
+            raise ValueError(f"Could not determine duration of video file: {video_path}")
+
+        # Stay one frame clear of the end so the last seek still lands on a frame
+        last_ts = max(0.0, duration - 1.0 / (info["fps"] or 25.0))
+        fractions = np.asarray(positions, dtype=float) if positions is not None else np.linspace(0.0, 1.0, max_frames)
+        timestamps = np.unique(np.floor(np.clip(fractions, 0.0, 1.0) * last_ts * 1000) / 1000).tolist()
+
+        geometry = geometry or self.geometry
+        segments = self._split_segments(timestamps, duration)
+        if len(segments) == 1:
+            yield from self._decode_segment(video_path, segments[0], geometry, cancel_event)
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(segments))) as pool:
+            for frames in pool.map(lambda seg: self._decode_segment(video_path, seg, geometry, cancel_event),
+                                   segments):
+                yield from frames
+
+    def _split_segments(self, timestamps: List[float], duration: float) -> List[List[float]]:
+        n_segments = max(1, min(self.workers, math.ceil(duration / self.segment_seconds), len(timestamps)))
+        segment_length = duration / n_segments
+        segments: List[List[float]] = [[] for _ in range(n_segments)]
+        for ts in timestamps:
+            segments[min(int(ts // segment_length), n_segments - 1)].append(ts)
+        return [seg for seg in segments if seg]
+
+    def _decode_segment(self, video_path: str, timestamps: List[float], geometry: FrameGeometry,
+                        cancel_event: Optional[threading.Event] = None) -> List[np.ndarray]:
+        """
+        Decodes one frame per timestamp in a single ffmpeg process. Each timestamp
+        is opened as its own input with a fast keyframe seek, and the filter graph
+        keeps the first frame of each, scales it and concatenates the results.
+        """
+        command = [FFMPEG_BIN, "-v", "error", "-nostdin"]
+        for ts in timestamps:
+            command += ["-ss", f"{ts:.3f}", "-i", video_path]
+
+        scale = geometry.scale_filter()
+        chains = [f"[{i}:v:0]trim=end_frame=1,setpts=PTS-STARTPTS,{scale}[v{i}]" for i in range(len(timestamps))]
+        inputs = "".join(f"[v{i}]" for i in range(len(timestamps)))
+        graph = ";".join(chains) + f";{inputs}concat=n={len(timestamps)}:v=1:a=0[out]"
+
+        command += [
+            "-filter_complex", graph,
+            "-map", "[out]",
+            "-fps_mode", "passthrough",  # Keep every selected frame regardless of timestamps
+            "-f", "rawvideo",
+            "-pix_fmt", "bgr24",  # Same channel order as OpenCV frames
+            "pipe:1",
+        ]
+        if cancel_event is not None and cancel_event.is_set():
+            return []
+
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with watch_process(process, cancel_event):
+            try:
+                stdout, stderr = process.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                raise RuntimeError(f"FFmpeg decode timed out after {self.timeout:.0f}s")
+
+        if cancel_event is not None and cancel_event.is_set():
+            return []
+        if process.returncode != 0 and not stdout:
+            raise RuntimeError(f"FFmpeg decode failed: {stderr.decode('utf-8', errors='replace').strip()}")
+
+        size = geometry.crop_size
+        frame_bytes = size * size * 3
+        n_frames = len(stdout) // frame_bytes
+        data = np.frombuffer(stdout, dtype=np.uint8, count=n_frames * frame_bytes)
+        return list(data.reshape(n_frames, size, size, 3))
@@ -0,0 +1,96 @@
+import functools
+import re
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+FFMPEG_BIN = "ffmpeg"
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_VIDEO_RE = re.compile(r"Stream #\d+:\d+.*?: Video: (.*)")
+_SIZE_RE = re.compile(r"\b(\d{2,5})x(\d{2,5})\b")
+_FPS_RE = re.compile(r"([\d.]+) (?:fps|tbr)")
+_AUDIO_RE = re.compile(r"Stream #\d+:\d+.*?: Audio:")
+_VERSION_RE = re.compile(r"ffmpeg version n?(\d+)\.(\d+)")
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_version() -> Optional[Tuple[int, int]]:
+    """
+    (major, minor) version of the ffmpeg binary, or None if it cannot be run
+    or reports no release number (e.g. a git snapshot build).
+    """
+    try:
+        result = subprocess.run([FFMPEG_BIN, "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                timeout=10.0)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = _VERSION_RE.search(result.stdout.decode("utf-8", errors="replace"))
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def parse_media_info(banner: str) -> Dict[str, Any]:
+    """
+    Parses the input description ffmpeg prints to stderr when opening a file.
+    """
+    info: Dict[str, Any] = {"duration": 0.0, "fps": 0.0, "width": 0, "height": 0, "has_audio": False}
+
+    duration = _DURATION_RE.search(banner)
+    if duration:
+        hours, minutes, seconds = duration.groups()
+        info["duration"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    video = _VIDEO_RE.search(banner)
+    if video:
+        size = _SIZE_RE.search(video.group(1))
+        if size:
+            info["width"], info["height"] = int(size.group(1)), int(size.group(2))
+        fps = _FPS_RE.search(video.group(1))
+        if fps:
+            info["fps"] = float(fps.group(1))
+
+    info["has_audio"] = bool(_AUDIO_RE.search(banner))
+    return info
+
+
+def probe_media(video_path: str, timeout: float = 30.0) -> Dict[str, Any]:
+    """
+    Reads container metadata (duration, fps, size, audio presence) with ffmpeg.
+    Only the header is parsed; no frames are decoded.
+    """
+    result = subprocess.run(
+        [FFMPEG_BIN, "-hide_banner", "-nostdin", "-i", video_path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        timeout=timeout,
+    )
+    # ffmpeg exits non-zero because no output is given; the banner is still complete
+    return parse_media_info(result.stderr.decode("utf-8", errors="replace"))
+
+
+@contextmanager
+def watch_process(process: subprocess.Popen, cancel_event: Optional[threading.Event]) -> Iterator[None]:
+    """
+    Kills `process` as soon as `cancel_event` is set, even while the caller
+    is blocked reading its output.
+    """
+    if cancel_event is None:
+        yield
+        return
+
+    done = threading.Event()
+
+    def _watch():
+        while not done.is_set():
+            if cancel_event.wait(0.1):
+                if process.poll() is None:
+                    process.kill()
+                return
+
+    watcher = threading.Thread(target=_watch, name="sherlock-ffmpeg-watch", daemon=True)
+    watcher.start()
+    try:
+        yield
+    finally:
+        done.set()
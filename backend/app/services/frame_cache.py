@@ -0,0 +1,250 @@
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.metrics import registry
+
+FRAME_REUSE = registry.counter("sherlock_frame_scores_reused_total",
+                               "Frame scores reused instead of running the visual model, by source.")
+
+# dHash bits are split into this many bands for the persistent index. Two
+# hashes within BANDS - 1 bits of each other agree on at least one band.
+BANDS = 4
+BAND_BITS = 64 // BANDS
+# Thumbnails flatter than this (grey levels) are blank or near-uniform frames;
+# they all hash alike, so they are always scored
+MIN_THUMBNAIL_STD = 2.0
+
+
+def dhash(image: np.ndarray) -> Optional[int]:
+    """
+    64-bit difference hash of a BGR (or grayscale) frame: the sign of the
+    horizontal gradient on a 9x8 thumbnail. Robust to re-encoding, scaling
+    and small crops. Returns None for near-uniform frames.
+    """
+    thumb = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    if thumb.ndim == 3:
+        thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+    if thumb.std() < MIN_THUMBNAIL_STD:
+        return None
+    bits = (thumb[:, 1:] > thumb[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _bands(value: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+
+# Open caches; a weak set, so the hook below keeps no model's cache alive
+_caches: "weakref.WeakSet[FrameScoreCache]" = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    # A connection must not be used across fork(); children reopen lazily
+    for cache in list(_caches):
+        cache._reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class FrameScoreCache:
+    """
+    Persistent map from frame hash to model score, per scope (model and
+    version), in SQLite so pre-forked workers and restarts share it.
+
+    Lookups find the closest stored hash within `max_distance` bits through
+    banded indexes; matches are guaranteed up to BANDS - 1 bits. The least
+    recently used entries are dropped beyond `max_entries`.
+    """
+
+    def __init__(self, path: str = "data/cache/frames.sqlite", max_entries: int = 200_000, max_distance: int = 3):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._inserts = 0
+        _caches.add(self)
+
+    def _reset(self):
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        """
+        Closes the database connection. A caller still using the cache
+        reopens it.
+        """
+        _caches.discard(self)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            band_columns = ", ".join(f"b{i} INTEGER NOT NULL" for i in range(BANDS))
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS frame_scores (scope TEXT NOT NULL, hash INTEGER NOT NULL, "
+                f"score REAL NOT NULL, used REAL NOT NULL, {band_columns}, PRIMARY KEY (scope, hash))"
+            )
+            for i in range(BANDS):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS frame_scores_b{i} ON frame_scores (scope, b{i})")
+            conn.execute("CREATE INDEX IF NOT EXISTS frame_scores_used ON frame_scores (used)")
+            self._conn = conn
+            _caches.add(self)
+        return self._conn
+
+    def lookup(self, scope: str, frame_hash: int) -> Optional[float]:
+        """
+        Score of the closest stored frame within max_distance, or None.
+        """
+        where = " OR ".join(f"b{i} = ?" for i in range(BANDS))
+        try:
+            with self._lock:
+                conn = self._connect()
+                rows = conn.execute(f"SELECT hash, score FROM frame_scores WHERE scope = ? AND ({where})",
+                                    (scope, *_bands(frame_hash))).fetchall()
+                best = None
+                for stored, score in rows:
+                    distance = hamming(frame_hash, stored & ((1 << 64) - 1))
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, stored, score)
+                if best is None:
+                    return None
+                conn.execute("UPDATE frame_scores SET used = ? WHERE scope = ? AND hash = ?",
+                             (time.time(), scope, best[1]))
+                return best[2]
+        except sqlite3.Error as e:
+            print(f"Frame score cache lookup failed: {e}")
+            return None
+
+    def put_many(self, scope: str, entries: Sequence[Tuple[int, float]]):
+        if not entries:
+            return
+        now = time.time()
+        placeholders = ", ".join("?" * (4 + BANDS))
+        rows = [(scope, _signed(h), score, now, *_bands(h)) for h, score in entries]
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.executemany(f"INSERT OR REPLACE INTO frame_scores VALUES ({placeholders})", rows)
+                self._inserts += len(rows)
+                # Trimming needs a count; do it every few hundred inserts
+                if self._inserts >= 256:
+                    self._inserts = 0
+                    self._trim(conn)
+        except sqlite3.Error as e:
+            print(f"Could not persist frame scores: {e}")
+
+    def _trim(self, conn: sqlite3.Connection):
+        (count,) = conn.execute("SELECT COUNT(*) FROM frame_scores").fetchone()
+        if count > self.max_entries:
+            conn.execute("DELETE FROM frame_scores WHERE rowid IN "
+                         "(SELECT rowid FROM frame_scores ORDER BY used LIMIT ?)", (count - self.max_entries,))
+
+
+class FrameDeduplicator:
+    """
+    Decides, frame by frame within one video, whether a score can be reused:
+    from an earlier frame of the video within `max_distance` bits, or from
+    the persistent cache. Output slots are filled by `resolve` once the
+    frames they copy have been scored.
+
+    One instance can span several ModelService.predict_batch calls on the
+    same video (e.g. adaptive sampling stages); slots are per call.
+    """
+
+    def __init__(self, max_distance: int, cache: Optional[FrameScoreCache] = None, scope: str = ""):
+        self.max_distance = max_distance
+        self.cache = cache
+        self.scope = scope
+        # Hashes with a score, and hashes whose frame (slot) is still being scored
+        self._scored: List[Tuple[int, float]] = []
+        self._pending: List[Tuple[int, int]] = []
+        self._copies: List[Tuple[int, int]] = []
+        self._known: Dict[int, float] = {}
+        self._unsaved: Dict[int, int] = {}
+
+    def reuse(self, image: Optional[np.ndarray], slot: int) -> bool:
+        """
+        Returns True if the frame in `slot` needs no model pass.
+        """
+        if image is None:
+            return False
+        frame_hash = dhash(image)
+        if frame_hash is None:
+            return False
+
+        for seen_hash, score in self._scored:
+            if hamming(frame_hash, seen_hash) <= self.max_distance:
+                self._known[slot] = score
+                FRAME_REUSE.inc(source="duplicate")
+                return True
+        for seen_hash, source in self._pending:
+            if hamming(frame_hash, seen_hash) <= self.max_distance:
+                self._copies.append((slot, source))
+                FRAME_REUSE.inc(source="duplicate")
+                return True
+
+        if self.cache is not None:
+            score = self.cache.lookup(self.scope, frame_hash)
+            if score is not None:
+                self._scored.append((frame_hash, score))
+                self._known[slot] = score
+                FRAME_REUSE.inc(source="cache")
+                return True
+            self._unsaved[slot] = frame_hash
+        self._pending.append((frame_hash, slot))
+        return False
+
+    def resolve(self, probs: List[Optional[float]]) -> List[float]:
+        """
+        Fills reusable slots in `probs` and persists fresh model scores.
+        Returns the scores filled by this call.
+        """
+        filled = []
+        for slot, score in self._known.items():
+            probs[slot] = score
+            filled.append(score)
+        self._known.clear()
+
+        waiting = []
+        for slot, source in self._copies:
+            if probs[source] is None:
+                waiting.append((slot, source))
+            else:
+                probs[slot] = probs[source]
+                filled.append(probs[source])
+        self._copies = waiting
+
+        self._scored.extend((h, probs[slot]) for h, slot in self._pending if probs[slot] is not None)
+        self._pending = [(h, slot) for h, slot in self._pending if probs[slot] is None]
+
+        if self.cache is not None:
+            fresh = [(h, probs[slot]) for slot, h in self._unsaved.items() if probs[slot] is not None]
+            self._unsaved = {slot: h for slot, h in self._unsaved.items() if probs[slot] is None}
+            self.cache.put_many(self.scope, fresh)
+        return filled
@@ -0,0 +1,170 @@
+import io
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Union
+
+import torch
+import torch.nn as nn
+
+# eager:        plain PyTorch module (reference)
+# torchscript:  traced and frozen TorchScript graph
+# compile:      torch.compile (no artifact, compiled on first call)
+# onnx:         ONNX Runtime session (requires the optional `onnxruntime` package)
+# int8_dynamic: dynamically quantized Linear layers, TorchScript artifact
+# int8_static:  post-training static INT8 quantization (FX graph mode), TorchScript artifact
+BACKENDS = ("eager", "torchscript", "compile", "onnx", "int8_dynamic", "int8_static")
+
+Runner = Callable[[torch.Tensor], torch.Tensor]
+
+
+def artifact_path(artifact_dir: str, model_name: str, backend: str) -> Path:
+    if backend == "onnx":
+        return Path(artifact_dir) / f"{model_name}.onnx"
+    return Path(artifact_dir) / f"{model_name}.{backend}.pt"
+
+
+def export_model(model: nn.Module, backend: str, example_input: torch.Tensor, path: Path,
+                 calibration_inputs: Optional[Iterable[torch.Tensor]] = None) -> Path:
+    """
+    Produces the on-disk artifact for `backend` from an eager model in eval mode.
+    """
+    if backend not in ("torchscript", "onnx", "int8_dynamic", "int8_static"):
+        raise ValueError(f"Backend '{backend}' has no exportable artifact")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    model = model.cpu().eval()
+    example_input = example_input.cpu()
+
+    with torch.no_grad():
+        if backend == "onnx":
+            torch.onnx.export(
+                model,
+                (example_input,),
+                str(path),
+                input_names=["input"],
+                output_names=["logits"],
+                dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+                dynamo=False,
+            )
+            return path
+
+        if backend == "int8_dynamic":
+            model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        elif backend == "int8_static":
+            if calibration_inputs is None:
+                raise ValueError("int8_static needs calibration inputs")
+            model = _quantize_static(model, example_input, calibration_inputs)
+
+        traced = torch.jit.freeze(torch.jit.trace(model, example_input))
+        torch.jit.save(traced, str(path))
+    return path
+
+
+def load_backend(model: nn.Module, backend: str, example_input: torch.Tensor,
+                 artifact_dir: Optional[str] = None, model_name: str = "model",
+                 device: str = "cpu") -> Runner:
+    """
+    Returns a callable mapping an input batch to model logits for `backend`.
+    Artifact-based backends load from `artifact_dir` when the artifact exists
+    (see export_models.py) and are otherwise built in memory from the eager
+    model; nothing is written to disk here. int8_static needs calibration on
+    real frames, so without its artifact the eager fp32 model runs instead.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+    if backend == "eager":
+        return model
+    if backend == "compile":
+        return torch.compile(model)
+    if backend.startswith("int8") and device != "cpu":
+        raise ValueError(f"Backend '{backend}' only runs on CPU")
+
+    path = artifact_path(artifact_dir, model_name, backend) if artifact_dir else None
+    if path is None or not path.exists():
+        if backend == "int8_static":
+            print(f"No int8_static artifact for {model_name} in {artifact_dir}; running the fp32 eager model. "
+                  f"Export a calibrated one with export_models.py --calibration-video.")
+            return model
+        print(f"No {backend} artifact for {model_name}; building it in memory from the eager model...")
+        return _build_in_memory(model, backend, example_input, device)
+
+    if backend == "onnx":
+        return _onnx_runner(str(path), device)
+    return torch.jit.load(str(path), map_location=device)
+
+
+def check_parity(reference: Runner, candidate: Runner, inputs: Iterable[torch.Tensor],
+                 atol: float) -> Dict[str, float]:
+    """
+    Compares candidate outputs against the eager reference on `inputs`, in
+    probability space (after sigmoid), which is what the services report.
+    """
+    max_diff = 0.0
+    mean_diff_sum = 0.0
+    batches = 0
+    with torch.no_grad():
+        for batch in inputs:
+            expected = torch.sigmoid(reference(batch).float())
+            actual = torch.sigmoid(candidate(batch).float())
+            diff = (expected - actual).abs()
+            max_diff = max(max_diff, diff.max().item())
+            mean_diff_sum += diff.mean().item()
+            batches += 1
+    return {
+        "max_abs_diff": max_diff,
+        "mean_abs_diff": mean_diff_sum / batches if batches else 0.0,
+        "atol": atol,
+        "passed": max_diff <= atol,
+    }
+
+
+def _build_in_memory(model: nn.Module, backend: str, example_input: torch.Tensor, device: str) -> Runner:
+    with torch.no_grad():
+        if backend == "torchscript":
+            return torch.jit.freeze(torch.jit.trace(model, example_input))
+        if backend == "onnx":
+            buffer = io.BytesIO()
+            torch.onnx.export(
+                model.cpu(),
+                (example_input.cpu(),),
+                buffer,
+                input_names=["input"],
+                output_names=["logits"],
+                dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+                dynamo=False,
+            )
+            model.to(device)
+            return _onnx_runner(buffer.getvalue(), device)
+        # int8_dynamic; int8_static is only built by export_model, from calibration data
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def _quantize_static(model: nn.Module, example_input: torch.Tensor,
+                     calibration_inputs: Iterable[torch.Tensor]) -> nn.Module:
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    prepared = prepare_fx(model, get_default_qconfig_mapping("x86"), (example_input,))
+    with torch.no_grad():
+        for batch in calibration_inputs:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def _onnx_runner(model: Union[str, bytes], device: str) -> Runner:
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise ImportError("The onnx backend requires the 'onnxruntime' package") from e
+
+    providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if device == "cuda" else ["CPUExecutionProvider"]
+    # Share torch's thread budget rather than claiming every core
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = torch.get_num_threads()
+    session = ort.InferenceSession(model, sess_options=options, providers=providers)
+
+    def run(inputs: torch.Tensor) -> torch.Tensor:
+        outputs = session.run(None, {"input": inputs.detach().cpu().numpy()})
+        return torch.from_numpy(outputs[0]).to(inputs.device)
+
+    return run
@@ -0,0 +1,378 @@
+import os
+import queue
+import subprocess
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.audio_processor import SAMPLE_RATE, AudioProcessor
+from app.services.ffmpeg_decoder import FrameGeometry
+from app.services.ffmpeg_utils import FFMPEG_BIN, ffmpeg_version, parse_media_info, watch_process
+
+# Sampled frames and PCM chunks buffered ahead of a slow branch; beyond that
+# the reader waits, and so does ffmpeg
+FRAME_QUEUE_SIZE = 8
+PCM_QUEUE_CHUNKS = 64
+# How often blocked readers and consumers check whether the other side went away
+POLL_SECONDS = 0.1
+STDERR_TAIL_LINES = 20
+
+_END = object()
+
+# The video filter is read from a pipe with "-/vf", which ffmpeg 7.0 introduced
+MIN_FFMPEG_VERSION = (7, 0)
+
+
+def single_pass_supported() -> bool:
+    version = ffmpeg_version()
+    return version is not None and version >= MIN_FFMPEG_VERSION
+
+
+def _is_video_stream(line: str) -> bool:
+    return line.lstrip().startswith("Stream #") and ": Video: " in line
+
+
+class _Decimator:
+    """
+    Samples a frame stream of unknown length: keeps every stride-th frame
+    and doubles the stride whenever 2 * max_frames are held, so memory stays
+    bounded and the kept frames stay evenly spread over what was read.
+    """
+
+    def __init__(self, max_frames: int):
+        self.max_frames = max(1, max_frames)
+        self.stride = 1
+        self.kept: List[Tuple[int, bytes]] = []
+
+    def wants(self, index: int) -> bool:
+        return index % self.stride == 0
+
+    def add(self, index: int, data: bytes):
+        self.kept.append((index, data))
+        if len(self.kept) >= 2 * self.max_frames:
+            self.kept = self.kept[::2]
+            self.stride *= 2
+
+    def select(self) -> List[bytes]:
+        if not self.kept:
+            return []
+        picks = sorted(set(np.linspace(0, len(self.kept) - 1, self.max_frames, dtype=int).tolist()))
+        return [self.kept[i][1] for i in picks]
+
+
+class MediaIngest:
+    """
+    Opens a video once for both branches. A single ffmpeg process demuxes
+    and decodes the file, writing the sampled video frames, resized and
+    center cropped for the model (`geometry`, see FrameGeometry), on stdout and mono 16 kHz
+    float32 PCM on a second pipe. The input description it prints first
+    provides the metadata and the frame numbers to sample. Reader threads
+    hand frames and PCM to the branches through bounded queues.
+
+    Every frame is decoded, since one pass serves both streams, though only
+    the sampled ones are scaled; the seek-based samplers decode less of long
+    videos but open the file once per stream. A branch that stops early (the
+    audio clip mode only needs the first seconds) leaves its stream to be
+    drained and dropped, so the other never stalls; ffmpeg is stopped once
+    neither needs more.
+    """
+
+    def __init__(self, video_path: str, max_frames: int = 20, geometry: Optional[FrameGeometry] = None,
+                 cancel_event: Optional[threading.Event] = None):
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+        self.video_path = video_path
+        self.max_frames = max_frames
+        geometry = geometry or FrameGeometry()
+        self.size = geometry.crop_size
+        self.scale = geometry.scale_filter()
+        self.metadata: Dict[str, Any] = {}
+
+        self._frames: queue.Queue = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+        self._pcm: queue.Queue = queue.Queue(maxsize=PCM_QUEUE_CHUNKS)
+        # Set once a branch stops consuming its stream, and once all sampled frames are queued
+        self._video_closed = threading.Event()
+        self._audio_closed = threading.Event()
+        self._video_finished = threading.Event()
+        self._stopping = threading.Event()
+        self._targets = 0
+        self._error: Optional[str] = None
+        self._stderr_tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+        self._process: Optional[subprocess.Popen] = None
+        self._audio_stream = None
+        self._threads: List[threading.Thread] = []
+        self._start(cancel_event)
+
+    def _spawn(self, video: bool, audio: bool) -> Tuple[subprocess.Popen, Optional[int], Optional[int]]:
+        """
+        Starts ffmpeg. Returns it with the read end of the PCM pipe and the
+        write end of the pipe it reads the video filter from.
+        """
+        command = [FFMPEG_BIN, "-hide_banner", "-nostdin", "-nostats", "-i", self.video_path]
+        keep: List[int] = []
+        filter_read = filter_write = pcm_read = pcm_write = None
+        if video:
+            # The filter is loaded from the pipe while outputs are opened, after
+            # the input description is printed, so it can select by frame number
+            filter_read, filter_write = os.pipe()
+            keep.append(filter_read)
+            command += [
+                "-map", "0:v:0",
+                "-/vf", f"/dev/fd/{filter_read}",
+                "-fps_mode", "passthrough",  # Keep every selected frame regardless of timestamps
+                "-f", "rawvideo",
+                "-pix_fmt", "bgr24",  # Same channel order as OpenCV frames
+                "pipe:1",
+            ]
+        if audio:
+            pcm_read, pcm_write = os.pipe()
+            keep.append(pcm_write)
+            command += ["-map", "0:a:0", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", f"pipe:{pcm_write}"]
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE if video else subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE, pass_fds=tuple(keep))
+        except OSError:
+            for fd in (filter_write, pcm_read):
+                if fd is not None:
+                    os.close(fd)
+            raise
+        finally:
+            # Only ffmpeg may hold these ends, or the readers never see EOF
+            for fd in keep:
+                os.close(fd)
+        return process, pcm_read, filter_write
+
+    @staticmethod
+    def _read_stderr_until(process: subprocess.Popen, done: Callable[[str], bool]) -> Tuple[str, bool]:
+        """
+        Reads stderr lines up to and including the first for which `done` is
+        true. Returns the text and whether such a line came before EOF.
+        """
+        lines = []
+        for raw in process.stderr:
+            lines.append(raw.decode("utf-8", errors="replace"))
+            if done(lines[-1]):
+                return "".join(lines), True
+        return "".join(lines), False
+
+    def _video_filter(self, info: Dict[str, Any]) -> str:
+        total = int(round(info["duration"] * info["fps"]))
+        if total <= 0:
+            # Length unknown: every frame is scaled and the reader decimates
+            self._targets = 0
+            return self.scale
+        # Same frames as the OpenCV sampler; only these are scaled
+        targets = sorted(set(np.linspace(0, total - 1, self.max_frames, dtype=int).tolist()))
+        self._targets = len(targets)
+        terms = "+".join(f"eq(n\\,{n})" for n in targets)
+        return f"select='{terms}',{self.scale}"
+
+    def _start(self, cancel_event: Optional[threading.Event]):
+        video, audio = True, True
+        while True:
+            process, pcm_fd, filter_fd = self._spawn(video, audio)
+            with watch_process(process, cancel_event):
+                banner = ""
+                if filter_fd is not None:
+                    # The first video stream line closes what the filter needs: duration and frame rate
+                    banner, found = self._read_stderr_until(process, _is_video_stream)
+                    try:
+                        if found:
+                            os.write(filter_fd, self._video_filter(parse_media_info(banner)).encode())
+                    except OSError:
+                        pass  # ffmpeg already exited; the error follows on stderr
+                    finally:
+                        os.close(filter_fd)
+                rest, mapped = self._read_stderr_until(process, lambda line: line.startswith("Stream mapping:"))
+                banner += rest
+            if mapped:
+                break
+            if pcm_fd is not None:
+                os.close(pcm_fd)
+            process.wait()
+            info = parse_media_info(banner)
+            has_video = info["width"] > 0
+            # A file without one of the streams fails on its map; retry once with the one it has
+            if video and audio and has_video != info["has_audio"]:
+                video, audio = has_video, info["has_audio"]
+                continue
+            if cancel_event is not None and cancel_event.is_set():
+                raise RuntimeError("Media ingest cancelled")
+            raise ValueError(f"Could not open video file: {self.video_path}: {banner.strip()[-300:]}")
+
+        info = parse_media_info(banner)
+        self.metadata = {
+            "fps": info["fps"],
+            "frame_count": int(round(info["duration"] * info["fps"])),
+            "width": info["width"],
+            "height": info["height"],
+            "duration": info["duration"],
+            "has_audio": audio,
+        }
+        self._process = process
+
+        self._thread("stderr", self._drain_stderr)
+        if video:
+            self._thread("video", self._read_video)
+        else:
+            self._video_finished.set()
+            self._frames.put(_END)
+        if audio:
+            self._audio_stream = os.fdopen(pcm_fd, "rb")
+            self._thread("audio", self._read_audio)
+        else:
+            self._audio_closed.set()
+            self._pcm.put(_END)
+
+    def _thread(self, name: str, target):
+        thread = threading.Thread(target=target, name=f"sherlock-ingest-{name}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _drain_stderr(self):
+        for raw in self._process.stderr:
+            self._stderr_tail.append(raw.decode("utf-8", errors="replace").rstrip())
+
+    def _offer(self, items: queue.Queue, item: Any, closed: threading.Event) -> bool:
+        # Drop the item instead of blocking once its branch has gone away
+        while not closed.is_set():
+            try:
+                items.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read_video(self):
+        frame_bytes = self.size * self.size * 3
+        shape = (self.size, self.size, 3)
+        decimator = None if self._targets else _Decimator(self.max_frames)
+
+        stream = self._process.stdout
+        index = 0
+        while not self._stopping.is_set():
+            frame = bytearray(frame_bytes)
+            if stream.readinto(frame) != frame_bytes:
+                break
+            if decimator is not None:
+                if decimator.wants(index):
+                    decimator.add(index, bytes(frame))
+            else:
+                self._offer(self._frames, np.frombuffer(frame, dtype=np.uint8).reshape(shape), self._video_closed)
+                if index + 1 == self._targets:
+                    # Everything sampled; the rest of the video is only decoded for the audio
+                    self._offer(self._frames, _END, self._video_closed)
+                    self._video_finished.set()
+                    self._maybe_stop()
+            index += 1
+
+        if self._stopping.is_set() or self._video_finished.is_set():
+            return
+        if decimator is not None:
+            for data in decimator.select():
+                self._offer(self._frames, np.frombuffer(bytearray(data), dtype=np.uint8).reshape(shape),
+                            self._video_closed)
+        # With an overstated frame count, the last selected frames never come
+        if index == 0 and self._process.wait() != 0:
+            self._error = f"FFmpeg decode failed: {' '.join(self._stderr_tail)[-300:]}"
+        self._offer(self._frames, _END, self._video_closed)
+
+    def _read_audio(self):
+        for chunk in AudioProcessor.read_samples(self._audio_stream):
+            if not self._audio_closed.is_set():
+                self._offer(self._pcm, chunk, self._audio_closed)
+        self._offer(self._pcm, _END, self._audio_closed)
+
+    def _maybe_stop(self):
+        if (self._video_closed.is_set() or self._video_finished.is_set()) and self._audio_closed.is_set():
+            self._stop()
+
+    def _stop(self):
+        self._stopping.set()
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+
+    def _consume(self, items: queue.Queue, closed: threading.Event,
+                 cancel_event: Optional[threading.Event]) -> Iterator[Any]:
+        try:
+            while not closed.is_set():
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                try:
+                    item = items.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    if self._stopping.is_set():
+                        return
+                    continue
+                if item is _END:
+                    return
+                yield item
+        finally:
+            closed.set()
+            self._maybe_stop()
+
+    def frames(self, cancel_event: Optional[threading.Event] = None) -> Iterator[np.ndarray]:
+        """
+        Yields the sampled frames as BGR uint8 arrays of shape (size, size, 3),
+        in order. Can be consumed once; stopping early (or `cancel_event`)
+        releases the video stream.
+        """
+        yield from self._consume(self._frames, self._video_closed, cancel_event)
+        if self._error is not None and not self._stopping.is_set():
+            raise RuntimeError(self._error)
+
+    def pcm_chunks(self, cancel_event: Optional[threading.Event] = None) -> Iterator[np.ndarray]:
+        """
+        Yields the audio track as consecutive float32 sample chunks; nothing
+        if there is no audio. Can be consumed once.
+        """
+        yield from self._consume(self._pcm, self._audio_closed, cancel_event)
+
+    def read_pcm(self, duration: Optional[float] = None,
+                 cancel_event: Optional[threading.Event] = None) -> Optional[np.ndarray]:
+        """
+        The first `duration` seconds of audio (all of it if None) as one
+        array, like AudioProcessor.load_pcm. None if there is no audio or
+        `cancel_event` was set.
+        """
+        need = int(duration * SAMPLE_RATE) if duration is not None else None
+        parts: List[np.ndarray] = []
+        count = 0
+        chunks = self.pcm_chunks(cancel_event)
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                count += len(chunk)
+                if need is not None and count >= need:
+                    break
+        finally:
+            chunks.close()
+        if (cancel_event is not None and cancel_event.is_set()) or count == 0:
+            return None
+        return np.concatenate(parts)[:need]
+
+    def close(self):
+        """
+        Stops ffmpeg if it is still running and releases the pipes.
+        """
+        self._video_closed.set()
+        self._audio_closed.set()
+        self._stop()
+        if self._process is not None:
+            self._process.wait()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        if self._audio_stream is not None:
+            self._audio_stream.close()
+        if self._process is not None:
+            if self._process.stdout is not None:
+                self._process.stdout.close()
+            self._process.stderr.close()
+
+    def __enter__(self) -> "MediaIngest":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
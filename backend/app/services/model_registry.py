@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.model_service import ARCHITECTURES, ModelService
+from app.services.weights import read_manifest
+
+MODEL_LOADS = registry.counter("sherlock_model_loads_total", "Visual models loaded into memory.")
+MODEL_EVICTIONS = registry.counter("sherlock_model_evictions_total", "Visual models evicted to stay within budget.")
+
+
+def parse_model_spec(spec: str) -> Tuple[str, Optional[str]]:
+    """
+    Splits "name" or "name@version" (e.g. "efficientnet_b0@acme-v3").
+    """
+    name, _, version = spec.strip().partition("@")
+    return name, version or None
+
+
+@dataclass
+class _Entry:
+    model: ModelService
+    memory_bytes: int
+    load_seconds: float
+    pins: int = 0
+    uses: int = 0
+    last_used: float = field(default_factory=time.time)
+
+
+class ModelRegistry:
+    """
+    Loads visual models on first use, keyed by name and version, and keeps
+    them while their weights (see ModelService.memory_bytes) fit in
+    `budget_bytes` (0 = no limit).
+
+    Before a load, and after it once its size is known, the least recently
+    used models are evicted until the budget holds. Models pinned by a
+    running analysis (see `use`) are never evicted, so the budget can be
+    overshot while every loaded model is busy.
+    """
+
+    def __init__(self, budget_bytes: int = 0,
+                 factory: Optional[Callable[[str, Optional[str]], ModelService]] = None):
+        self.budget_bytes = budget_bytes
+        self._factory = factory or (lambda name, version: ModelService(model_name=name, version=version))
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Last measured size per model, to make room before reloading it
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Loads run one at a time, so a model is never loaded twice
+        self._load_lock = threading.Lock()
+
+    def available(self, spec: str) -> bool:
+        """
+        Whether `spec` names a known architecture and, for a version, one
+        whose weights are registered in the local weights directory.
+        """
+        name, version = parse_model_spec(spec)
+        if name not in ARCHITECTURES:
+            return False
+        return version is None or f"{name}@{version}" in read_manifest(settings.weights_dir)
+
+    def add(self, model: ModelService):
+        """
+        Registers an already built model. It stays pinned and is never evicted.
+        """
+        with self._lock:
+            self._entries[model.key] = _Entry(model=model, memory_bytes=model.memory_bytes(), load_seconds=0.0, pins=1)
+
+    def get(self, spec: str) -> ModelService:
+        """
+        Returns the model, loading it if needed, and marks it recently used.
+        """
+        return self._checkout(spec, pin=False)
+
+    @contextmanager
+    def use(self, spec: str) -> Iterator[ModelService]:
+        """
+        Like `get`, but keeps the model from being evicted until the block exits.
+        """
+        model = self._checkout(spec, pin=True)
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._entries[model.key].pins -= 1
+
+    def loaded(self) -> List[ModelService]:
+        with self._lock:
+            return [entry.model for entry in self._entries.values()]
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.memory_bytes for entry in self._entries.values())
+
+    def evict(self, spec: str) -> bool:
+        """
+        Unloads a model unless it is in use. Returns whether it was unloaded.
+        """
+        name, version = parse_model_spec(spec)
+        with self._lock:
+            return self._evict(name if version is None else f"{name}@{version}")
+
+    def share_memory(self):
+        for model in self.loaded():
+            model.share_memory()
+
+    def after_fork(self):
+        # Another thread of the parent may have held a lock at fork time
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        for model in self.loaded():
+            model.after_fork()
+
+    def close(self):
+        for model in self.loaded():
+            model.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = [
+                {
+                    "model": key,
+                    "memory_mb": round(entry.memory_bytes / (1024 * 1024), 1),
+                    "load_seconds": round(entry.load_seconds, 3),
+                    "uses": entry.uses,
+                    "in_use": entry.pins > 0,
+                    "last_used": entry.last_used,
+                }
+                for key, entry in self._entries.items()
+            ]
+        return {
+            "budget_mb": round(self.budget_bytes / (1024 * 1024), 1) if self.budget_bytes > 0 else None,
+            "memory_mb": round(sum(m["memory_mb"] for m in models), 1),
+            "models": models,
+        }
+
+    def _checkout(self, spec: str, pin: bool) -> ModelService:
+        name, version = parse_model_spec(spec)
+        key = name if version is None else f"{name}@{version}"
+        with self._lock:
+            if key in self._entries:
+                return self._touch(key, pin)
+
+        with self._load_lock:
+            with self._lock:
+                if key in self._entries:
+                    return self._touch(key, pin)
+                self._make_room(self._sizes.get(key, 0))
+
+            start = time.perf_counter()
+            model = self._factory(name, version)
+            load_seconds = time.perf_counter() - start
+            memory = model.memory_bytes()
+
+            with self._lock:
+                self._entries[key] = _Entry(model=model, memory_bytes=memory, load_seconds=load_seconds)
+                self._sizes[key] = memory
+                model = self._touch(key, pin)
+                self._make_room(keep=key)
+        MODEL_LOADS.inc(model=key)
+        print(f"Loaded {key} ({memory / (1024 * 1024):.0f} MB, {load_seconds:.1f}s)")
+        return model
+
+    def _touch(self, key: str, pin: bool) -> ModelService:
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        entry.last_used = time.time()
+        entry.uses += 1
+        if pin:
+            entry.pins += 1
+        return entry.model
+
+    def _make_room(self, incoming: int = 0, keep: Optional[str] = None):
+        if self.budget_bytes <= 0:
+            return
+        used = sum(entry.memory_bytes for entry in self._entries.values())
+        # Entries are ordered least recently used first
+        for key in list(self._entries):
+            if used + incoming <= self.budget_bytes:
+                return
+            if key == keep:
+                continue
+            memory = self._entries[key].memory_bytes
+            if self._evict(key):
+                used -= memory
+
+    def _evict(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        if entry is None or entry.pins > 0:
+            return False
+        del self._entries[key]
+        # Callers still holding the model finish with it; memory is freed after
+        entry.model.close()
+        MODEL_EVICTIONS.inc(model=key)
+        print(f"Evicted {key} ({entry.memory_bytes / (1024 * 1024):.0f} MB)")
+        return True
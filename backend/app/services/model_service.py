@@ -1,75 +1,352 @@
+import cv2
 import torch
 import torch.nn as nn
 from torchvision import models, transforms
 from PIL import Image
+import numpy as np
 import os
-from typing import List, Dict
+from typing import Callable, List, Dict, Any, Iterable, Optional, Union
+from app.core.config import settings
+from app.core import telemetry
+from app.core.metrics import MODEL_CALLS, MODEL_ITEMS
+from app.services.batching import DynamicBatcher
+from app.services.ffmpeg_decoder import FrameGeometry
+from app.services.frame_cache import FrameDeduplicator, FrameScoreCache
+from app.services.inference_backends import load_backend
+from app.services.preprocessing import TensorPreprocessor
+from app.services.weights import WeightsError, load_local_weights
+
+# Supported visual architectures: torchvision builder -> its ImageNet weights enum.
+# Each has a Sequential `classifier` ending in the Linear layer that is replaced.
+ARCHITECTURES = {
+    "efficientnet_b0": "EfficientNet_B0_Weights",
+    "efficientnet_b1": "EfficientNet_B1_Weights",
+    "efficientnet_b2": "EfficientNet_B2_Weights",
+    "mobilenet_v3_small": "MobileNet_V3_Small_Weights",
+    "mobilenet_v3_large": "MobileNet_V3_Large_Weights",
+}
+
+def _tensors(module: nn.Module) -> List[torch.Tensor]:
+    return list(module.parameters()) + list(module.buffers())
+
+def _tensor_bytes(module: nn.Module) -> int:
+    return sum(t.numel() * t.element_size() for t in _tensors(module))
 
 class ModelService:
-    def __init__(self, model_name: str = "efficientnet_b0", device: str = None):
+    def __init__(self, model_name: str = "efficientnet_b0", device: str = None, batch_size: Optional[int] = None,
+                 backend: Optional[str] = None, pretrained: bool = True, version: Optional[str] = None):
+        if model_name not in ARCHITECTURES:
+            raise ValueError(f"Unknown visual model {model_name!r}; expected one of {sorted(ARCHITECTURES)}")
         self.device = device if device else ("cuda" if torch.cuda.is_available() else "cpu")
-        print(f"Loading model {model_name} on {self.device}...")
+        self.batch_size = batch_size if batch_size else settings.visual_batch_size
+        self.model_name = model_name
+        self.version = version
+        # Name under which weights, exported artifacts and metrics are kept;
+        # a version selects e.g. a customer fine-tune of the architecture
+        self.key = model_name if version is None else f"{model_name}@{version}"
+        self.backend = backend if backend else settings.visual_backend
+        print(f"Loading model {self.key} on {self.device} ({self.backend} backend)...")
         
         # Load a pre-trained EfficientNet model
         # In a real deepfake scenario, we would load a model fine-tuned on DFDC or FaceForensics++
         # For now, we use ImageNet weights to establish the pipeline.
         try:
-            weights = models.EfficientNet_B0_Weights.DEFAULT
-            self.model = models.efficientnet_b0(weights=weights)
+            weights = getattr(models, ARCHITECTURES[model_name]).DEFAULT
+            # Weights from the local directory take precedence over the download;
+            # pretrained=False uses random weights (e.g. for offline benchmarks)
+            state_dict = None
+            if pretrained:
+                state_dict = load_local_weights(settings.weights_dir, self.key, verify=settings.weights_verify)
+                if state_dict is None and version is not None:
+                    raise WeightsError(f"No local weights for {self.key} in {settings.weights_dir}; "
+                                       f"register them with fetch_weights.py --import")
+                if state_dict is None and not settings.weights_download:
+                    raise WeightsError(
+                        f"No local weights for {model_name} in {settings.weights_dir} and downloads are "
+                        f"disabled; run fetch_weights.py on a connected machine and copy the directory over"
+                    )
+            download = pretrained and state_dict is None
+            self.model = getattr(models, model_name)(weights=weights if download else None)
             
-            # Modify the classifier for binary classification (Real vs Fake)
-            # EfficientNet B0's last layer is 'classifier' -> Sequential -> Linear
-            # The input features for the last linear layer in B0 is 1280
-            in_features = self.model.classifier[1].in_features
-            self.model.classifier[1] = nn.Linear(in_features, 1)
+            # Modify the classifier for binary classification (Real vs Fake):
+            # the last layer of 'classifier' (Sequential) becomes a single logit
+            head = len(self.model.classifier) - 1
+            self._head_prefix = f"classifier.{head}."
+            in_features = self.model.classifier[head].in_features
+            self.model.classifier[head] = nn.Linear(in_features, 1)
+            # Whether the binary head came from a checkpoint (set by _load_state_dict)
+            self.head_trained = False
+            if state_dict is not None:
+                self._load_state_dict(state_dict)
             
             self.model.to(self.device)
             self.model.eval() # Set to inference mode
+            self.channels_last = settings.channels_last
+            if self.channels_last:
+                self.model.to(memory_format=torch.channels_last)
             
             # Standard ImageNet normalization
             self.transform = weights.transforms()
+            self.input_size = self.transform.crop_size[0]
+            # Batched tensor equivalent of self.transform for BGR frame arrays
+            self.preprocessor = TensorPreprocessor.from_transform(
+                self.transform, device=self.device, channels_last=self.channels_last,
+            )
+
+            # Runner used for inference; the eager module stays available as self.model
+            self.runner = self._build_runner()
             
+            # Optional cross-request batching scheduler in front of the model
+            self.batcher = None
+            if settings.batching_enabled:
+                self.batcher = DynamicBatcher(
+                    self._infer,
+                    max_batch_size=settings.batch_max_size,
+                    max_wait_ms=settings.batch_max_wait_ms,
+                    name="visual-batcher",
+                )
+
+            # Frame scores are only worth persisting when they are reproducible:
+            # a freshly initialized head differs in every process
+            self.frame_cache = None
+            self.cache_scope = f"{self.key}:{settings.model_version}"
+            if self.head_trained and settings.frame_dedup and settings.frame_cache_entries > 0:
+                self.frame_cache = FrameScoreCache(settings.frame_cache_path, max_entries=settings.frame_cache_entries,
+                                                   max_distance=settings.frame_dedup_distance)
+
             print("Model loaded successfully.")
         except Exception as e:
             print(f"Error loading model: {e}")
             raise
 
+    def _build_runner(self):
+        example_input = torch.zeros(1, 3, self.input_size, self.input_size, device=self.device)
+        return load_backend(
+            self.model, self.backend, example_input,
+            artifact_dir=settings.model_artifact_dir, model_name=self.key, device=self.device,
+        )
+
+    def share_memory(self):
+        """
+        Moves the eager weights into shared memory so forked workers map the
+        same pages instead of each holding a copy.
+        """
+        self.model.share_memory()
+
+    def after_fork(self):
+        """
+        Re-creates state that does not survive fork(). ONNX Runtime sessions
+        own native thread pools that only exist in the parent.
+        """
+        if self.backend == "onnx":
+            self.runner = self._build_runner()
+
+    def memory_bytes(self) -> int:
+        """
+        Bytes held by the weights and buffers, plus the runner's own copy for
+        backends that keep one (exported TorchScript, ONNX, quantized).
+        """
+        size = _tensor_bytes(self.model)
+        if self.runner is self.model or self.backend == "compile":
+            return size
+        if isinstance(self.runner, nn.Module):
+            shared = {t.data_ptr() for t in _tensors(self.model)}
+            own = sum(t.numel() * t.element_size() for t in _tensors(self.runner) if t.data_ptr() not in shared)
+            # Frozen TorchScript keeps its weights as constants, outside parameters()
+            return size + (own or size)
+        return size * 2
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        if self.frame_cache is not None:
+            self.frame_cache.close()
+
+    def _load_state_dict(self, state_dict: Dict[str, torch.Tensor]):
+        """
+        Loads a local checkpoint. An ImageNet checkpoint carries the
+        1000-class head, which is dropped in favour of the binary one; a
+        fine-tuned checkpoint loads in full.
+        """
+        own = self.model.state_dict()
+        head = [k for k in state_dict if k.startswith(self._head_prefix)]
+        if any(k not in own or state_dict[k].shape != own[k].shape for k in head):
+            state_dict = {k: v for k, v in state_dict.items() if k not in head}
+        missing, unexpected = self.model.load_state_dict(state_dict, strict=False)
+        self.head_trained = not any(k.startswith(self._head_prefix) for k in missing)
+        missing = [k for k in missing if not k.startswith(self._head_prefix)]
+        if missing or unexpected:
+            raise WeightsError(f"Checkpoint does not match {self.key}: "
+                               f"missing {missing[:5]}, unexpected {unexpected[:5]}")
+
     def predict_frames(self, frame_paths: List[str]) -> float:
         """
         Predicts the probability of the video being FAKE based on extracted frames.
         Returns an average probability (0.0 = Real, 1.0 = Fake).
         """
-        if not frame_paths:
-            return 0.0
+        return self.predict_batch(frame_paths)["probability"]
 
-        probs = []
-        
+    def predict_batch(self, frames: Iterable[Union[str, np.ndarray]], batch_size: Optional[int] = None,
+                      on_batch: Optional[Callable[[List[float]], None]] = None,
+                      dedup: Optional[FrameDeduplicator] = None) -> Dict[str, Any]:
+        """
+        Scores frames in mini-batches, one forward pass per batch.
+
+        Args:
+            frames: Paths to extracted frame images, or BGR uint8 arrays as
+                yielded by VideoProcessor.iter_frames. Generators are consumed
+                lazily, so only one batch of frames is held in memory.
+            batch_size: Frames per forward pass. Defaults to the service's batch size.
+            on_batch: Called with each mini-batch's probabilities as soon as
+                it is scored, e.g. to report progress.
+            dedup: Deduplicator to share across calls on the same video (see
+                new_deduplicator). Defaults to a fresh one per call.
+
+        Returns:
+            Dict with the per-frame probabilities ("frame_probs") and their
+            average ("probability", 0.0 = Real, 1.0 = Fake), and how many
+            frames reused a score instead of a model pass ("frames_reused").
+
+        With SHERLOCK_FRAME_DEDUP, a frame whose perceptual hash is within
+        SHERLOCK_FRAME_DEDUP_DISTANCE bits of an earlier frame of the same
+        call, or of a frame in the persistent frame score cache, reuses
+        that score.
+        """
+        batch_size = batch_size or self.batch_size
+        # One slot per frame, in input order; filled as batches are scored
+        probs: List[Optional[float]] = []
+        batch = []
+        cropped = []
+        slots = []
+        reused = 0
+        dedup = dedup or self.new_deduplicator()
+
+        def flush():
+            batch_probs = self._score(batch, cropped)
+            for slot, prob in zip(slots, batch_probs):
+                probs[slot] = prob
+            filled = dedup.resolve(probs) if dedup is not None else []
+            if on_batch is not None:
+                on_batch(batch_probs + filled)
+
+        # Frames arrive lazily from the decoder, so time spent waiting on the
+        # iterator is the decode stage
+        iterator = iter(frames)
         with torch.no_grad():
-            for frame_path in frame_paths:
-                if not os.path.exists(frame_path):
+            while True:
+                with telemetry.span("visual.decode"):
+                    frame = next(iterator, None)
+                if frame is None:
+                    break
+                if isinstance(frame, str) and not os.path.exists(frame):
                     continue
-                
-                # Load and preprocess image
+
+                # Load image files now so unreadable frames are skipped
+                # individually; preprocessing runs once per batch
                 try:
-                    img = Image.open(frame_path).convert('RGB')
-                    img_t = self.transform(img).unsqueeze(0).to(self.device)
-                    
-                    # Forward pass
-                    output = self.model(img_t)
-                    
-                    # Sigmoid to get probability between 0 and 1
-                    prob = torch.sigmoid(output).item()
-                    probs.append(prob)
+                    with telemetry.span("visual.preprocess"):
+                        loaded = self._load_frame(frame)
                 except Exception as e:
-                    print(f"Error processing frame {frame_path}: {e}")
+                    label = frame if isinstance(frame, str) else "array"
+                    print(f"Error processing frame {label}: {e}")
+                    continue
+
+                probs.append(None)
+                if dedup is not None:
+                    image = frame if isinstance(frame, np.ndarray) else loaded
+                    with telemetry.span("visual.dedup"):
+                        if dedup.reuse(image if isinstance(image, np.ndarray) else None, len(probs) - 1):
+                            reused += 1
+                            continue
+
+                batch.append(loaded)
+                slots.append(len(probs) - 1)
+                # Arrays at the model's input size were cropped at decode
+                # time; image files always get the full transform
+                cropped.append(not isinstance(frame, str))
 
-        if not probs:
-            return 0.0
+                if len(batch) == batch_size:
+                    flush()
+                    batch, cropped, slots = [], [], []
+
+            if batch:
+                flush()
+            elif dedup is not None:
+                filled = dedup.resolve(probs)
+                if filled and on_batch is not None:
+                    on_batch(filled)
 
         # Simple averaging strategy for now
         # In production, we might use max() or a temporal model (LSTM)
-        avg_prob = sum(probs) / len(probs)
-        return avg_prob
+        probs = [prob for prob in probs if prob is not None]
+        avg_prob = sum(probs) / len(probs) if probs else 0.0
+        return {"frame_probs": probs, "probability": avg_prob, "frames_reused": reused}
 
+    @property
+    def frame_geometry(self) -> FrameGeometry:
+        """
+        Resize and crop sizes of this model's preprocessing, for decoders
+        that resize and crop frames themselves.
+        """
+        return FrameGeometry(resize_size=self.preprocessor.resize_size, crop_size=self.input_size)
 
+    def new_deduplicator(self) -> Optional[FrameDeduplicator]:
+        """
+        Near-duplicate frame tracking for one video, or None with SHERLOCK_FRAME_DEDUP off.
+        """
+        if not settings.frame_dedup:
+            return None
+        return FrameDeduplicator(settings.frame_dedup_distance, self.frame_cache, self.cache_scope)
+
+    def _load_frame(self, frame: Union[str, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
+        if settings.preprocessing == "pil":
+            return self._preprocess(frame)
+        if isinstance(frame, str):
+            image = cv2.imread(frame, cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError("unreadable image")
+            return image
+        return frame
+
+    def _score(self, batch: List[Union[torch.Tensor, np.ndarray]], cropped: List[bool]) -> List[float]:
+        with telemetry.span("visual.preprocess"):
+            if settings.preprocessing == "pil":
+                inputs = torch.stack(batch)
+            else:
+                inputs = self.preprocessor(batch, cropped)
+        with telemetry.span("visual.forward"):
+            return self._forward(inputs)
+
+    def _preprocess(self, frame: Union[str, np.ndarray]) -> torch.Tensor:
+        if isinstance(frame, np.ndarray) and frame.shape[:2] == (self.input_size, self.input_size):
+            # Already resized and center cropped at decode time; only normalize
+            rgb = torch.from_numpy(np.ascontiguousarray(frame[:, :, ::-1])).permute(2, 0, 1)
+            return transforms.functional.normalize(rgb.float().div(255), self.transform.mean, self.transform.std)
+        return self.transform(self._to_image(frame))
+
+    @staticmethod
+    def _to_image(frame: Union[str, np.ndarray]) -> Image.Image:
+        if isinstance(frame, str):
+            return Image.open(frame).convert('RGB')
+        # OpenCV frames are BGR; flip to RGB for the ImageNet transform
+        return Image.fromarray(np.ascontiguousarray(frame[:, :, ::-1]))
 
+    def _forward(self, batch: torch.Tensor) -> List[float]:
+        """
+        Scores a stack of preprocessed frames, either directly in one
+        forward pass or through the shared cross-request batcher.
+        """
+        if self.batcher is not None:
+            return [prob.item() for prob in self.batcher.run(list(batch.unbind(0)))]
+        # One device sync per batch
+        return self._infer(batch).cpu().tolist()
+
+    def _infer(self, inputs: torch.Tensor) -> torch.Tensor:
+        """
+        Single forward pass over a stacked batch; returns one probability per row.
+        """
+        MODEL_CALLS.inc(model=self.key)
+        MODEL_ITEMS.inc(len(inputs), model=self.key)
+        output = self.runner(inputs.to(self.device))
+        # Sigmoid to get probability between 0 and 1
+        return torch.sigmoid(output).view(-1)
@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class ResultCache:
+    """
+    Two-tier cache of analysis results keyed by upload content hash, model
+    version and a fingerprint of the result-affecting settings.
+
+    The memory tier is an LRU of the most recent entries. The disk tier stores
+    one JSON file per entry and evicts the least recently used files once their
+    total size exceeds `max_disk_bytes`.
+    """
+
+    def __init__(self, cache_dir: str = "data/cache/results", model_version: str = "1",
+                 fingerprint: str = "", memory_entries: int = 256, max_disk_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.model_version = model_version
+        self.fingerprint = fingerprint
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = sum(path.stat().st_size for path in self.cache_dir.glob("*/*.json"))
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        key = self._key(content_hash)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self._path(key)
+        try:
+            with path.open("r") as f:
+                result = json.load(f)
+            # Refresh the file's mtime so disk eviction is least-recently-used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        self._remember(key, result)
+        return result
+
+    def put(self, content_hash: str, result: Dict[str, Any]):
+        key = self._key(content_hash)
+        self._remember(key, result)
+
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            previous = path.stat().st_size if path.exists() else 0
+            with tmp_path.open("w") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_bytes += path.stat().st_size - previous
+        except OSError as e:
+            print(f"Could not persist cached result {key}: {e}")
+            return
+        self._evict_disk()
+
+    def _remember(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        with self._lock:
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+            entries = []
+            for path in self.cache_dir.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                except OSError:
+                    pass
+            self._disk_bytes = total
+
+    def _key(self, content_hash: str) -> str:
+        key = f"{content_hash.lower()}-{self.model_version}"
+        return f"{key}-{self.fingerprint}" if self.fingerprint else key
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
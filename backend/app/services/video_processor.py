@@ -1,14 +1,30 @@
 import cv2
 import os
+import subprocess
+import threading
 import numpy as np
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.services.ffmpeg_decoder import FFmpegFrameDecoder, FrameGeometry
+from app.services.ffmpeg_utils import probe_media
 
 class VideoProcessor:
-    def __init__(self, output_dir: str = "data/processed"):
+    # Gaps longer than this many frames are crossed with a seek instead of grab()
+    SEEK_THRESHOLD_FRAMES = 60
+
+    def __init__(self, output_dir: str = "data/processed", decoder: Optional[str] = None):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
+        self.decoder = decoder if decoder else settings.video_decoder
+        self.ffmpeg_decoder = None
+        if self.decoder == "ffmpeg":
+            self.ffmpeg_decoder = FFmpegFrameDecoder(
+                workers=settings.decode_workers or None,
+                segment_seconds=settings.decode_segment_seconds,
+            )
+
     def extract_frames(self, video_path: str, max_frames: int = 10) -> List[str]:
         """
         Extracts frames from a video file.
@@ -20,6 +36,47 @@ class VideoProcessor:
         Returns:
             List of paths to saved frame images.
         """
+        saved_frame_paths = []
+        for frame_index, frame in self._iter_sampled(video_path, max_frames):
+            frame_filename = f"frame_{frame_index}.jpg"
+            save_path = self.output_dir / frame_filename
+            cv2.imwrite(str(save_path), frame)
+            saved_frame_paths.append(str(save_path))
+
+        return saved_frame_paths
+
+    def iter_frames(self, video_path: str, max_frames: int = 10,
+                    cancel_event: Optional[threading.Event] = None,
+                    positions: Optional[Sequence[float]] = None,
+                    geometry: Optional[FrameGeometry] = None) -> Iterator[np.ndarray]:
+        """
+        Yields equally spaced frames as BGR uint8 arrays without touching disk.
+        Only the sampled frames are retrieved, so at most one decoded frame is
+        held at a time regardless of video length.
+
+        With the "ffmpeg" decoder, frames are already resized and center
+        cropped as `geometry` says (by default 224x224, for efficientnet_b0).
+
+        Args:
+            video_path: Path to the input video.
+            max_frames: Maximum number of frames to yield (equally spaced).
+            cancel_event: Stops decoding once set.
+            positions: Sample these positions instead (fractions of the video
+                length, 0.0 to 1.0); max_frames is then ignored.
+            geometry: Resize and crop sizes of the model the frames are for
+                (ffmpeg decoder only; OpenCV frames keep their full size).
+        """
+        if self.ffmpeg_decoder is not None:
+            yield from self.ffmpeg_decoder.iter_frames(video_path, max_frames, cancel_event=cancel_event,
+                                                       positions=positions, geometry=geometry)
+            return
+
+        for _, frame in self._iter_sampled(video_path, max_frames, cancel_event, positions):
+            yield frame
+
+    def _iter_sampled(self, video_path: str, max_frames: int,
+                      cancel_event: Optional[threading.Event] = None,
+                      positions: Optional[Sequence[float]] = None) -> Iterator[Tuple[int, np.ndarray]]:
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"Video file not found: {video_path}")
 
@@ -27,45 +84,50 @@ class VideoProcessor:
         if not cap.isOpened():
             raise ValueError(f"Could not open video file: {video_path}")
 
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        if total_frames <= 0:
-            # Fallback if frame count cannot be determined
-            frames = []
-            success = True
-            while success:
-                success, frame = cap.read()
-                if success:
-                    frames.append(frame)
-            total_frames = len(frames)
-            # Re-open capture since we read it all
-            cap.release()
-            cap = cv2.VideoCapture(video_path)
+        try:
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if total_frames <= 0:
+                # Fallback if frame count cannot be determined: count with grab()
+                # so no frame is ever buffered, then rewind with a fresh capture.
+                total_frames = 0
+                while cap.grab():
+                    total_frames += 1
+                cap.release()
+                cap = cv2.VideoCapture(video_path)
+            if total_frames <= 0:
+                return
 
-        # Calculate indices for equally spaced frames
-        indices = np.linspace(0, total_frames - 1, max_frames, dtype=int)
-        
-        saved_frame_paths = []
-        current_frame = 0
-        saved_count = 0
+            if positions is not None:
+                indices = sorted({int(round(p * (total_frames - 1))) for p in positions})
+            else:
+                # Calculate indices for equally spaced frames
+                indices = sorted(set(np.linspace(0, total_frames - 1, max_frames, dtype=int).tolist()))
 
-        while cap.isOpened() and saved_count < len(indices):
-            success, frame = cap.read()
-            if not success:
-                break
-            
-            if current_frame in indices:
-                frame_filename = f"frame_{current_frame}.jpg"
-                save_path = self.output_dir / frame_filename
-                cv2.imwrite(str(save_path), frame)
-                saved_frame_paths.append(str(save_path))
-                saved_count += 1
-            
-            current_frame += 1
+            current_frame = 0
+            for target in indices:
+                # Skip to the next sampled frame without converting the ones in between
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                if target - current_frame > self.SEEK_THRESHOLD_FRAMES and cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                    current_frame = target
+                while current_frame < target:
+                    if not cap.grab():
+                        return
+                    current_frame += 1
 
-        cap.release()
-        return saved_frame_paths
+                success, frame = cap.read()
+                if not success:
+                    return
+                current_frame += 1
+                yield target, frame
+        finally:
+            cap.release()
 
-    def get_video_metadata(self, video_path: str) -> dict:
+    def get_video_metadata(self, video_path: str, probe_audio: bool = False) -> dict:
+        """
+        Container metadata read from the header. With `probe_audio`, also
+        reports whether there is an audio stream (one extra ffmpeg call).
+        """
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             return {}
@@ -77,5 +139,13 @@ class VideoProcessor:
             "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         }
         cap.release()
+        metadata["duration"] = metadata["frame_count"] / metadata["fps"] if metadata["fps"] > 0 else 0.0
+
+        if probe_audio:
+            try:
+                metadata["has_audio"] = probe_media(video_path)["has_audio"]
+            except (OSError, subprocess.SubprocessError):
+                # No ffmpeg means the audio branch cannot run either
+                metadata["has_audio"] = False
         return metadata
 
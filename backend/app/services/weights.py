@@ -0,0 +1,66 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import torch
+
+MANIFEST_NAME = "manifest.json"
+
+
+class WeightsError(RuntimeError):
+    pass
+
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(weights_dir: str) -> Dict[str, Dict[str, str]]:
+    path = Path(weights_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with path.open() as f:
+        return json.load(f)
+
+
+def register_weights(weights_dir: str, name: str, file_name: str) -> str:
+    """
+    Records `file_name` (relative to `weights_dir`) as the weights for model
+    `name` in the manifest, with its SHA-256. Returns the checksum.
+    """
+    checksum = sha256_file(os.path.join(weights_dir, file_name))
+    manifest = read_manifest(weights_dir)
+    manifest[name] = {"file": file_name, "sha256": checksum}
+    tmp_path = Path(weights_dir) / f".{MANIFEST_NAME}.tmp"
+    with tmp_path.open("w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, Path(weights_dir) / MANIFEST_NAME)
+    return checksum
+
+
+def load_local_weights(weights_dir: str, name: str, verify: bool = True) -> Optional[Dict[str, torch.Tensor]]:
+    """
+    Loads the state dict registered for `name` in the weights directory's
+    manifest. Returns None when the model has no entry, and raises
+    WeightsError when the file is missing or fails its checksum.
+    """
+    entry = read_manifest(weights_dir).get(name)
+    if entry is None:
+        return None
+
+    path = os.path.join(weights_dir, entry["file"])
+    if not os.path.exists(path):
+        raise WeightsError(f"Weights for {name} listed in the manifest but missing: {path}")
+    if verify:
+        checksum = sha256_file(path)
+        if checksum != entry["sha256"]:
+            raise WeightsError(f"Checksum mismatch for {path}: expected {entry['sha256']}, got {checksum}")
+
+    print(f"Loading local weights for {name} from {path}")
+    return torch.load(path, map_location="cpu", weights_only=True)
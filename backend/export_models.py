@@ -0,0 +1,111 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+
+# Add the backend directory to the python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+
+from app.core.config import settings
+from app.services.inference_backends import BACKENDS, artifact_path, check_parity, export_model, load_backend
+from app.services.model_registry import parse_model_spec
+from app.services.model_service import ARCHITECTURES, ModelService
+from app.services.weights import read_manifest
+from app.services.audio_model_service import AudioModelService
+
+EXPORTABLE = [b for b in BACKENDS if b not in ("eager", "compile")]
+
+
+def _calibration_frames(service: ModelService, video_path: str, max_frames: int):
+    from app.services.video_processor import VideoProcessor
+
+    frames = VideoProcessor().iter_frames(video_path, max_frames=max_frames)
+    return [service._preprocess(frame).unsqueeze(0) for frame in frames]
+
+
+def _model_specs(args) -> list:
+    if args.all_models:
+        # Every architecture and fine-tune with weights in the local directory
+        specs = [spec for spec in read_manifest(settings.weights_dir) if parse_model_spec(spec)[0] in ARCHITECTURES]
+    else:
+        specs = args.models or [spec for spec in (settings.visual_model, settings.cascade_model) if spec]
+    return list(dict.fromkeys(specs))
+
+
+def _visual_models(specs: list, args):
+    # Loaded one at a time, so only one visual model is in memory
+    for spec in specs:
+        name, version = parse_model_spec(spec)
+        visual = ModelService(model_name=name, version=version, device="cpu", backend="eager")
+        example = torch.zeros(1, 3, visual.input_size, visual.input_size)
+        if args.calibration_video:
+            inputs = _calibration_frames(visual, args.calibration_video, args.samples)
+        else:
+            inputs = [torch.randn_like(example) for _ in range(args.samples)]
+        yield visual.key, visual.model, example, inputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export optimized inference artifacts and check parity against eager PyTorch.")
+    parser.add_argument("--backend", action="append", choices=EXPORTABLE,
+                        help="Backend to export (repeatable). Defaults to all exportable backends.")
+    parser.add_argument("--output-dir", default=settings.model_artifact_dir,
+                        help="Artifact directory (default: SHERLOCK_MODEL_ARTIFACT_DIR)")
+    parser.add_argument("--atol", type=float, default=0.02,
+                        help="Maximum allowed probability difference from eager outputs")
+    parser.add_argument("--calibration-video", default=None,
+                        help="Video whose frames calibrate int8_static and are used for the parity check")
+    parser.add_argument("--samples", type=int, default=8, help="Batches used for the parity check")
+    parser.add_argument("--model", dest="models", action="append", metavar="SPEC",
+                        help="Visual model to export, as name or name@version (repeatable; default: "
+                             "SHERLOCK_VISUAL_MODEL and SHERLOCK_CASCADE_MODEL)")
+    parser.add_argument("--all-models", action="store_true",
+                        help="Export every visual model with weights in the local weights directory")
+    args = parser.parse_args()
+
+    backends = args.backend or EXPORTABLE
+    if "int8_static" in backends and not args.calibration_video:
+        print("Warning: int8_static is calibrated on random noise without --calibration-video; "
+              "its artifacts will be poorly calibrated")
+    audio = AudioModelService(device="cpu", backend="eager")
+
+    torch.manual_seed(0)
+    audio_example = audio.example_input()
+    audio_inputs = [torch.randn_like(audio_example) * 20 for _ in range(args.samples)]
+
+    report = {}
+    failed = False
+    for name, model, example, inputs in itertools.chain(
+        _visual_models(_model_specs(args), args),
+        [("audio_cnn", audio.model, audio_example, audio_inputs)],
+    ):
+        for backend in backends:
+            path = artifact_path(args.output_dir, name, backend)
+            try:
+                export_model(model, backend, example, path, calibration_inputs=inputs)
+                runner = load_backend(model, backend, example, artifact_dir=args.output_dir,
+                                      model_name=name, device="cpu")
+                parity = check_parity(model, runner, inputs, args.atol)
+            except Exception as e:
+                print(f"[FAIL] {name} / {backend}: {e}")
+                report[f"{name}.{backend}"] = {"error": str(e), "passed": False}
+                failed = True
+                continue
+
+            status = "OK" if parity["passed"] else "FAIL"
+            print(f"[{status}] {name} / {backend}: {path} (max diff {parity['max_abs_diff']:.5f}, atol {args.atol})")
+            report[f"{name}.{backend}"] = {"artifact": str(path), **parity}
+            failed = failed or not parity["passed"]
+
+    report_path = os.path.join(args.output_dir, "parity_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Parity report written to {report_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
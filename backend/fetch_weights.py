@@ -0,0 +1,69 @@
+import argparse
+import os
+import shutil
+import sys
+
+# Add the backend directory to the python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.services.weights import WeightsError, load_local_weights, read_manifest, register_weights
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Populate the local weights directory (with SHA-256 manifest) so the API can start offline. "
+                    "Run it on a connected machine and copy the directory to air-gapped nodes."
+    )
+    parser.add_argument("--output-dir", default=settings.weights_dir,
+                        help="Weights directory (default: SHERLOCK_WEIGHTS_DIR)")
+    parser.add_argument("--import", dest="imports", action="append", default=[], metavar="NAME=PATH",
+                        help="Register an existing checkpoint (e.g. fine-tuned efficientnet_b0 or audio_cnn) "
+                             "instead of downloading (repeatable)")
+    parser.add_argument("--model", dest="models", action="append", metavar="NAME",
+                        help="Visual architecture to download ImageNet weights for, e.g. mobilenet_v3_small "
+                             "as a cascade screening model (repeatable; default: efficientnet_b0)")
+    parser.add_argument("--verify", action="store_true", help="Only verify the checksums already in the manifest")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    if args.verify:
+        failed = False
+        for name in sorted(read_manifest(args.output_dir)):
+            try:
+                load_local_weights(args.output_dir, name)
+                print(f"{name}: OK")
+            except WeightsError as e:
+                print(f"{name}: FAILED ({e})")
+                failed = True
+        sys.exit(1 if failed else 0)
+
+    if args.imports:
+        for spec in args.imports:
+            name, _, path = spec.partition("=")
+            if not name or not path:
+                parser.error(f"--import expects NAME=PATH, got {spec!r}")
+            file_name = f"{name}{os.path.splitext(path)[1] or '.pth'}"
+            shutil.copyfile(path, os.path.join(args.output_dir, file_name))
+            print(f"{name}: {file_name} sha256={register_weights(args.output_dir, name, file_name)}")
+        return
+
+    import torch
+    from torchvision import models
+
+    from app.services.model_service import ARCHITECTURES
+
+    for name in args.models or ["efficientnet_b0"]:
+        if name not in ARCHITECTURES:
+            parser.error(f"Unknown model {name!r}; expected one of {', '.join(sorted(ARCHITECTURES))}")
+        weights = getattr(models, ARCHITECTURES[name]).DEFAULT
+        print(f"Downloading {weights} ...")
+        state_dict = weights.get_state_dict(progress=True)
+        file_name = f"{name}.pth"
+        torch.save(state_dict, os.path.join(args.output_dir, file_name))
+        print(f"{name}: {file_name} sha256={register_weights(args.output_dir, name, file_name)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
+import argparse
 import sys
 import os
 
 # Add the backend directory to the python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.core.detector import DeepfakeDetector
+def interactive():
+    from app.core.detector import DeepfakeDetector
 
-def main():
     print("Sherlock: Local Deepfake Detection Engine")
     print("=========================================")
     
@@ -60,5 +61,52 @@ def main():
         else:
             print("Invalid option.")
 
+def batch(args):
+    from app.core.batch import VIDEO_EXTENSIONS, BatchRunner, collect_inputs
+
+    extensions = args.extension or VIDEO_EXTENSIONS
+    try:
+        paths = collect_inputs(args.inputs, extensions)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if not paths:
+        print("No videos found.")
+        sys.exit(1)
+
+    runner = BatchRunner(args.output, workers=args.workers, threads=args.threads,
+                         resume=not args.no_resume, retry_errors=args.retry_errors)
+    try:
+        counts = runner.run(paths)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; rerun the same command to resume from {args.output}")
+        sys.exit(130)
+    print(f"Done: {counts['ok']} analyzed, {counts['errors']} errors -> {args.output}")
+    if counts["errors"]:
+        sys.exit(2)
+
+def main():
+    from app.core.prefork import available_cores
+
+    parser = argparse.ArgumentParser(description="Sherlock local deepfake detection. Without a command, starts the interactive prompt.")
+    sub = parser.add_subparsers(dest="command")
+
+    batch_parser = sub.add_parser("batch", help="Analyze many videos non-interactively, streaming results to JSONL")
+    batch_parser.add_argument("inputs", nargs="+", help="Directories (recursive), glob patterns or manifest files (.txt, .csv with a path column, .jsonl)")
+    batch_parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL results file (appended to)")
+    batch_parser.add_argument("-w", "--workers", type=int, default=max(1, available_cores() // 2),
+                              help="Worker processes sharing one copy of the models")
+    batch_parser.add_argument("--threads", type=int, default=0, help="torch threads per worker (0 = split cores evenly)")
+    batch_parser.add_argument("--extension", action="append", help="Video extension to pick up from directories (repeatable)")
+    batch_parser.add_argument("--no-resume", action="store_true", help="Truncate the output instead of skipping videos already in it")
+    batch_parser.add_argument("--retry-errors", action="store_true", help="When resuming, re-run videos whose previous attempt failed; "
+                              "successful retries replace their error records")
+
+    args = parser.parse_args()
+    if args.command == "batch":
+        batch(args)
+    else:
+        interactive()
+
 if __name__ == "__main__":
     main()
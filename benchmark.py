@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Make the backend package importable when run from the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from integration_test import create_dummy_video
+
+# Synthetic media matrix: name -> (width, height, seconds, has_audio)
+CASES = {
+    "360p_2s_audio": (640, 360, 2, True),
+    "720p_5s_audio": (1280, 720, 5, True),
+    "480p_10s_silent": (640, 480, 10, False),
+    "1080p_5s_audio": (1920, 1080, 5, True),
+    "360p_30s_audio": (640, 360, 30, True),
+}
+QUICK_CASES = ["360p_2s_audio", "720p_5s_audio"]
+
+FPS = 30
+MAX_FRAMES = 20
+
+
+def make_case_video(work_dir, name, width, height, seconds, has_audio):
+    """
+    Generates (or reuses) a deterministic synthetic video for a benchmark case.
+    Audio is a sine tone muxed in with ffmpeg.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    path = os.path.join(work_dir, f"{name}.mp4")
+    if os.path.exists(path):
+        return path
+
+    silent_path = path if not has_audio else os.path.join(work_dir, f"{name}.video.mp4")
+    create_dummy_video(silent_path, width=width, height=height, fps=FPS, seconds=seconds, seed=seconds * height)
+    if has_audio:
+        subprocess.run(
+            [
+                "ffmpeg", "-v", "error", "-y",
+                "-i", silent_path,
+                "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=16000:duration={seconds}",
+                "-c:v", "copy", "-c:a", "aac", "-shortest",
+                path,
+            ],
+            check=True,
+        )
+        os.remove(silent_path)
+    return path
+
+
+def time_call(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {
+        "median_s": statistics.median(runs),
+        "min_s": min(runs),
+        "runs": [round(r, 6) for r in runs],
+    }
+
+
+def run_benchmarks(args):
+    import torch
+
+    from app.core.detector import DeepfakeDetector
+    from app.services.audio_model_service import AudioModelService
+    from app.services.audio_processor import AudioProcessor
+    from app.services.model_service import ModelService
+    from app.services.video_processor import VideoProcessor
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+
+    # Random weights: timings do not depend on them and nothing is downloaded
+    visual_model = ModelService(device="cpu", pretrained=False)
+    audio_model = AudioModelService(device="cpu")
+    detector = DeepfakeDetector(visual_model=visual_model, audio_model=audio_model)
+
+    cases = QUICK_CASES if args.quick else list(CASES)
+    if args.case:
+        cases = args.case
+
+    results = {}
+    scratch = tempfile.mkdtemp(prefix="sherlock-bench-")
+    try:
+        for name in cases:
+            width, height, seconds, has_audio = CASES[name]
+            video_path = make_case_video(args.work_dir, name, width, height, seconds, has_audio)
+            print(f"\n== {name} ({width}x{height}, {seconds}s, audio={has_audio})")
+
+            frame_dir = os.path.join(scratch, "frames")
+            video_processor = VideoProcessor(output_dir=frame_dir, decoder="opencv")
+            stages = {
+                "video.extract_frames": lambda: video_processor.extract_frames(video_path, max_frames=MAX_FRAMES),
+                "video.iter_frames[opencv]": lambda: list(video_processor.iter_frames(video_path, max_frames=MAX_FRAMES)),
+            }
+            if shutil.which("ffmpeg"):
+                ffmpeg_processor = VideoProcessor(output_dir=frame_dir, decoder="ffmpeg")
+                stages["video.iter_frames[ffmpeg]"] = lambda: list(ffmpeg_processor.iter_frames(video_path, max_frames=MAX_FRAMES))
+
+            frame_paths = video_processor.extract_frames(video_path, max_frames=MAX_FRAMES)
+            frames = list(video_processor.iter_frames(video_path, max_frames=MAX_FRAMES))
+            stages["model.predict_frames"] = lambda: visual_model.predict_frames(frame_paths)
+            stages["model.predict_batch[arrays]"] = lambda: visual_model.predict_batch(frames)
+
+            if has_audio:
+                def extract_audio():
+                    # Fresh directory every run so the WAV cache never short-circuits extraction
+                    audio_dir = tempfile.mkdtemp(dir=scratch)
+                    AudioProcessor(output_dir=audio_dir).extract_audio(video_path)
+
+                audio_processor = AudioProcessor(output_dir=os.path.join(scratch, "audio"))
+                wav_path = audio_processor.extract_audio(video_path)
+                pcm = audio_processor.load_pcm(video_path, duration=5)
+                mfcc = audio_processor.mfcc_from_array(pcm)
+                stages["audio.extract_audio"] = extract_audio
+                stages["audio.get_mfcc"] = lambda: audio_processor.get_mfcc(wav_path)
+                stages["audio.load_pcm"] = lambda: audio_processor.load_pcm(video_path, duration=5)
+                stages["audio.mfcc_from_array"] = lambda: audio_processor.mfcc_from_array(pcm)
+                stages["audio_model.predict_audio"] = lambda: audio_model.predict_audio(mfcc)
+
+            stages["e2e.analyze_video"] = lambda: detector.analyze_video(video_path)
+
+            for stage, fn in stages.items():
+                key = f"{name}/{stage}"
+                results[key] = time_call(fn, args.repeat)
+                print(f"  {stage:<32} median {results[key]['median_s'] * 1000:9.1f} ms")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold, min_delta_ms):
+    """
+    Flags stages whose median got slower than the baseline by more than
+    `threshold` (relative) and `min_delta_ms` (absolute, to ignore jitter).
+    Returns the list of regressed stage keys.
+    """
+    regressions = []
+    print(f"\n{'stage':<56} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key, result in sorted(current["results"].items()):
+        base = baseline["results"].get(key)
+        if base is None:
+            print(f"{key:<56} {'-':>10} {result['median_s'] * 1000:9.1f}ms {'new':>8}")
+            continue
+        base_s, cur_s = base["median_s"], result["median_s"]
+        change = (cur_s - base_s) / base_s if base_s > 0 else 0.0
+        regressed = change > threshold and (cur_s - base_s) * 1000 > min_delta_ms
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{key:<56} {base_s * 1000:9.1f}ms {cur_s * 1000:9.1f}ms {change:+7.1%}{flag}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage-level performance benchmarks for Sherlock (offline, CPU).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run the benchmarks and write results as JSON")
+    run.add_argument("--output", default="bench_results.json")
+    run.add_argument("--work-dir", default="bench_data", help="Where synthetic videos are generated and reused")
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+    run.add_argument("--quick", action="store_true", help="Only run the small cases")
+    run.add_argument("--case", action="append", choices=list(CASES), help="Run only this case (repeatable)")
+    run.add_argument("--baseline", help="Compare against this baseline JSON after running")
+
+    cmp_parser = sub.add_parser("compare", help="Compare a results JSON against a baseline")
+    cmp_parser.add_argument("current")
+    cmp_parser.add_argument("--baseline", required=True)
+
+    for p in (run, cmp_parser):
+        p.add_argument("--threshold", type=float, default=0.15, help="Allowed relative slowdown (default 15%%)")
+        p.add_argument("--min-delta-ms", type=float, default=5.0, help="Ignore slowdowns smaller than this")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        current = run_benchmarks(args)
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nResults written to {args.output}")
+        if not args.baseline:
+            return
+    else:
+        with open(args.current) as f:
+            current = json.load(f)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold, args.min_delta_ms)
+    if regressions:
+        print(f"\n{len(regressions)} stage(s) regressed beyond {args.threshold:.0%}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,6 @@ import requests
 import os
 import cv2
 import numpy as np
-import sys
 import time
 
 # Configuration
@@ -10,17 +9,16 @@ EDGE_URL = "http://127.0.0.1:8787/api/v1/analyze"
 API_KEY = "dev-secret-key"
 TEST_VIDEO = "test_video.mp4"
 
-def create_dummy_video(filename):
-    """Creates a short 1-second dummy video for testing."""
+def create_dummy_video(filename, width=640, height=480, fps=30, seconds=1, seed=None):
+    """Creates a short dummy video for testing (1 second at 640x480 by default)."""
     print(f"Generating dummy video: {filename}...")
-    height, width = 480, 640
-    fps = 30
+    rng = np.random.RandomState(seed) if seed is not None else np.random
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     out = cv2.VideoWriter(filename, fourcc, fps, (width, height))
     
-    for i in range(fps):
+    for i in range(int(fps * seconds)):
         # Create a frame with random noise/color to simulate content
-        frame = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+        frame = rng.randint(0, 255, (height, width, 3), dtype=np.uint8)
         # Add some text
         cv2.putText(frame, f"Frame {i}", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
         out.write(frame)
@@ -0,0 +1,421 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+# Make the backend package importable when run from the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from benchmark import CASES, QUICK_CASES, make_case_video
+
+# Server gauges scraped from /metrics while the load runs
+DEFAULT_GAUGES = ["process_resident_memory_bytes", "sherlock_admission_inflight_cost", "sherlock_job_queue_depth"]
+JOB_POLL_SECONDS = 0.25
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """
+    "360p_2s_audio=3,720p_5s_audio=1" -> relative weights per benchmark case.
+    A case without a weight counts 1.
+    """
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in CASES:
+            raise ValueError(f"Unknown case {name!r}; expected one of {', '.join(CASES)}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    # Nearest-rank percentile
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Payloads:
+    """
+    Synthetic videos of the mix, read into memory once. With `unique`,
+    every upload gets a few random trailing bytes (ignored by the
+    demuxers) so it never hits the server's result cache.
+    """
+
+    def __init__(self, work_dir: str, mix: Dict[str, float], unique: bool = True, seed: int = 0):
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.unique = unique
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._bodies = {}
+        for name in self.names:
+            with open(make_case_video(work_dir, name, *CASES[name]), "rb") as f:
+                self._bodies[name] = f.read()
+
+    def pick(self) -> Tuple[str, bytes]:
+        with self._lock:
+            name = self._random.choices(self.names, self.weights)[0]
+            suffix = self._random.randbytes(16) if self.unique else b""
+        return name, self._bodies[name] + suffix
+
+
+class Client:
+    """
+    Sends one analysis and times it. "analyze" posts to the synchronous
+    endpoint; "jobs" submits a job and polls it until it finishes.
+    """
+
+    def __init__(self, base_url: str, endpoint: str = "analyze", timeout: float = 600.0):
+        self.base_url = base_url.rstrip("/")
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def send(self, name: str, body: bytes, scheduled: float) -> Dict[str, Any]:
+        """
+        Latency is measured from `scheduled` (the intended send time), so a
+        client that falls behind the arrival rate still counts the delay.
+        """
+        record = {"case": name, "scheduled": scheduled, "status": None, "error": None}
+        session = self._session()
+        files = {"file": (f"{name}.mp4", body, "video/mp4")}
+        try:
+            if self.endpoint == "jobs":
+                response = session.post(f"{self.base_url}/api/v1/jobs", files=files, timeout=self.timeout)
+                record["status"] = response.status_code
+                if response.status_code == 202:
+                    job = response.json()
+                    while job["status"] not in ("completed", "failed"):
+                        if time.monotonic() - scheduled > self.timeout:
+                            raise TimeoutError(f"Job {job['job_id']} still {job['status']}")
+                        time.sleep(JOB_POLL_SECONDS)
+                        job = session.get(f"{self.base_url}/api/v1/jobs/{job['job_id']}", timeout=self.timeout).json()
+                    if job["status"] == "failed":
+                        record["error"] = job.get("error") or "job failed"
+            else:
+                response = session.post(f"{self.base_url}/api/v1/analyze", files=files, timeout=self.timeout)
+                record["status"] = response.status_code
+            if record["status"] >= 400:
+                record["error"] = response.text[:200]
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["latency_s"] = time.monotonic() - scheduled
+        return record
+
+
+class GaugeSampler:
+    """
+    Scrapes gauges from the server's /metrics every `interval` seconds.
+    With `server_pid`, RSS is read from /proc instead, summed over the
+    process and its children (pre-fork workers each report only their own).
+    """
+
+    def __init__(self, base_url: str, gauges: List[str], interval: float = 1.0, server_pid: Optional[int] = None):
+        self.base_url = base_url.rstrip("/")
+        self.gauges = gauges
+        self.interval = interval
+        self.server_pid = server_pid
+        self.samples: List[Dict[str, float]] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="loadtest-sampler", daemon=True)
+
+    def start(self, t0: float):
+        self._t0 = t0
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        while True:
+            sample = {"t": round(time.monotonic() - self._t0, 2)}
+            try:
+                text = requests.get(f"{self.base_url}/metrics", timeout=5).text
+                for line in text.splitlines():
+                    name, _, value = line.partition(" ")
+                    if name in self.gauges:
+                        sample[name] = float(value)
+            except requests.RequestException:
+                pass
+            if self.server_pid is not None:
+                sample["process_resident_memory_bytes"] = _tree_rss_bytes(self.server_pid)
+            self.samples.append(sample)
+            if self._stop.wait(self.interval):
+                return
+
+
+def _tree_rss_bytes(pid: int) -> float:
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                total += next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            continue
+    return float(total)
+
+
+def run_closed(client: Client, payloads: Payloads, concurrency: int, duration: float,
+               max_requests: int) -> List[Dict[str, Any]]:
+    """
+    Fixed concurrency: each of `concurrency` users sends its next request as
+    soon as the previous one answers.
+    """
+    records: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def user():
+        while time.monotonic() < deadline:
+            with lock:
+                if max_requests and len(records) + running[0] >= max_requests:
+                    return
+                running[0] += 1
+            name, body = payloads.pick()
+            record = client.send(name, body, time.monotonic())
+            with lock:
+                running[0] -= 1
+                records.append(record)
+
+    running = [0]
+    threads = [threading.Thread(target=user, name=f"loadtest-user-{i}") for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+
+def run_open(client: Client, payloads: Payloads, rate: float, duration: float, max_requests: int,
+             max_inflight: int, poisson: bool = True, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Fixed arrival rate: requests start on a schedule (Poisson or evenly
+    spaced) whether or not earlier ones have answered, like independent
+    clients. At most `max_inflight` are in flight; later arrivals wait for
+    a slot and the wait counts toward their latency.
+    """
+    rng = random.Random(seed)
+    start = time.monotonic()
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="loadtest") as pool:
+        scheduled = start
+        while scheduled < start + duration and not (max_requests and len(futures) >= max_requests):
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            name, body = payloads.pick()
+            futures.append(pool.submit(client.send, name, body, scheduled))
+            scheduled += rng.expovariate(rate) if poisson else 1.0 / rate
+    return [future.result() for future in futures]
+
+
+def summarize(records: List[Dict[str, Any]], elapsed: float, t0: float) -> Dict[str, Any]:
+    def stats(subset: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ok = [r["latency_s"] for r in subset if r["error"] is None]
+        count = len(subset)
+        return {
+            "requests": count,
+            "ok": len(ok),
+            "throughput_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0.0,
+            "error_rate": round((count - len(ok)) / count, 4) if count else 0.0,
+            "rate_503": round(sum(1 for r in subset if r["status"] == 503) / count, 4) if count else 0.0,
+            "latency_s": {
+                "mean": round(sum(ok) / len(ok), 3) if ok else None,
+                **{f"p{q}": round(percentile(ok, q), 3) if ok else None for q in (50, 95, 99)},
+                "max": round(max(ok), 3) if ok else None,
+            },
+        }
+
+    statuses: Dict[str, int] = {}
+    for r in records:
+        key = str(r["status"]) if r["status"] is not None else "no_response"
+        statuses[key] = statuses.get(key, 0) + 1
+    errors: Dict[str, int] = {}
+    for r in records:
+        if r["error"] is not None:
+            errors[r["error"][:120]] = errors.get(r["error"][:120], 0) + 1
+
+    # Completions per second of the run, to spot warm-up and saturation
+    per_second = [0] * (int(elapsed) + 1)
+    for r in records:
+        if r["error"] is None:
+            second = int(r["scheduled"] - t0 + r["latency_s"])
+            if 0 <= second < len(per_second):
+                per_second[second] += 1
+
+    return {
+        **stats(records),
+        "elapsed_s": round(elapsed, 2),
+        "statuses": statuses,
+        "errors": dict(sorted(errors.items(), key=lambda item: -item[1])[:10]),
+        "by_case": {name: stats([r for r in records if r["case"] == name])
+                    for name in sorted({r["case"] for r in records})},
+        "completions_per_second": per_second,
+    }
+
+
+def print_report(summary: Dict[str, Any], samples: List[Dict[str, float]]):
+    def row(label, s):
+        lat = s["latency_s"]
+        fmt = lambda v: f"{v:8.2f}" if v is not None else f"{'-':>8}"
+        print(f"{label:<20} {s['requests']:>6} {s['throughput_rps']:>8.2f} {s['error_rate']:>7.1%} "
+              f"{s['rate_503']:>7.1%} {fmt(lat['p50'])} {fmt(lat['p95'])} {fmt(lat['p99'])} {fmt(lat['max'])}")
+
+    print(f"\n{'case':<20} {'reqs':>6} {'ok/s':>8} {'errors':>7} {'503':>7} "
+          f"{'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max s':>8}")
+    for name, s in summary["by_case"].items():
+        row(name, s)
+    row("all", summary)
+    print(f"\nStatuses: {summary['statuses']}")
+    for error, count in summary["errors"].items():
+        print(f"  {count:>5} x {error}")
+
+    rss = [s["process_resident_memory_bytes"] for s in samples if "process_resident_memory_bytes" in s]
+    if rss:
+        print(f"Server RSS: start {rss[0] / 2**20:.0f} MB, peak {max(rss) / 2**20:.0f} MB, "
+              f"end {rss[-1] / 2**20:.0f} MB ({len(rss)} samples)")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_in_process(ready_timeout: float) -> str:
+    """
+    Serves the API from this process (uvicorn on a background thread) and
+    waits until its models are ready. Returns the base URL.
+    """
+    import uvicorn
+
+    from app.main_api import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="loadtest-server", daemon=True).start()
+    base_url = f"http://127.0.0.1:{port}"
+    wait_ready(base_url, ready_timeout)
+    return base_url
+
+
+def wait_ready(base_url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/health/ready", timeout=5).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{base_url} did not report ready within {timeout:g}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Concurrent load generator for the Sherlock analyze API: throughput, latency percentiles, "
+                    "error and 503 rates, and server RSS over time."
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Base URL of a running server (e.g. http://127.0.0.1:8000)")
+    target.add_argument("--in-process", action="store_true", help="Serve the API from this process instead (default)")
+    parser.add_argument("--endpoint", choices=["analyze", "jobs"], default="analyze",
+                        help="Synchronous POST /analyze, or POST /jobs and poll until done")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed",
+                        help="closed: fixed concurrency; open: fixed arrival rate")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Concurrent users (closed loop)")
+    parser.add_argument("-r", "--rate", type=float, default=1.0, help="Arrivals per second (open loop)")
+    parser.add_argument("--uniform-arrivals", action="store_true", help="Evenly spaced instead of Poisson arrivals")
+    parser.add_argument("--max-inflight", type=int, default=256, help="Open-loop cap on requests in flight")
+    parser.add_argument("-d", "--duration", type=float, default=60.0, help="Seconds to generate load for")
+    parser.add_argument("-n", "--requests", type=int, default=0, help="Stop after this many requests (0 = no limit)")
+    parser.add_argument("--mix", default=",".join(QUICK_CASES),
+                        help=f"Weighted benchmark cases, e.g. 360p_2s_audio=3,720p_5s_audio=1 (cases: {', '.join(CASES)})")
+    parser.add_argument("--allow-cache", action="store_true",
+                        help="Send identical bytes per case, so repeats may be served from the result cache")
+    parser.add_argument("--work-dir", default="bench_data", help="Where synthetic videos are generated and reused")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-request timeout in seconds")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Seconds between /metrics scrapes")
+    parser.add_argument("--gauge", action="append", help=f"Gauge to sample (repeatable; default: {', '.join(DEFAULT_GAUGES)})")
+    parser.add_argument("--server-pid", type=int, help="Read RSS of this process and its children from /proc")
+    parser.add_argument("--ready-timeout", type=float, default=300.0, help="Seconds to wait for the models to load")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the summary, settings and RSS timeline as JSON")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    payloads = Payloads(args.work_dir, mix, unique=not args.allow_cache, seed=args.seed)
+    if args.url:
+        base_url = args.url.rstrip("/")
+        wait_ready(base_url, args.ready_timeout)
+    else:
+        print("Starting the API in-process ...")
+        base_url = start_in_process(args.ready_timeout)
+
+    client = Client(base_url, args.endpoint, timeout=args.timeout)
+    sampler = GaugeSampler(base_url, args.gauge or DEFAULT_GAUGES, args.sample_interval, args.server_pid)
+    load = f"{args.concurrency} users" if args.mode == "closed" else f"{args.rate:g} req/s"
+    print(f"{args.mode}-loop load on {base_url} ({args.endpoint}): {load} for {args.duration:g}s, mix {mix}")
+
+    t0 = time.monotonic()
+    sampler.start(t0)
+    try:
+        if args.mode == "closed":
+            records = run_closed(client, payloads, args.concurrency, args.duration, args.requests)
+        else:
+            records = run_open(client, payloads, args.rate, args.duration, args.requests, args.max_inflight,
+                               poisson=not args.uniform_arrivals, seed=args.seed)
+    finally:
+        elapsed = time.monotonic() - t0
+        sampler.stop()
+
+    summary = summarize(records, elapsed, t0)
+    print_report(summary, sampler.samples)
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "target": base_url if args.url else "in-process",
+            },
+            "config": {k: v for k, v in vars(args).items() if k not in ("output",)},
+            "summary": summary,
+            "timeline": sampler.samples,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()